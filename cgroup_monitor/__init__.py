@@ -1,16 +1,107 @@
-import os
+import importlib
 
+from . import mounts
 
-def is_cgroup_v2():
-    return os.path.exists("/sys/fs/cgroup/cgroup.controllers")
 
+def is_cgroup_v2(cgroup_base_path=None):
+    return mounts.detect_version(cgroup_base_path) == 2
+
+
+class _BackendMeta(type):
+    def __instancecheck__(cls, instance):
+        return any(isinstance(instance, backend) for backend in cls._backends())
+
+
+class _BackendFactory(metaclass=_BackendMeta):
+    _modules = {}
+
+    @classmethod
+    def _backend(cls, version):
+        module = importlib.import_module(cls._modules[version], __name__)
+        return getattr(module, cls.__name__)
+
+    @classmethod
+    def _backends(cls):
+        return [cls._backend(version) for version in cls._modules]
+
+
+class CGroupMonitor(_BackendFactory):
+    '''
+    Create a monitor for the cgroup version that backs the given path.
+    The version is picked per instance, so v1 and v2 cgroups can be monitored
+    side by side on hybrid hosts. Nothing is probed until the first instance is created.
+
+    Parameters:
+    - cgroup_name (str): Name of the cgroup. Default is an empty string.
+    - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+        resolves the mount points from /proc/self/mountinfo.
+    - version (int): Force cgroup version 1 or 2. Default is None (auto-detect).
+
+    Returns:
+    - monitor (v1_monitor.CGroupMonitor or v2_monitor.CGroupMonitor): Backend specific monitor.
+    '''
+    _modules = {1: ".v1_monitor", 2: ".v2_monitor"}
+
+    def __new__(cls, cgroup_name="", cgroup_base_path=None, version=None):
+        if version is None:
+            version = mounts.detect_version(cgroup_base_path)
+        return cls._backend(version)(cgroup_name, cgroup_base_path)
+
+    @classmethod
+    def for_pid(cls, pid, version=None):
+        '''
+        Create a monitor for the cgroup a process belongs to, read from /proc/<pid>/cgroup.
+        Handles cgroup namespaces and v1 hierarchies with several controllers.
+
+        Parameters:
+        - pid (int): Process ID.
+        - version (int): Force cgroup version 1 or 2. Default is None (auto-detect).
+
+        Returns:
+        - monitor (v1_monitor.CGroupMonitor or v2_monitor.CGroupMonitor): Backend specific monitor.
+        '''
+        if version is None:
+            version = mounts.detect_version()
+        return cls._backend(version).for_pid(pid)
+
+    @classmethod
+    def for_self(cls, version=None):
+        '''
+        Create a monitor for the cgroup of the current process, e.g. the container it runs in.
+
+        Parameters:
+        - version (int): Force cgroup version 1 or 2. Default is None (auto-detect).
+
+        Returns:
+        - monitor (v1_monitor.CGroupMonitor or v2_monitor.CGroupMonitor): Backend specific monitor.
+        '''
+        if version is None:
+            version = mounts.detect_version()
+        return cls._backend(version).for_self()
+
+
+class CGroupManager(_BackendFactory):
+    '''
+    Create a manager for the cgroup version that backs the given path.
+    The version is picked per instance, see CGroupMonitor.
+
+    Parameters:
+    - cgroup_name (str): Name of the cgroup. Necessary argument.
+    - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+        resolves the mount points from /proc/self/mountinfo.
+    - helper_script (str): Path to the helper script to manage cgroups. Default is None.
+    - version (int): Force cgroup version 1 or 2. Default is None (auto-detect).
+
+    Returns:
+    - manager (v1_manager.CGroupManager or v2_manager.CGroupManager): Backend specific manager.
+    '''
+    _modules = {1: ".v1_manager", 2: ".v2_manager"}
+
+    def __new__(cls, cgroup_name, cgroup_base_path=None, helper_script=None, version=None):
+        if version is None:
+            version = mounts.detect_version(cgroup_base_path)
+        return cls._backend(version)(cgroup_name, cgroup_base_path, helper_script)
 
-if is_cgroup_v2():
-    from .v2_monitor import CGroupMonitor
-    from .v2_manager import CGroupManager
-else:
-    from .v1_monitor import CGroupMonitor
-    from .v1_manager import CGroupManager
 
 __version__ = "1.0.0"
-__all__ = ["CGroupMonitor", "CGroupManager"]
+__all__ = ["CGroupMonitor", "CGroupManager", "is_cgroup_v2"]
@@ -0,0 +1,216 @@
+import logging
+import queue
+import threading
+from collections import deque, namedtuple
+
+
+logger = logging.getLogger(__name__)
+
+# A rule changing state, delivered to the rule's callback or the engine's queue
+AlertEvent = namedtuple("AlertEvent", ["rule", "state", "value", "timestamp"])
+
+FIRING = "firing"
+RESOLVED = "resolved"
+
+
+def _memory_usage_percent(sample):
+    if not sample.memory_limit_bytes:
+        return 0.0
+    return sample.memory_usage_bytes / sample.memory_limit_bytes * 100
+
+
+METRICS = {
+    "cpu_usage_percent": lambda sample: sample.cpu_usage_percent,
+    "memory_usage_bytes": lambda sample: sample.memory_usage_bytes,
+    "memory_usage_percent": _memory_usage_percent,
+    "cpu_throttled_ratio": lambda sample: sample.cpu_throttled_ratio,
+}
+
+
+class AlertRule:
+    def __init__(self, name, metric, threshold, above=True, for_samples=1, window_s=None,
+                 clear_threshold=None, cooldown_s=0.0, callback=None):
+        '''
+        Declarative threshold rule, evaluated on every sample.
+        e.g. AlertRule("cpu", "cpu_usage_percent", 90, for_samples=5) fires once CPU
+        usage has been above 90% for 5 consecutive samples.
+
+        Parameters:
+        - name (str): Name of the rule, passed along in its events.
+        - metric (str or callable): One of METRICS, or a function taking a Sample and returning a number.
+        - threshold (float): Value at which the rule breaches.
+        - above (bool): Breach when the value is above the threshold, or below it if False. Default is True.
+        - for_samples (int): Number of consecutive breaching samples before firing. Default is 1.
+        - window_s (float): If set, compare the time-weighted average over the last window_s
+            seconds instead of the latest value. Default is None.
+        - clear_threshold (float): Value the metric has to get back past to resolve a firing rule.
+            Default is None, which uses threshold (no hysteresis).
+        - cooldown_s (float): Minimum time between two firings of the rule. Default is 0.
+        - callback (callable): Called with each AlertEvent of the rule. Default is None,
+            which puts the events on the engine's queue instead.
+
+        Returns:
+        - None
+        '''
+        if isinstance(metric, str):
+            if metric not in METRICS:
+                raise ValueError(f"Unknown metric {metric!r}, expected one of {sorted(METRICS)} or a callable.")
+            metric = METRICS[metric]
+        if for_samples < 1:
+            raise ValueError("for_samples must be at least 1.")
+
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.above = above
+        self.for_samples = for_samples
+        self.window_s = window_s
+        self.clear_threshold = threshold if clear_threshold is None else clear_threshold
+        self.cooldown_s = cooldown_s
+        self.callback = callback
+
+        self.firing = False
+        self._consecutive = 0
+        self._last_fired = None
+        self._window = deque()
+        self._window_sum = 0.0
+        self._window_time = 0.0
+
+    def __repr__(self):
+        return f"AlertRule({self.name!r})"
+
+    def _value(self, sample):
+        '''
+        Internal method to get the value compared against the threshold, keeping
+        a running sum over the window so each sample costs O(1) amortized.
+        '''
+        value = self.metric(sample)
+        if self.window_s is None:
+            return value
+
+        weighted = value * sample.interval
+        self._window.append((sample.timestamp, weighted, sample.interval))
+        self._window_sum += weighted
+        self._window_time += sample.interval
+        while self._window and self._window[0][0] <= sample.timestamp - self.window_s:
+            _, old_weighted, old_interval = self._window.popleft()
+            self._window_sum -= old_weighted
+            self._window_time -= old_interval
+        return self._window_sum / self._window_time if self._window_time > 0 else value
+
+    def evaluate(self, sample):
+        '''
+        Update the rule with a new sample.
+
+        Parameters:
+        - sample (Sample): The latest sample.
+
+        Returns:
+        - event (AlertEvent or None): The state change caused by the sample, if any.
+        '''
+        value = self._value(sample)
+
+        if self.firing:
+            cleared = value < self.clear_threshold if self.above else value > self.clear_threshold
+            if cleared:
+                self.firing = False
+                self._consecutive = 0
+                return AlertEvent(self, RESOLVED, value, sample.timestamp)
+            return None
+
+        breaching = value > self.threshold if self.above else value < self.threshold
+        self._consecutive = self._consecutive + 1 if breaching else 0
+        if self._consecutive < self.for_samples:
+            return None
+        if self._last_fired is not None and sample.timestamp - self._last_fired < self.cooldown_s:
+            return None
+
+        self.firing = True
+        self._last_fired = sample.timestamp
+        return AlertEvent(self, FIRING, value, sample.timestamp)
+
+    def reset(self):
+        '''
+        Forget the rule's state and window.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self.firing = False
+        self._consecutive = 0
+        self._last_fired = None
+        self._window.clear()
+        self._window_sum = 0.0
+        self._window_time = 0.0
+
+
+class AlertEngine:
+    def __init__(self, rules=None):
+        '''
+        Evaluate a set of AlertRule on every sample. The cost per sample is O(number of rules).
+        Events of rules without a callback are put on the events queue.
+
+        Parameters:
+        - rules (list): Initial list of AlertRule. Default is None.
+
+        Returns:
+        - None
+        '''
+        self.rules = list(rules or [])
+        self.events = queue.Queue()
+        self._lock = threading.Lock()
+
+    def add_rule(self, rule):
+        '''
+        Add a rule.
+
+        Parameters:
+        - rule (AlertRule): Rule to add.
+
+        Returns:
+        - rule (AlertRule): The added rule.
+        '''
+        with self._lock:
+            self.rules = self.rules + [rule]
+        return rule
+
+    def remove_rule(self, rule):
+        '''
+        Remove a rule.
+
+        Parameters:
+        - rule (AlertRule): Rule to remove.
+
+        Returns:
+        - None
+        '''
+        with self._lock:
+            self.rules = [r for r in self.rules if r is not rule]
+
+    def evaluate(self, sample):
+        '''
+        Evaluate every rule against a sample and deliver the resulting events.
+
+        Parameters:
+        - sample (Sample): The latest sample.
+
+        Returns:
+        - None
+        '''
+        for rule in self.rules:
+            event = rule.evaluate(sample)
+            if event is None:
+                continue
+            if rule.callback is None:
+                self.events.put(event)
+                continue
+            try:
+                rule.callback(event)
+            except Exception:
+                # Runs on the monitor thread, a failing callback must not stop sampling or the other rules
+                logger.exception("Callback of alert rule %s failed", rule.name)
+
+    __call__ = evaluate
@@ -0,0 +1,290 @@
+import logging
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+logger = logging.getLogger(__name__)
+
+# A limit change the tuner made, or would have made in dry-run mode
+TuningDecision = namedtuple("TuningDecision", ["timestamp", "resource", "current", "target", "reason", "applied"])
+
+# Attribute holding the current limit of each resource
+_LIMITS = {"cpu_cores": "cpu_limit", "memory_bytes": "memory_limit"}
+
+
+def percentile(values, percent):
+    '''
+    Nearest-rank percentile of a list of numbers.
+
+    Parameters:
+    - values (list): Values, in any order.
+    - percent (float): Percentile between 0 and 100.
+
+    Returns:
+    - value (float): The percentile, 0 for an empty list.
+    '''
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+class AutoTuner:
+    def __init__(self, monitor, manager, cpu_bounds=None, memory_bounds=None, window=60,
+                 cpu_percentile=95, cpu_headroom=1.25, memory_headroom=1.25, throttle_ratio=0.1,
+                 memory_pressure_percent=90, min_change_interval_s=30, max_step=2.0, deadband=0.1,
+                 dry_run=False, sudo=False, memory_stall_percent=10):
+        '''
+        Resize the limits of a cgroup from the usage its monitor observes.
+        The tuner subscribes to the monitor's samples and, once per min_change_interval_s,
+        sets the CPU limit to a percentile of recent usage plus headroom and the memory
+        limit to the recent peak plus headroom (memory.high on v2, with memory.max kept
+        above it). Throttling or memory pressure grow the limit by max_step. Memory pressure
+        is the share of time tasks stalled on memory (memory.pressure) where PSI is available,
+        and the peak relative to the limit otherwise (cgroup v1).
+        Limits never change by more than max_step at once and the memory limit is
+        never set below the recent peak plus headroom. Limits are written from a worker
+        thread, so process spawns for sudo do not delay the monitor's samples.
+
+        Parameters:
+        - monitor (CGroupMonitor): Monitor of the cgroup.
+        - manager (CGroupManager): Manager of the same cgroup.
+        - cpu_bounds (tuple): (min, max) CPU limit in cores. Default is None, which leaves the CPU limit alone.
+        - memory_bounds (tuple): (min, max) memory limit in bytes. Default is None,
+            which leaves the memory limit alone.
+        - window (int): Number of recent samples to base decisions on. Default is 60.
+        - cpu_percentile (float): Percentile of CPU usage to size the CPU limit for. Default is 95.
+        - cpu_headroom (float): Factor applied on top of the CPU percentile. Default is 1.25.
+        - memory_headroom (float): Factor applied on top of the memory peak. Default is 1.25.
+        - throttle_ratio (float): Average throttled ratio above which the CPU limit grows. Default is 0.1.
+        - memory_pressure_percent (float): Memory peak, in percent of the limit, above which
+            the memory limit grows without PSI. Default is 90.
+        - min_change_interval_s (float): Minimum time between two changes. Default is 30 seconds.
+        - max_step (float): Maximum factor by which a limit changes at once. Default is 2.
+        - deadband (float): Ignore relative changes smaller than this. Default is 0.1.
+        - dry_run (bool): Only log and record the decisions. Default is False.
+        - sudo (bool): Whether to use sudo to set the limits. Default is False.
+        - memory_stall_percent (float): Share of time some tasks stalled on memory, in percent,
+            above which the memory limit grows where PSI is available. Default is 10.
+
+        Returns:
+        - None
+        '''
+        self.monitor = monitor
+        self.manager = manager
+        self.cpu_bounds = cpu_bounds
+        self.memory_bounds = memory_bounds
+        self.window = window
+        self.cpu_percentile = cpu_percentile
+        self.cpu_headroom = cpu_headroom
+        self.memory_headroom = memory_headroom
+        self.throttle_ratio = throttle_ratio
+        self.memory_pressure_percent = memory_pressure_percent
+        self.min_change_interval_s = min_change_interval_s
+        self.max_step = max_step
+        self.deadband = deadband
+        self.dry_run = dry_run
+        self.sudo = sudo
+        self.memory_stall_percent = memory_stall_percent
+
+        self.decisions = deque(maxlen=100)
+        self.cpu_limit = None
+        self.memory_limit = None
+        self._cores_used = deque(maxlen=window)
+        self._memory = deque(maxlen=window)
+        self._throttled = deque(maxlen=window)
+        self._last_change = None
+        self._psi = False
+        self._pressure_start = None
+        self._executor = None
+        self._pending = []
+
+    def start(self):
+        '''
+        Read the current limits and subscribe to the monitor's samples.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self.cpu_limit = self.monitor.get_num_cores()
+        self.memory_limit = self.monitor.get_memory_limit() or None
+        self._last_change = time.monotonic()
+        cgroup_path = getattr(self.monitor, "cgroup_path", None)
+        self._psi = cgroup_path is not None and os.path.exists(os.path.join(cgroup_path, "memory.pressure"))
+        self._pressure_start = self._read_pressure()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.monitor.subscribe(self.on_sample)
+
+    def stop(self):
+        '''
+        Unsubscribe from the monitor and wait for limit changes in progress.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self.monitor.unsubscribe(self.on_sample)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wait(self, timeout=None):
+        '''
+        Wait for the limit changes in progress to be written.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is None (no limit).
+
+        Returns:
+        - done (bool): Whether all changes were written.
+        '''
+        return not wait(self._pending, timeout).not_done
+
+    def _read_pressure(self):
+        '''
+        Internal method to read (monotonic time, memory "some" stall us), None without PSI.
+        '''
+        if not self._psi:
+            return None
+        return time.monotonic(), self.monitor.get_memory_pressure()[0]
+
+    def on_sample(self, sample):
+        '''
+        Record a sample and adjust the limits if it is time to.
+
+        Parameters:
+        - sample (Sample): The latest sample.
+
+        Returns:
+        - None
+        '''
+        self._cores_used.append(sample.cpu_usage_percent / 100 * self.cpu_limit)
+        self._memory.append(sample.memory_usage_bytes)
+        self._throttled.append(sample.cpu_throttled_ratio)
+
+        now = time.monotonic()
+        if len(self._memory) < self.window or now - self._last_change < self.min_change_interval_s:
+            return
+        # Decide again once the previous changes are written and in effect
+        self._pending = [future for future in self._pending if not future.done()]
+        if self._pending:
+            return
+
+        changed = False
+        if self.cpu_bounds is not None:
+            changed |= self._tune_cpu(sample.timestamp)
+        if self.memory_bounds is not None:
+            changed |= self._tune_memory(sample.timestamp)
+        if changed:
+            self._last_change = now
+            # Usage seen under the old limits does not say much about the new ones
+            self._cores_used.clear()
+            self._memory.clear()
+            self._throttled.clear()
+            self._pressure_start = self._read_pressure()
+
+    def _bounded(self, target, current, bounds):
+        '''
+        Internal method to clamp a target to max_step from the current value and to the bounds.
+        '''
+        if current:
+            target = min(max(target, current / self.max_step), current * self.max_step)
+        return min(max(target, bounds[0]), bounds[1])
+
+    def _tune_cpu(self, timestamp):
+        '''
+        Internal method to pick and apply a new CPU limit.
+        '''
+        current = self.cpu_limit
+        throttled = sum(self._throttled) / len(self._throttled)
+        if throttled > self.throttle_ratio:
+            target = current * self.max_step
+            reason = f"throttled in {throttled:.0%} of periods"
+        else:
+            usage = percentile(self._cores_used, self.cpu_percentile)
+            target = usage * self.cpu_headroom
+            reason = f"p{self.cpu_percentile:g} usage {usage:.2f} cores"
+        target = round(self._bounded(target, current, self.cpu_bounds), 2)
+
+        if abs(target - current) <= self.deadband * current:
+            return False
+        self._decide(timestamp, "cpu_cores", current, target, reason, self.manager.set_cpu_limit)
+        return True
+
+    def _tune_memory(self, timestamp):
+        '''
+        Internal method to pick and apply a new memory limit.
+        '''
+        current = self.memory_limit
+        peak = max(self._memory)
+        start, end = self._pressure_start, self._read_pressure()
+        if start is not None and end is not None:
+            elapsed_us = (end[0] - start[0]) * 1000000
+            stalled = (end[1] - start[1]) / elapsed_us * 100 if elapsed_us > 0 else 0.0
+            pressure = stalled > self.memory_stall_percent
+            pressure_reason = f"stalled on memory {stalled:.1f}% of the time"
+        else:
+            pressure = bool(current) and peak / current * 100 > self.memory_pressure_percent
+            pressure_reason = f"peak at {peak / current:.0%} of the limit" if current else ""
+        if current and pressure:
+            target = current * self.max_step
+            reason = pressure_reason
+        else:
+            target = peak * self.memory_headroom
+            reason = f"peak {peak} bytes"
+        target = self._bounded(target, current, self.memory_bounds)
+        # Shrinking below what is in use would only trigger reclaim or OOM
+        target = int(max(target, min(peak * self.memory_headroom, self.memory_bounds[1])))
+
+        if current and abs(target - current) <= self.deadband * current:
+            return False
+        self._decide(timestamp, "memory_bytes", current, target, reason, self._set_memory_limit)
+        return True
+
+    def _set_memory_limit(self, target, sudo=False):
+        '''
+        Internal method to apply a memory target. Where memory.high is available (v2) the
+        target becomes the throttling limit and memory.max is kept above it as an OOM backstop.
+        '''
+        if not hasattr(self.manager, "set_memory_high"):
+            return self.manager.set_memory_limit(target, sudo=sudo)
+        self.manager.set_memory_high(target, sudo=sudo)
+        backstop = int(target * self.memory_headroom)
+        if self.memory_bounds is not None:
+            backstop = max(min(backstop, self.memory_bounds[1]), target)
+        return self.manager.set_memory_limit(backstop, sudo=sudo)
+
+    def _decide(self, timestamp, resource, current, target, reason, setter):
+        '''
+        Internal method to log a decision and, unless in dry-run mode, hand it to the worker thread.
+        '''
+        if self.dry_run:
+            logger.info("Dry run, would set %s: %s -> %s (%s)", resource, current, target, reason)
+            self.decisions.append(TuningDecision(timestamp, resource, current, target, reason, False))
+            return
+        logger.info("Setting %s: %s -> %s (%s)", resource, current, target, reason)
+        self._pending.append(
+            self._executor.submit(self._apply, timestamp, resource, current, target, reason, setter)
+        )
+
+    def _apply(self, timestamp, resource, current, target, reason, setter):
+        '''
+        Internal method to write a limit and record the decision, run on the worker thread.
+        '''
+        try:
+            setter(target, sudo=self.sudo)
+            applied = True
+        except Exception:
+            logger.exception("Failed to set %s to %s", resource, target)
+            applied = False
+        if applied:
+            setattr(self, _LIMITS[resource], target)
+        self.decisions.append(TuningDecision(timestamp, resource, current, target, reason, applied))
@@ -0,0 +1,1161 @@
+import json
+import logging
+import time
+import os
+import threading
+from array import array
+from collections import deque, namedtuple
+
+
+logger = logging.getLogger(__name__)
+
+# One monitoring tick, as passed to subscribers
+Sample = namedtuple("Sample", [
+    "timestamp",
+    "interval",
+    "cpu_usage_percent",
+    "memory_usage_bytes",
+    "memory_limit_bytes",
+    "cpu_throttled_ratio",
+], defaults=(0.0,))
+
+# Aligned series of the last samples, see BaseCGroupMonitor.snapshot(). The timestamps and
+# CPU counters start with the reading before the first sample, so they have one more entry.
+Snapshot = namedtuple("Snapshot", [
+    "timestamps_ns",
+    "cpu_usage_us",
+    "memory_usage",
+    "cpu_usage_percentages",
+    "sample_intervals",
+])
+
+# What readers on other threads may look at: the number of complete samples and the arrays
+# of the run holding them. The sampler replaces it as a whole after each sample.
+_View = namedtuple("_View", ["count", "timestamps_ns", "cpu_usage_us", "memory_usage"])
+
+# Raw cumulative counters, read in one go for profiling spans
+RawCounters = namedtuple("RawCounters", [
+    "cpu_usage_us",
+    "memory_usage_bytes",
+    "memory_peak_bytes",
+    "nr_throttled",
+    "throttled_usec",
+])
+
+
+def _copy_stats(stats):
+    '''
+    Internal function to copy a stats dict with the lists and dicts nested in it.
+    '''
+    return {
+        key: _copy_stats(value) if isinstance(value, dict) else list(value) if isinstance(value, list) else value
+        for key, value in stats.items()
+    }
+
+
+class BaseCGroupMonitor:
+    # Adaptive sampling: shorten the interval when CPU usage moves by more than
+    # ADAPTIVE_CPU_DELTA percentage points or memory by more than ADAPTIVE_MEMORY_DELTA
+    # of the limit in one sample, or when usage is above ADAPTIVE_NEAR_LIMIT percent.
+    # Lengthen it when both move by less than a fifth of that.
+    ADAPTIVE_CPU_DELTA = 10.0
+    ADAPTIVE_MEMORY_DELTA = 0.05
+    ADAPTIVE_NEAR_LIMIT = 80.0
+    ADAPTIVE_SHRINK_FACTOR = 0.5
+    ADAPTIVE_GROW_FACTOR = 1.5
+    # Profiling spans: only the records of the last MAX_SPAN_RECORDS spans are kept
+    MAX_SPAN_RECORDS = 10000
+
+    def __init__(self):
+        '''
+        Initialize the state shared by the v1 and v2 monitors.
+        Subclasses set up their cgroup paths and implement the file readers
+        (get_cpu_usage_us, get_cpu_limit, get_memory_usage, get_memory_limit) and exists().
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self.monitoring = False
+        # Raw samples: monotonic timestamps in ns and cumulative CPU usage in us, whose
+        # first entry is the baseline read when monitoring started, and memory usage in
+        # bytes. Percentages and intervals are derived from them when queried.
+        self.timestamps_ns = array("q")
+        self.cpu_usage_us = array("q")
+        self.memory_usage = array("q")
+        # Other threads read the samples through this view, never through the arrays'
+        # lengths, see _publish(). Arrays are only appended to, so a view stays valid.
+        self._view = _View(0, self.timestamps_ns, self.cpu_usage_us, self.memory_usage)
+        # Derived values of one view, as a (view, cache) pair that is replaced as a whole
+        self._query_cache = (None, {})
+        # Per-CPU cumulative usage, row-major 2-D arrays of percpu_columns CPUs per row.
+        # The first row is the baseline read when monitoring started.
+        self.percpu_columns = None
+        self.percpu_user_us = array("q")
+        self.percpu_system_us = array("q")
+        # Number of tasks and cumulative count of forks refused by pids.max, with a baseline
+        # row like the per-CPU arrays. Only sampled when pids_enabled.
+        self.pids_enabled = False
+        self.pids_current = array("q")
+        self.pids_limit_hits = array("q")
+        # Per-node anon and file memory in bytes, row-major like the per-CPU arrays with one
+        # column per node of numa_nodes. Only sampled when numa_nodes is not None.
+        self.numa_nodes = None
+        self.numa_anon_bytes = array("q")
+        self.numa_file_bytes = array("q")
+        self._numa_layout = None
+        self.monitor_thread = None
+        self.start_time = None
+        self._stop_event = threading.Event()
+        self._final_sample = False
+        self._sample_listeners = []
+        self.alerts = None
+        self.span_records = deque(maxlen=self.MAX_SPAN_RECORDS)
+        self._span_sampler = None
+        self._span_lock = threading.Lock()
+        self._fds = {}
+
+    def _read_file(self, path):
+        '''
+        Internal method to read the contents of a file.
+
+        Parameters:
+        - path (str): Path to the file.
+
+        Returns:
+        - content (str): Content of the file.
+        '''
+        try:
+            with open(path, "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _pread(self, path):
+        '''
+        Internal method to read a small file through a cached file descriptor.
+        Re-reading an open cgroup file from offset 0 is much cheaper than opening it again,
+        which matters on hot paths such as profiling spans.
+
+        Parameters:
+        - path (str): Path to the file.
+
+        Returns:
+        - content (str): Content of the file, None if it does not exist.
+        '''
+        fd = self._fds.get(path)
+        if fd is None:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                return None
+            cached = self._fds.setdefault(path, fd)
+            if cached != fd:
+                os.close(fd)
+                fd = cached
+        try:
+            return os.pread(fd, 65536, 0).decode()
+        except OSError:
+            # The cgroup was removed
+            self._fds.pop(path, None)
+            os.close(fd)
+            return None
+
+    def close(self):
+        '''
+        Stop monitoring if it is running and close the cached file descriptors.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        if self.monitoring:
+            self.stop_monitor()
+        if self._span_sampler is not None:
+            self._span_sampler.stop()
+            self._span_sampler = None
+        fds, self._fds = self._fds, {}
+        for fd in fds.values():
+            os.close(fd)
+
+    def _read_keyed_file(self, path):
+        '''
+        Internal method to read a flat keyed file such as cpu.stat or memory.stat.
+
+        Parameters:
+        - path (str): Path to the file.
+
+        Returns:
+        - values (dict): Key to integer value, empty if the file does not exist.
+        '''
+        content = self._read_file(path)
+        values = {}
+        if content:
+            for line in content.splitlines():
+                parts = line.split()
+                if len(parts) == 2:
+                    values[parts[0]] = int(parts[1])
+        return values
+
+    def get_num_cores(self):
+        '''
+        Get the number of cores the cgroup may use, from its CPU quota.
+
+        Parameters:
+        - None
+
+        Returns:
+        - num_cores (float): quota / period, or the number of CPUs if there is no quota.
+        '''
+        quota, period = self.get_cpu_limit()
+        if quota and quota > 0 and period:
+            return quota / period
+        return os.cpu_count()
+
+    def subscribe(self, listener):
+        '''
+        Call listener(sample) from the monitor thread after every sample.
+        Listeners should return quickly, they delay the next sample.
+
+        Parameters:
+        - listener (callable): Function taking a Sample.
+
+        Returns:
+        - None
+        '''
+        # Copy on write, the monitor thread iterates without a lock
+        self._sample_listeners = self._sample_listeners + [listener]
+
+    def unsubscribe(self, listener):
+        '''
+        Stop calling a listener added with subscribe().
+
+        Parameters:
+        - listener (callable): Listener to remove.
+
+        Returns:
+        - None
+        '''
+        # Equality, not identity: each access to a bound method creates a new object
+        self._sample_listeners = [x for x in self._sample_listeners if x != listener]
+
+    def share_stats(self, name=None, capacity=1024):
+        '''
+        Publish every sample to a shared memory segment, see cgroup_monitor.shared
+        for the layout. Other processes read it with SharedStatsReader(name).
+        Requires Python 3.8+.
+
+        Parameters:
+        - name (str): Name of the segment. Default is None, which generates a unique name.
+        - capacity (int): Number of samples kept in the ring. Default is 1024.
+
+        Returns:
+        - writer (SharedStatsWriter): The writer, call writer.close() to stop publishing and
+            remove the segment.
+        '''
+        from .shared import SharedStatsWriter
+
+        writer = SharedStatsWriter(name, capacity)
+        writer.monitor = self
+        self.subscribe(writer.publish)
+        return writer
+
+    def add_alert_rule(self, rule):
+        '''
+        Evaluate an alert rule on every sample, see cgroup_monitor.alerts.
+        Events of rules without a callback are put on monitor.alerts.events.
+
+        Parameters:
+        - rule (AlertRule): Rule to add.
+
+        Returns:
+        - rule (AlertRule): The added rule.
+        '''
+        if self.alerts is None:
+            from .alerts import AlertEngine
+
+            self.alerts = AlertEngine()
+            self.subscribe(self.alerts.evaluate)
+        return self.alerts.add_rule(rule)
+
+    def remove_alert_rule(self, rule):
+        '''
+        Stop evaluating an alert rule.
+
+        Parameters:
+        - rule (AlertRule): Rule to remove.
+
+        Returns:
+        - None
+        '''
+        if self.alerts is not None:
+            self.alerts.remove_rule(rule)
+
+    def _get_span_sampler(self):
+        '''
+        Internal method to get the background sampler shared by all spans, started on first use.
+        '''
+        if self._span_sampler is None:
+            from .profiling import SpanSampler
+
+            with self._span_lock:
+                if self._span_sampler is None:
+                    self._span_sampler = SpanSampler(self)
+        return self._span_sampler
+
+    def span(self, name):
+        '''
+        Measure the cgroup's CPU usage, memory and throttling over a block of code.
+        Spans can be nested and opened from several threads at once. Each span adds
+        a SpanRecord to span_records when it ends, which keeps the last MAX_SPAN_RECORDS.
+        ```
+        with monitor.span("load_model"):
+            model = load_model()
+        ```
+
+        Parameters:
+        - name (str): Name of the span.
+
+        Returns:
+        - span (Span): Context manager, its record attribute holds the SpanRecord after the block.
+        '''
+        from .profiling import Span
+
+        return Span(self, name)
+
+    def profile(self, func=None, name=None):
+        '''
+        Decorator running each call of a function inside a span, see span().
+        Can be used as @monitor.profile or @monitor.profile(name="...").
+
+        Parameters:
+        - func (callable): Function to profile. Default is None.
+        - name (str): Name of the span. Default is None, which uses the function's qualified name.
+
+        Returns:
+        - wrapper (callable): The wrapped function, or a decorator if func is None.
+        '''
+        from .profiling import profile
+
+        if func is None:
+            return profile(self, name)
+        return profile(self, name)(func)
+
+    def _next_interval(self, interval, min_interval, max_interval, cpu_delta, memory_delta, near_limit):
+        '''
+        Internal method to pick the next sampling interval in adaptive mode.
+
+        Parameters:
+        - interval (float): Current interval in seconds.
+        - min_interval (float): Lower bound in seconds.
+        - max_interval (float): Upper bound in seconds.
+        - cpu_delta (float): Change in CPU usage percentage since the last sample.
+        - memory_delta (float): Change in memory usage since the last sample, as a fraction of the limit.
+        - near_limit (bool): Whether CPU or memory usage is close to its limit.
+
+        Returns:
+        - interval (float): Next interval in seconds.
+        '''
+        if near_limit or cpu_delta > self.ADAPTIVE_CPU_DELTA or memory_delta > self.ADAPTIVE_MEMORY_DELTA:
+            interval *= self.ADAPTIVE_SHRINK_FACTOR
+        elif cpu_delta < self.ADAPTIVE_CPU_DELTA / 5 and memory_delta < self.ADAPTIVE_MEMORY_DELTA / 5:
+            interval *= self.ADAPTIVE_GROW_FACTOR
+        return min(max(interval, min_interval), max_interval)
+
+    def _monotonic_ns(self):
+        '''
+        Internal method to read the clock samples are timestamped with. Replays override
+        the clock methods to run on the trace's time instead.
+        '''
+        return time.monotonic_ns()
+
+    def _wall_time(self):
+        '''
+        Internal method to read the wall clock time, in seconds since the epoch.
+        '''
+        return time.time()
+
+    def _wait(self, timeout):
+        '''
+        Internal method to wait for the next sample, returns True once monitoring is stopped.
+        '''
+        return self._stop_event.wait(timeout)
+
+    def _monitor(self, interval, min_interval=None, max_interval=None):
+        '''
+        Internal method to monitor CPU and memory usage.
+        Each tick only appends the raw counters, CPU percentages are derived when queried.
+        They are only computed here when listeners or adaptive sampling need them.
+
+        Parameters:
+        - interval (float): Monitoring interval in seconds. Initial interval in adaptive mode.
+        - min_interval (float): Lower bound of the interval in adaptive mode. Default is None.
+        - max_interval (float): Upper bound of the interval in adaptive mode. Default is None.
+
+        Returns:
+        - None
+        '''
+        adaptive = min_interval is not None and max_interval is not None
+        percpu = self.percpu_columns is not None
+        pids = self.pids_enabled
+        numa = self.numa_nodes is not None
+        while True:
+            try:
+                percpu_usage = self.get_cpu_usage_percpu() if percpu else None
+                pids_counters = self.get_pids_counters() if pids else None
+                numa_stat = self.get_memory_numa_stat() if numa else None
+                cpu_usage = self.get_cpu_usage_us()
+                now = self._monotonic_ns()
+                previous_throttling = self.get_cpu_throttling()
+                break
+            except OSError:
+                # The cgroup was removed before the first sample
+                return
+            except ValueError:
+                # A file was read while it was rewritten, try again at the next tick
+                if self._wait(interval):
+                    return
+        if percpu:
+            self._append_percpu(percpu_usage)
+        if pids:
+            self._append_pids(pids_counters)
+        if numa:
+            self._append_numa(numa_stat)
+        self.cpu_usage_us.append(cpu_usage)
+        self.timestamps_ns.append(now)
+        previous_cpu_percentage = None
+        previous_memory = None
+
+        while True:
+            stopped = self._wait(interval)
+            if stopped and not self._final_sample:
+                break
+            try:
+                cpu_usage = self.get_cpu_usage_us()
+                now = self._monotonic_ns()
+                memory = self.get_memory_usage()
+                percpu_usage = self.get_cpu_usage_percpu() if percpu else None
+                pids_counters = self.get_pids_counters() if pids else None
+                numa_stat = self.get_memory_numa_stat() if numa else None
+            except (OSError, ValueError):
+                # The cgroup was removed, keep what was sampled so far. A failed or partial
+                # read of a cgroup that still exists only loses this sample.
+                if stopped or not self.exists():
+                    break
+                continue
+            # Missing files read as 0, so a counter that goes back or stops advancing
+            # (e.g. an idle cgroup that is removed) may mean the cgroup is gone
+            if cpu_usage <= self.cpu_usage_us[-1] and not self.exists():
+                break
+            # Rows are only appended once every read succeeded, so all series stay aligned
+            if percpu:
+                self._append_percpu(percpu_usage)
+            if pids:
+                self._append_pids(pids_counters)
+            if numa:
+                self._append_numa(numa_stat)
+
+            # Memory goes last, its length is the number of complete samples
+            delta_cpu_usage = cpu_usage - self.cpu_usage_us[-1]
+            elapsed = (now - self.timestamps_ns[-1]) / 1e9
+            self.cpu_usage_us.append(cpu_usage)
+            self.timestamps_ns.append(now)
+            self.memory_usage.append(memory)
+            self._publish()
+            if stopped:
+                break
+
+            listeners = self._sample_listeners
+            if not (adaptive or listeners):
+                continue
+
+            cpu_usage_percentage = delta_cpu_usage / (self.get_num_cores() * elapsed * 1000000) * 100
+            memory_limit = self.get_memory_limit() or 0
+            if listeners:
+                throttling = self.get_cpu_throttling()
+                delta_periods = throttling[0] - previous_throttling[0]
+                throttled_ratio = (throttling[1] - previous_throttling[1]) / delta_periods if delta_periods > 0 else 0.0
+                previous_throttling = throttling
+                sample = Sample(
+                    self._wall_time(), elapsed, cpu_usage_percentage, memory, memory_limit, throttled_ratio
+                )
+                for listener in listeners:
+                    try:
+                        listener(sample)
+                    except Exception:
+                        # A failing listener must not end monitoring
+                        logger.exception("Sample listener %r failed", listener)
+
+            if adaptive:
+                memory_scale = memory_limit if memory_limit > 0 else max(memory, 1)
+                cpu_delta = memory_delta = 0
+                if previous_memory is not None:
+                    cpu_delta = abs(cpu_usage_percentage - previous_cpu_percentage)
+                    memory_delta = abs(memory - previous_memory) / memory_scale
+                near_limit = (
+                    cpu_usage_percentage > self.ADAPTIVE_NEAR_LIMIT
+                    or (memory_limit > 0 and memory / memory_limit * 100 > self.ADAPTIVE_NEAR_LIMIT)
+                )
+                interval = self._next_interval(
+                    interval, min_interval, max_interval, cpu_delta, memory_delta, near_limit
+                )
+            previous_cpu_percentage = cpu_usage_percentage
+            previous_memory = memory
+
+    def _publish(self):
+        '''
+        Internal method to make the samples appended so far visible to readers. The view is
+        replaced in a single assignment, so a reader always gets a sample count matching
+        the arrays it comes with, without locking and without waiting for the sampler.
+        '''
+        self._view = _View(len(self.memory_usage), self.timestamps_ns, self.cpu_usage_us, self.memory_usage)
+
+    def _cached(self, key, compute):
+        '''
+        Internal method to memoise a derived value until the next sample arrives.
+        compute is called with the view the value is derived from.
+        '''
+        view = self._view
+        cached_view, cache = self._query_cache
+        if view is not cached_view:
+            cache = {}
+            self._query_cache = (view, cache)
+        if key not in cache:
+            cache[key] = compute(view)
+        return cache[key]
+
+    @staticmethod
+    def _first(count, n):
+        '''
+        Internal method to get the index of the first of the last n samples out of count.
+        '''
+        return count - min(count, n) if n is not None else 0
+
+    @staticmethod
+    def _intervals(view, first):
+        '''
+        Internal method to derive the intervals in seconds of the samples of a view from first.
+        '''
+        timestamps = view.timestamps_ns
+        return [(timestamps[i + 1] - timestamps[i]) / 1e9 for i in range(first, view.count)]
+
+    @staticmethod
+    def _cpu_percentages(view, first, num_cores):
+        '''
+        Internal method to derive the CPU usage percentages of the samples of a view from first.
+        '''
+        counters = view.cpu_usage_us
+        timestamps = view.timestamps_ns
+        # us / (cores * ns / 1000) * 100
+        scale = 100000 / num_cores
+        return [
+            (counters[i + 1] - counters[i]) * scale / (timestamps[i + 1] - timestamps[i])
+            for i in range(first, view.count)
+        ]
+
+    def _default_num_cores(self):
+        '''
+        Internal method to get the current number of cores, read at most once per sample.
+        '''
+        return self._cached("num_cores", lambda view: self.get_num_cores())
+
+    def get_sample_intervals(self, n=None):
+        '''
+        Get the interval in seconds covered by each sample, derived from the raw timestamps.
+        Results are cached until the next sample and shared, hence immutable.
+
+        Parameters:
+        - n (int): Number of most recent samples. Default is None (all samples).
+
+        Returns:
+        - intervals (tuple): Interval of each sample.
+        '''
+        return self._cached(
+            ("intervals", n), lambda view: tuple(self._intervals(view, self._first(view.count, n)))
+        )
+
+    def get_cpu_usage_percentages(self, n=None, num_cores=None):
+        '''
+        Get the CPU usage percentage of each sample, derived from the raw counters.
+        Results are cached until the next sample and shared, hence immutable.
+
+        Parameters:
+        - n (int): Number of most recent samples. Default is None (all samples).
+        - num_cores (float): Number of cores 100% stands for. Default is None, which
+            uses the current CPU limit (see get_num_cores()).
+
+        Returns:
+        - percentages (tuple): CPU usage percentage of each sample.
+        '''
+        if num_cores is None:
+            num_cores = self._default_num_cores()
+        return self._cached(
+            ("cpu", n, num_cores),
+            lambda view: tuple(self._cpu_percentages(view, self._first(view.count, n), num_cores)),
+        )
+
+    def snapshot(self, n=None):
+        '''
+        Get the last n samples as aligned series, e.g. from another thread while the monitor
+        is sampling. The series belong to the same samples even if one is taken in the
+        meantime, and the sampler is never blocked. Only the requested samples are copied,
+        the caller owns the result.
+
+        Parameters:
+        - n (int): Number of most recent samples. Default is None (all samples).
+
+        Returns:
+        - snapshot (Snapshot): Timestamps and CPU counters (n + 1 entries), memory usage,
+            CPU usage percentages and intervals (n entries).
+        '''
+        view = self._view
+        count = view.count
+        first = self._first(count, n)
+        num_cores = self._default_num_cores()
+        return Snapshot(
+            view.timestamps_ns[first:count + 1],
+            view.cpu_usage_us[first:count + 1],
+            view.memory_usage[first:count],
+            self._cpu_percentages(view, first, num_cores),
+            self._intervals(view, first),
+        )
+
+    @property
+    def cpu_usage_percentages(self):
+        '''
+        CPU usage percentage of each sample, see get_cpu_usage_percentages().
+        '''
+        return self.get_cpu_usage_percentages()
+
+    @property
+    def sample_intervals(self):
+        '''
+        Interval in seconds covered by each sample, see get_sample_intervals().
+        '''
+        return self.get_sample_intervals()
+
+    def _append_percpu(self, percpu_usage):
+        '''
+        Internal method to append one row of per-CPU usage counters.
+        '''
+        user, system = percpu_usage
+        if not self.percpu_columns:
+            self.percpu_columns = len(user)
+        # Keep rows aligned if CPUs are hot-plugged
+        padding = [0] * max(self.percpu_columns - len(user), 0)
+        self.percpu_user_us.extend((user + padding)[:self.percpu_columns])
+        self.percpu_system_us.extend((system + padding)[:self.percpu_columns])
+
+    def _append_pids(self, counters):
+        '''
+        Internal method to append one row of pids counters.
+        '''
+        current, limit_hits = counters or (0, self.pids_limit_hits[-1] if self.pids_limit_hits else 0)
+        self.pids_current.append(current)
+        self.pids_limit_hits.append(limit_hits)
+
+    def _parse_numa_stat(self, content, keys, scale=1):
+        '''
+        Internal method to get (nodes, anon bytes, file bytes) from memory.numa_stat, trying
+        each (anon line prefix, file line prefix) of keys in turn. The lines and node columns
+        are located once, later reads index straight into them while the layout holds.
+        '''
+        lines = content.split("\n")
+        layout = self._numa_layout
+        if layout is not None:
+            anon_index, anon_key, file_index, file_key, nodes, offsets = layout
+            if not (
+                file_index < len(lines)
+                and lines[anon_index].startswith(anon_key)
+                and lines[file_index].startswith(file_key)
+            ):
+                layout = None
+        if layout is None:
+            for anon_key, file_key in keys:
+                indexes = [next((i for i, line in enumerate(lines) if line.startswith(key)), None)
+                           for key in (anon_key, file_key)]
+                if None not in indexes:
+                    break
+            else:
+                return None
+            anon_index, file_index = indexes
+            # Columns look like N0=123, the first field is the total
+            fields = lines[anon_index].split()[1:]
+            nodes = [int(field[1:field.index("=")]) for field in fields]
+            offsets = [field.index("=") + 1 for field in fields]
+            layout = self._numa_layout = (anon_index, anon_key, file_index, file_key, nodes, offsets)
+
+        anon_fields = lines[anon_index].split()[1:]
+        file_fields = lines[file_index].split()[1:]
+        if len(anon_fields) != len(offsets) or len(file_fields) != len(offsets):
+            # Nodes came or went, locate them again
+            self._numa_layout = None
+            return self._parse_numa_stat(content, keys, scale)
+        return (
+            nodes,
+            [int(field[offset:]) * scale for field, offset in zip(anon_fields, offsets)],
+            [int(field[offset:]) * scale for field, offset in zip(file_fields, offsets)],
+        )
+
+    def _append_numa(self, numa_stat):
+        '''
+        Internal method to append one row of per-node memory.
+        '''
+        columns = len(self.numa_nodes)
+        if numa_stat is None:
+            anon = file = []
+        else:
+            nodes, anon, file = numa_stat
+            if nodes != self.numa_nodes:
+                # Keep the columns of the first row if nodes are hot-plugged
+                anon = [anon[nodes.index(node)] if node in nodes else 0 for node in self.numa_nodes]
+                file = [file[nodes.index(node)] if node in nodes else 0 for node in self.numa_nodes]
+        padding = [0] * max(columns - len(anon), 0)
+        self.numa_anon_bytes.extend(anon + padding)
+        self.numa_file_bytes.extend(file + padding)
+
+    def get_numa_stats(self, n=None):
+        '''
+        Get the spread of the cgroup's memory over NUMA nodes during the last n samples.
+        Requires start_monitor(numa=True). Locality is the share of the memory on the nodes
+        the cgroup may allocate from (cpuset.mems), memory elsewhere is remote to its tasks.
+
+        Parameters:
+        - n (int): Number of samples to aggregate. Default is None (all samples).
+
+        Returns:
+        - stats (dict): Nodes, average anon and file bytes per node, the share of each node,
+            the allowed nodes and the locality ratio (1 when all memory is on allowed nodes).
+        '''
+        if not self.numa_nodes:
+            raise RuntimeError("NUMA sampling is not enabled.")
+        return self._numa_stats(self._view, n)
+
+    def _numa_stats(self, view, n):
+        '''
+        Internal method to derive the NUMA stats of the last n samples of a view.
+        '''
+        nodes = self.numa_nodes
+        columns = len(nodes)
+        rows = len(self.numa_anon_bytes) // columns
+        # Rows can run one ahead of the complete samples while a sample is taken
+        last = min(rows - 1, view.count)
+        first = self._first(last, n)
+        # Average the samples, not the baseline row, unless there is nothing else
+        start = first + 1 if last > first else last
+        count = last - start + 1
+
+        def averages(values):
+            return [sum(values[start * columns + node:(last + 1) * columns:columns]) / count
+                    for node in range(columns)]
+
+        anon = averages(self.numa_anon_bytes)
+        file = averages(self.numa_file_bytes)
+        totals = [a + f for a, f in zip(anon, file)]
+        total = sum(totals)
+        allowed = self.get_cpuset_mems() or nodes
+        local = sum(bytes_ for node, bytes_ in zip(nodes, totals) if node in allowed)
+        return {
+            "nodes": list(nodes),
+            "average_anon_bytes": [round(x) for x in anon],
+            "average_file_bytes": [round(x) for x in file],
+            "node_distribution_percent": [round(x / total * 100, 2) if total else 0 for x in totals],
+            "allowed_nodes": allowed,
+            "average_remote_bytes": round(total - local),
+            "locality_ratio": round(local / total, 4) if total else 1.0,
+        }
+
+    def get_pids_stats(self, n=None):
+        '''
+        Get task count stats over the last n samples. Requires start_monitor(pids=True).
+        Fork and exit rates come from the changes of pids.current between samples, so they
+        are lower bounds: tasks that start and exit within one interval are not seen.
+
+        Parameters:
+        - n (int): Number of samples to aggregate. Default is None (all samples).
+
+        Returns:
+        - stats (dict): Average and max number of tasks, the same in percent of pids.max,
+            fork and exit rates per second and the number of forks refused by pids.max.
+        '''
+        if not self.pids_enabled:
+            raise RuntimeError("pids sampling is not enabled.")
+        return self._pids_stats(self._view, n)
+
+    def _pids_stats(self, view, n):
+        '''
+        Internal method to derive the task count stats of the last n samples of a view.
+        '''
+        # Rows can run one ahead of the complete samples while a sample is taken
+        last = min(len(self.pids_current) - 1, view.count)
+        first = self._first(last, n)
+        current = self.pids_current
+        timestamps = view.timestamps_ns
+
+        forks = exits = weighted = 0
+        for i in range(first, last):
+            delta = current[i + 1] - current[i]
+            if delta > 0:
+                forks += delta
+            else:
+                exits -= delta
+            weighted += current[i + 1] * (timestamps[i + 1] - timestamps[i])
+        elapsed_ns = timestamps[last] - timestamps[first]
+        elapsed_s = elapsed_ns / 1e9
+        average = weighted / elapsed_ns if elapsed_ns else current[last]
+        maximum = max(current[first + 1:last + 1], default=current[last])
+        limit = self.get_pids_limit()
+        return {
+            "average_pids": round(average, 2),
+            "max_pids": maximum,
+            "pids_limit": limit,
+            "average_pids_percent": round(average / limit * 100, 2) if limit else 0,
+            "max_pids_percent": round(maximum / limit * 100, 2) if limit else 0,
+            "fork_rate_per_s": round(forks / elapsed_s, 2) if elapsed_s else 0,
+            "exit_rate_per_s": round(exits / elapsed_s, 2) if elapsed_s else 0,
+            "pids_limit_hits": self.pids_limit_hits[last] - self.pids_limit_hits[first],
+        }
+
+    def get_percpu_stats(self, n=None):
+        '''
+        Get per-core utilisation over the last n samples. Requires start_monitor(percpu=True).
+        On cgroup v2 the kernel only exposes totals, so there is a single column holding the
+        usage of all CPUs, and the busiest core and imbalance ratio are None.
+
+        Parameters:
+        - n (int): Number of samples to aggregate. Default is None (all samples).
+
+        Returns:
+        - stats (dict): Per-core usage, user and system percentages of one core, the busiest
+            core and the imbalance ratio (busiest core / average core, 1 when evenly spread).
+        '''
+        if not self.percpu_columns:
+            raise RuntimeError("Per-CPU sampling is not enabled.")
+        return self._percpu_stats(self._view, n)
+
+    def _percpu_stats(self, view, n):
+        '''
+        Internal method to derive the per-core stats of the last n samples of a view.
+        '''
+        columns = self.percpu_columns
+        rows = len(self.percpu_user_us) // columns
+        # Rows can run one ahead of the complete samples while a sample is taken
+        last = min(rows - 1, view.count)
+        first = self._first(last, n)
+        elapsed_us = (view.timestamps_ns[last] - view.timestamps_ns[first]) / 1000
+
+        def percentages(counters):
+            return [
+                (counters[last * columns + cpu] - counters[first * columns + cpu]) / elapsed_us * 100
+                if elapsed_us else 0.0
+                for cpu in range(columns)
+            ]
+
+        user = percentages(self.percpu_user_us)
+        system = percentages(self.percpu_system_us)
+        usage = [u + s for u, s in zip(user, system)]
+        stats = {
+            "per_core_usage_percent": [round(x, 2) for x in usage],
+            "per_core_user_percent": [round(x, 2) for x in user],
+            "per_core_system_percent": [round(x, 2) for x in system],
+            "busiest_core": None,
+            "max_core_usage_percent": None,
+            "imbalance_ratio": None,
+        }
+        # A single column is the total of all CPUs, not a core
+        if columns > 1:
+            mean = sum(usage) / columns
+            busiest = max(range(columns), key=usage.__getitem__)
+            stats["busiest_core"] = busiest
+            stats["max_core_usage_percent"] = round(usage[busiest], 2)
+            stats["imbalance_ratio"] = round(usage[busiest] / mean, 2) if mean else 0
+        return stats
+
+    def summary(self):
+        '''
+        Get a mergeable summary of the samples recorded so far, see cgroup_monitor.summary.
+
+        Parameters:
+        - None
+
+        Returns:
+        - summary (Summary): Summary of the samples.
+        '''
+        from .summary import Summary
+
+        return Summary.from_samples(
+            self.cpu_usage_percentages,
+            self.memory_usage,
+            self.sample_intervals,
+            self.get_memory_limit(),
+            self.start_time,
+        )
+
+    def save_recording(self, path):
+        '''
+        Save the recorded samples as JSON. Recordings can be merged and summarised
+        like summaries, e.g. with python -m cgroup_monitor.summary.
+
+        Parameters:
+        - path (str): Path of the file to write.
+
+        Returns:
+        - None
+        '''
+        data = {
+            "type": "recording",
+            "version": 1,
+            "cgroup_name": self.cgroup_name,
+            "start_time": self.start_time,
+            "memory_limit_bytes": self.get_memory_limit(),
+            "cpu_usage_percentages": list(self.cpu_usage_percentages),
+            "memory_usage": list(self.memory_usage),
+            "sample_intervals": list(self.sample_intervals),
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def save_trace(self, path):
+        '''
+        Save the raw counters as JSON, to be replayed with cgroup_monitor.replay. Unlike a
+        recording, a trace keeps the raw timestamps and cumulative CPU usage, so a replay
+        computes exactly the same stats as the live monitor.
+
+        Parameters:
+        - path (str): Path of the file to write.
+
+        Returns:
+        - None
+        '''
+        view = self._view
+        count = view.count
+        memory_usage = list(view.memory_usage[:count])
+        quota, period = self.get_cpu_limit()
+        data = {
+            "type": "trace",
+            "version": 1,
+            "cgroup_name": self.cgroup_name,
+            "start_time": self.start_time,
+            "cpu_quota": quota,
+            "cpu_period": period,
+            "memory_limit_bytes": self.get_memory_limit(),
+            "timestamps_ns": list(view.timestamps_ns[:count + 1]),
+            "cpu_usage_us": list(view.cpu_usage_us[:count + 1]),
+            # Memory is not read with the baseline, repeat the first sample
+            "memory_usage": memory_usage[:1] + memory_usage,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def start_monitor(self, interval=1.0, min_interval=None, max_interval=None, percpu=False, pids=False,
+                      numa=False):
+        '''
+        Start monitoring CPU and memory usage.
+        If both min_interval and max_interval are given, the interval adapts to the signal:
+        it shrinks when CPU or memory usage changes quickly or gets close to its limit,
+        and grows while usage is steady.
+
+        Parameters:
+        - interval (float): Monitoring interval in seconds. Default is 1 second.
+            Can be a float value for higher precision. Initial interval in adaptive mode.
+        - min_interval (float): Lower bound of the interval in adaptive mode. Default is None.
+        - max_interval (float): Upper bound of the interval in adaptive mode. Default is None.
+        - percpu (bool): Also sample per-CPU user and system usage, see get_percpu_stats().
+            Default is False.
+        - pids (bool): Also sample the number of tasks, see get_pids_stats(). Ignored if the
+            pids controller is not enabled for the cgroup. Default is False.
+        - numa (bool): Also sample the memory on each NUMA node, see get_numa_stats().
+            Ignored if the kernel has no memory.numa_stat. Default is False.
+
+        Returns:
+        - None
+        '''
+        if self.monitoring:
+            raise RuntimeError("Monitoring is already running.")
+        if (min_interval is None) != (max_interval is None):
+            raise ValueError("Both min_interval and max_interval are needed for adaptive sampling.")
+        if min_interval is not None:
+            if not 0 < min_interval <= max_interval:
+                raise ValueError("Expected 0 < min_interval <= max_interval.")
+            interval = min(max(interval, min_interval), max_interval)
+
+        self.monitoring = True
+        self.timestamps_ns = array("q")
+        self.cpu_usage_us = array("q")
+        self.memory_usage = array("q")
+        self._publish()
+        self.percpu_columns = 0 if percpu else None
+        self.percpu_user_us = array("q")
+        self.percpu_system_us = array("q")
+        self.pids_enabled = pids and self.get_pids_counters() is not None
+        self.pids_current = array("q")
+        self.pids_limit_hits = array("q")
+        self._numa_layout = None
+        numa_stat = self.get_memory_numa_stat() if numa else None
+        self.numa_nodes = numa_stat[0] if numa_stat else None
+        self.numa_anon_bytes = array("q")
+        self.numa_file_bytes = array("q")
+        self.start_time = self._wall_time()
+        self._stop_event.clear()
+        self.monitor_thread = threading.Thread(
+            target=self._monitor, args=(interval, min_interval, max_interval), daemon=True
+        )
+        self.monitor_thread.start()
+
+    def stop_sampling(self, final_sample=False):
+        '''
+        Stop the monitoring thread without computing any stats, which would read the
+        cgroup's limits. The recorded samples stay available, e.g. after the cgroup was removed.
+
+        Parameters:
+        - final_sample (bool): Take one last sample covering the time since the previous one.
+            Default is False.
+
+        Returns:
+        - None
+        '''
+        if not self.monitoring:
+            raise RuntimeError("Monitoring is not running.")
+
+        self.monitoring = False
+        self._final_sample = final_sample
+        self._stop_event.set()
+        self.monitor_thread.join()
+        self.monitor_thread = None
+
+    def _usage_stats(self, cpu_usage_percentages, memory_usage, sample_intervals, info_level):
+        '''
+        Internal method to aggregate a window of samples.
+        Averages are weighted by each sample's interval, so they stay correct when
+        the interval varies.
+
+        Parameters:
+        - cpu_usage_percentages (list): CPU usage percentage of each sample.
+        - memory_usage (list): Memory usage in bytes of each sample.
+        - sample_intervals (list): Interval in seconds covered by each sample.
+        - info_level (int): Level of information to return.
+
+        Returns:
+        - stats (dict): Dictionary containing average and max usage stats.
+        '''
+        total_time = sum(sample_intervals)
+        avg_cpu = (
+            sum(c * t for c, t in zip(cpu_usage_percentages, sample_intervals)) / total_time
+            if total_time else 0
+        )
+        avg_memory = (
+            sum(m * t for m, t in zip(memory_usage, sample_intervals)) / total_time
+            if total_time else 0
+        )
+        memory_limit = self.get_memory_limit()
+        avg_memory_gb = avg_memory / (1024 ** 3)
+        avg_memory_percent = (avg_memory / memory_limit) * 100 if memory_limit else 0
+
+        max_cpu = max(cpu_usage_percentages, default=0)
+        max_memory = max(memory_usage, default=0)
+        max_memory_gb = max_memory / (1024 ** 3)
+        max_memory_percent = (max_memory / memory_limit) * 100 if memory_limit else 0
+
+        if info_level == 1:
+            return {
+                "average_cpu_usage_percent": round(avg_cpu, 2),
+                "max_cpu_usage_percent": round(max_cpu, 2),
+                "cpu_usage_percentage_list": list(cpu_usage_percentages),
+                "average_memory_usage_gib": round(avg_memory_gb, 2),
+                "max_memory_usage_gib": round(max_memory_gb, 2),
+                "average_memory_usage_percent": round(avg_memory_percent, 2),
+                "max_memory_usage_percent": round(max_memory_percent, 2),
+                "memory_usage_bytes_list": list(memory_usage),
+                "sample_interval_list": list(sample_intervals),
+            }
+
+        return {
+            "average_cpu_usage_percent": round(avg_cpu, 2),
+            "max_cpu_usage_percent": round(max_cpu, 2),
+            "average_memory_usage_gib": round(avg_memory_gb, 2),
+            "max_memory_usage_gib": round(max_memory_gb, 2),
+            "average_memory_usage_percent": round(avg_memory_percent, 2),
+            "max_memory_usage_percent": round(max_memory_percent, 2),
+        }
+
+    def get_last_n_stats(self, n=1, info_level=0):
+        '''
+        Get the last n stats recorded.
+
+        Parameters:
+        - n (int): Number of stats to retrieve. Default is 1.
+        - info_level (int): Level of information to return. Default is 0.
+            - 0: Return average and max usage stats.
+            - 1: Return detailed stats including all recorded values.
+
+        Returns:
+        - stats (dict): Dictionary containing average and max usage stats.
+        '''
+        if not self.monitoring:
+            raise RuntimeError("Monitoring is not running.")
+
+        num_cores = self._default_num_cores()
+
+        def compute(view):
+            first = self._first(view.count, n)
+            stats = self._usage_stats(
+                self._cpu_percentages(view, first, num_cores),
+                view.memory_usage[first:view.count],
+                self._intervals(view, first),
+                info_level,
+            )
+            if self.percpu_columns:
+                stats["percpu"] = self._percpu_stats(view, n)
+            if self.pids_enabled:
+                stats["pids"] = self._pids_stats(view, n)
+            if self.numa_nodes:
+                stats["numa"] = self._numa_stats(view, n)
+            return stats
+
+        # The cached stats are shared, callers get their own lists
+        return _copy_stats(self._cached(("stats", n, info_level), compute))
+
+    def stop_monitor(self, info_level=0):
+        '''
+        Stop monitoring and return average and max usage stats.
+        ```
+        Returns:
+            dict = {
+                "average_cpu_usage_percent": float,
+                "max_cpu_usage_percent": float,
+                "average_memory_usage_gib": float,
+                "max_memory_usage_gib": float,
+                "average_memory_usage_percent": float,
+                "max_memory_usage_percent": float,
+                "monitoring_duration_s": float
+            }
+        ```
+
+        Parameters:
+        - info_level (int): Level of information to return. Default is 0.
+            - 0: Return average and max usage stats.
+            - 1: Return detailed stats including all recorded values.
+
+        Returns:
+        - stats (dict): Dictionary containing average and max usage stats.
+        '''
+        self.stop_sampling()
+        total_time = self._wall_time() - self.start_time
+
+        stats = self._usage_stats(
+            self.cpu_usage_percentages, self.memory_usage, self.sample_intervals, info_level
+        )
+        if self.percpu_columns:
+            stats["percpu"] = self.get_percpu_stats()
+        if self.pids_enabled:
+            stats["pids"] = self.get_pids_stats()
+        if self.numa_nodes:
+            stats["numa"] = self.get_numa_stats()
+        if info_level == 1:
+            stats["start_time"] = self.start_time
+        stats["monitoring_duration_s"] = round(total_time, 2)
+        return stats
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import resource
+import select
+import shutil
+import sys
+import time
+
+from . import summary
+from .scanner import CGroupScanner
+
+
+# Sort keys of the top view, and the key switching to each of them
+SORT_KEYS = {
+    "cpu": lambda stats: stats.cpu_cores,
+    "memory": lambda stats: stats.memory_bytes,
+    "memory_percent": lambda stats: stats.memory_percent,
+    "throttled": lambda stats: stats.throttled_ratio,
+    "cpu_pressure": lambda stats: stats.cpu_pressure_percent,
+    "memory_pressure": lambda stats: stats.memory_pressure_percent,
+    "name": lambda stats: stats.name,
+}
+SORT_SHORTCUTS = {"c": "cpu", "m": "memory", "%": "memory_percent", "t": "throttled",
+                  "p": "cpu_pressure", "P": "memory_pressure", "n": "name"}
+
+# Default seconds between refreshes of top, stretched for large trees so that
+# sampling takes at most MAX_SAMPLING_SHARE of a CPU
+DEFAULT_REFRESH_INTERVAL = 2.0
+MAX_SAMPLING_SHARE = 0.01
+
+HEADER = (
+    f"{'CORES':>6} {'CPU%':>6} {'CPU LIM':>7} {'MEMORY':>9} {'MEM LIM':>9} {'MEM%':>6} "
+    f"{'THR%':>5} {'CPU PSI':>7} {'MEM PSI':>7}  CGROUP"
+)
+
+
+def format_bytes(value):
+    '''
+    Format a number of bytes with a binary unit, e.g. 1.5G.
+
+    Parameters:
+    - value (int): Number of bytes.
+
+    Returns:
+    - text (str): The formatted value.
+    '''
+    for unit in ("", "K", "M", "G", "T"):
+        if abs(value) < 1024 or unit == "T":
+            return f"{value:.0f}{unit}" if unit == "" else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+def format_row(stats):
+    '''
+    Format the CGroupStats of one cgroup as a row of the top view.
+
+    Parameters:
+    - stats (CGroupStats): Stats of the cgroup.
+
+    Returns:
+    - row (str): The row.
+    '''
+    cpu_limit = f"{stats.cpu_limit_cores:.2f}" if stats.cpu_limit_cores else "-"
+    memory_limit = format_bytes(stats.memory_limit_bytes) if stats.memory_limit_bytes else "-"
+    memory_percent = f"{stats.memory_percent:.1f}" if stats.memory_limit_bytes else "-"
+    return (
+        f"{stats.cpu_cores:6.2f} {stats.cpu_percent:6.1f} {cpu_limit:>7} {format_bytes(stats.memory_bytes):>9} "
+        f"{memory_limit:>9} {memory_percent:>6} {stats.throttled_ratio * 100:5.1f} "
+        f"{stats.cpu_pressure_percent:7.1f} {stats.memory_pressure_percent:7.1f}  {stats.name or '.'}"
+    )
+
+
+def format_table(stats, sort="cpu", limit=None):
+    '''
+    Format the stats of several cgroups as a table, busiest first.
+
+    Parameters:
+    - stats (list): CGroupStats of the cgroups.
+    - sort (str): One of SORT_KEYS. Default is "cpu".
+    - limit (int): Maximum number of rows. Default is None (all).
+
+    Returns:
+    - table (str): The table, with a header line.
+    '''
+    rows = sorted(stats, key=SORT_KEYS[sort], reverse=sort != "name")
+    if limit is not None:
+        rows = rows[:limit]
+    return "\n".join([HEADER] + [format_row(row) for row in rows])
+
+
+def _raise_fd_limit():
+    '''
+    Internal function to raise the soft open files limit to the hard limit, so
+    the scanner can keep the counter files of thousands of cgroups open.
+    '''
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def _scanner(args):
+    '''
+    Internal function to create the scanner of a subcommand.
+    '''
+    _raise_fd_limit()
+    return CGroupScanner(
+        args.cgroup,
+        args.cgroup_base_path,
+        version=args.version,
+        max_depth=args.depth,
+        rescan_interval_s=args.rescan_interval,
+    )
+
+
+def _read_key(timeout):
+    '''
+    Internal function to wait up to timeout seconds for a key press on a terminal.
+    '''
+    ready, _, _ = select.select([sys.stdin], [], [], timeout)
+    return os.read(sys.stdin.fileno(), 1).decode(errors="ignore") if ready else None
+
+
+def _refresh_interval(interval, cost_ms):
+    '''
+    Internal function to get the seconds between refreshes of top: the given interval, or by
+    default 2 s stretched so that sampling takes at most MAX_SAMPLING_SHARE of a CPU.
+    '''
+    if interval is not None:
+        return interval
+    return max(DEFAULT_REFRESH_INTERVAL, cost_ms / 1000 / MAX_SAMPLING_SHARE)
+
+
+def top(args):
+    '''
+    Show a refreshing table of the cgroups under a cgroup until interrupted.
+    On a terminal, c/m/%/t/p/P/n change the sort order and q quits.
+    '''
+    scanner = _scanner(args)
+    interactive = sys.stdin.isatty() and sys.stdout.isatty() and args.iterations is None
+    sort = args.sort
+    settings = None
+    if interactive:
+        import termios
+        import tty
+
+        settings = termios.tcgetattr(sys.stdin)
+        tty.setcbreak(sys.stdin)
+
+    try:
+        cpu_start = time.process_time()
+        stats = scanner.sample()
+        cost_ms = (time.process_time() - cpu_start) * 1000
+        interval = _refresh_interval(args.interval, cost_ms)
+        deadline = time.monotonic() + interval
+        iteration = 0
+        while args.iterations is None or iteration < args.iterations:
+            # Wait for the next refresh, handling key presses in the meantime
+            remaining = deadline - time.monotonic()
+            while remaining > 0:
+                key = _read_key(remaining) if interactive else time.sleep(remaining)
+                if key == "q":
+                    return 0
+                if key in SORT_SHORTCUTS:
+                    sort = SORT_SHORTCUTS[key]
+                    break
+                remaining = deadline - time.monotonic()
+            else:
+                deadline += interval
+                cpu_start = time.process_time()
+                stats = scanner.sample()
+                cost_ms = (time.process_time() - cpu_start) * 1000
+                interval = _refresh_interval(args.interval, cost_ms)
+                iteration += 1
+
+            rows = shutil.get_terminal_size().lines - 3 if interactive else args.limit
+            table = format_table(stats, sort, rows if args.limit is None else min(rows, args.limit))
+            if interactive:
+                sys.stdout.write("\x1b[H\x1b[2J")
+            sys.stdout.write(
+                f"{time.strftime('%H:%M:%S')}  {len(stats)} cgroups under {scanner.root}  "
+                f"sorted by {sort}  sampled in {cost_ms:.1f} ms CPU\n{table}\n"
+            )
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if settings is not None:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, settings)
+        scanner.close()
+    return 0
+
+
+def record(args):
+    '''
+    Record the CPU and memory usage of the cgroups under a cgroup to a file
+    that cgroup-monitor summarize can read.
+    '''
+    scanner = _scanner(args)
+    recordings = {}
+    start = time.time()
+    try:
+        previous_names = {row.name for row in scanner.sample()}
+        previous = time.monotonic()
+        while args.duration is None or time.time() - start < args.duration:
+            time.sleep(args.interval)
+            stats = scanner.sample()
+            now = time.monotonic()
+            interval, previous = now - previous, now
+            names = set()
+            for row in stats:
+                names.add(row.name)
+                # A cgroup's first pass after it appeared has no rates yet
+                if row.name not in previous_names:
+                    continue
+                recording = recordings.get(row.name)
+                if recording is None:
+                    recording = recordings[row.name] = {
+                        "type": "recording",
+                        "version": 1,
+                        "cgroup_name": os.path.join(args.cgroup, row.name),
+                        "start_time": time.time() - interval,
+                        "memory_limit_bytes": row.memory_limit_bytes,
+                        "cpu_usage_percentages": [],
+                        "memory_usage": [],
+                        "sample_intervals": [],
+                    }
+                recording["cpu_usage_percentages"].append(row.cpu_percent)
+                recording["memory_usage"].append(row.memory_bytes)
+                recording["sample_intervals"].append(interval)
+            previous_names = names
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scanner.close()
+
+    with open(args.output, "w") as f:
+        json.dump({"type": "recording_set", "version": 1, "recordings": list(recordings.values())}, f)
+    print(f"Recorded {len(recordings)} cgroups to {args.output}")
+    return 0
+
+
+def summarize(args):
+    '''
+    Merge summary and recording files and print the combined report, see cgroup_monitor.summary.
+    '''
+    return summary.main(args.files + (["--output", args.output] if args.output else []))
+
+
+def _add_scan_arguments(parser):
+    parser.add_argument("cgroup", nargs="?", default="", help="Cgroup whose descendants are shown (default: the root).")
+    parser.add_argument("--cgroup-base-path", help="Base path of the cgroups (default: from mountinfo).")
+    parser.add_argument("--version", type=int, choices=(1, 2), help="cgroup version (default: detected).")
+    parser.add_argument("--depth", type=int, help="Levels of descendants to include (default: all).")
+    parser.add_argument("--rescan-interval", type=float, default=30.0,
+                        help="Seconds between walks of the cgroup tree (default: 30).")
+
+
+def main(argv=None):
+    '''
+    Entry point of the cgroup-monitor command.
+    Usage: cgroup-monitor {top,record,summarize} ...
+    '''
+    parser = argparse.ArgumentParser(prog="cgroup-monitor", description="Monitor cgroups from the command line.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    top_parser = subparsers.add_parser("top", help="Show a refreshing table of the cgroups under a cgroup.")
+    _add_scan_arguments(top_parser)
+    top_parser.add_argument("--interval", "-i", type=float,
+                            help="Seconds between refreshes (default: 2, longer when sampling a large tree "
+                                 "would take more than 1%% of a CPU).")
+    top_parser.add_argument("--sort", "-s", choices=sorted(SORT_KEYS), default="cpu", help="Sort order (default: cpu).")
+    top_parser.add_argument("--limit", "-n", type=int, help="Maximum number of rows (default: fit the terminal).")
+    top_parser.add_argument("--iterations", type=int, help="Stop after this many refreshes (default: run until q).")
+    top_parser.set_defaults(func=top)
+
+    record_parser = subparsers.add_parser("record", help="Record the usage of the cgroups under a cgroup.")
+    _add_scan_arguments(record_parser)
+    record_parser.add_argument("--interval", "-i", type=float, default=1.0,
+                               help="Seconds between samples (default: 1).")
+    record_parser.add_argument("--duration", "-d", type=float, help="Seconds to record for (default: until Ctrl-C).")
+    record_parser.add_argument("--output", "-o", required=True, help="File to write the recording to.")
+    record_parser.set_defaults(func=record)
+
+    summarize_parser = subparsers.add_parser("summarize", help="Merge summaries and recordings into one report.")
+    summarize_parser.add_argument("files", nargs="+", help="Summary or recording files.")
+    summarize_parser.add_argument("--output", "-o", help="Also save the merged summary to this file.")
+    summarize_parser.set_defaults(func=summarize)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
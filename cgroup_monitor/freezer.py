@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .inotify import IN_MODIFY, Inotify
+
+
+def wait_frozen(managers, frozen=True, timeout=5.0):
+    '''
+    Wait until cgroups reach the frozen (or thawed) state. On cgroup v2 this blocks on
+    inotify notifications of their cgroup.events files, so many cgroups are waited for at
+    once without polling. v1 has no notifications, freezer.state is polled with backoff.
+
+    Parameters:
+    - managers (list): CGroupManager of each cgroup.
+    - frozen (bool): State to wait for, True for frozen and False for thawed. Default is True.
+    - timeout (float): Maximum number of seconds to wait. Default is 5.
+
+    Returns:
+    - pending (list): Managers whose cgroup did not reach the state in time, empty on success.
+    '''
+    deadline = time.monotonic() + timeout
+    notified = [m for m in managers if m.freeze_events_path is not None]
+    polled = [m for m in managers if m.freeze_events_path is None]
+
+    pending = []
+    if notified:
+        with Inotify() as inotify:
+            watches = {}
+            for manager in notified:
+                try:
+                    watches[inotify.add_watch(manager.freeze_events_path, IN_MODIFY)] = manager
+                except OSError:
+                    pending.append(manager)
+            # Check after the watches are in place, so no transition can be missed
+            waiting = {wd for wd, manager in watches.items() if manager.is_frozen() != frozen}
+            while waiting:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for wd, _, _ in inotify.read(remaining):
+                    if wd in waiting and watches[wd].is_frozen() == frozen:
+                        waiting.discard(wd)
+            pending.extend(watches[wd] for wd in waiting)
+
+    delay = 0.001
+    while polled:
+        polled = [m for m in polled if m.is_frozen() != frozen]
+        remaining = deadline - time.monotonic()
+        if not polled or remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+    return pending + polled
+
+
+def _set_frozen(managers, frozen, timeout, sudo):
+    '''
+    Internal function to request a state from every cgroup at once, then wait for all of them.
+    '''
+    managers = list(managers)
+    if not managers:
+        return []
+    # The writes may each spawn a process (sudo or helper script), issue them concurrently
+    with ThreadPoolExecutor(max_workers=min(32, len(managers))) as pool:
+        list(pool.map(lambda manager: manager._request_frozen(frozen, sudo), managers))
+    return wait_frozen(managers, frozen, timeout) if timeout else []
+
+
+def freeze_all(managers, timeout=5.0, sudo=False):
+    '''
+    Freeze many cgroups in parallel: every freeze is requested before waiting for any
+    of them, so the whole batch takes about as long as freezing one cgroup.
+
+    Parameters:
+    - managers (list): CGroupManager of each cgroup.
+    - timeout (float): Maximum number of seconds to wait for all of them. Default is 5, 0 to not wait.
+    - sudo (bool): Whether to use sudo to run the commands.
+
+    Returns:
+    - pending (list): Managers whose cgroup was not frozen in time, empty on success.
+    '''
+    return _set_frozen(managers, True, timeout, sudo)
+
+
+def thaw_all(managers, timeout=5.0, sudo=False):
+    '''
+    Thaw many cgroups in parallel, see freeze_all().
+
+    Parameters:
+    - managers (list): CGroupManager of each cgroup.
+    - timeout (float): Maximum number of seconds to wait for all of them. Default is 5, 0 to not wait.
+    - sudo (bool): Whether to use sudo to run the commands.
+
+    Returns:
+    - pending (list): Managers whose cgroup was not thawed in time, empty on success.
+    '''
+    return _set_frozen(managers, False, timeout, sudo)
@@ -0,0 +1,137 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+_libc = None
+
+
+def _inotify():
+    '''
+    Internal function to load the inotify functions of the C library.
+    '''
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def parse_events(data):
+    '''
+    Parse the inotify events read from an inotify file descriptor.
+
+    Parameters:
+    - data (bytes): Data read from the file descriptor.
+
+    Returns:
+    - events (list): (watch descriptor, mask, name) of each event, name is "" for the watched path itself.
+    '''
+    events = []
+    offset = 0
+    while offset < len(data):
+        wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+        offset += _EVENT_HEADER.size
+        name = data[offset:offset + length].split(b"\0", 1)[0]
+        offset += length
+        events.append((wd, mask, os.fsdecode(name)))
+    return events
+
+
+class Inotify:
+    def __init__(self):
+        '''
+        Minimal inotify instance, used to follow cgroup directories and cgroup.events
+        files without polling them. Can be used as a context manager.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        fd = _inotify().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        '''
+        Watch a path.
+
+        Parameters:
+        - path (str): File or directory to watch.
+        - mask (int): IN_* events to report.
+
+        Returns:
+        - wd (int): Watch descriptor, reported with the events of the path.
+        '''
+        wd = _inotify().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"Cannot watch {path}: {os.strerror(error)}", path)
+        return wd
+
+    def read(self, timeout=None):
+        '''
+        Wait for events and read them.
+
+        Parameters:
+        - timeout (float): Seconds to wait. Default is None, which waits until there are events.
+
+        Returns:
+        - events (list): (watch descriptor, mask, name) of each event, empty after a timeout.
+        '''
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            return parse_events(os.read(self.fd, 65536))
+        except BlockingIOError:
+            return []
+
+    def close(self):
+        '''
+        Close the inotify instance, which removes all of its watches.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,290 @@
+import os
+import functools
+import re
+
+
+DEFAULT_CGROUP_BASE_PATH = "/sys/fs/cgroup"
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+# Super options of a v1 mount that are not controller names
+_V1_MOUNT_OPTIONS = {"rw", "ro", "xattr", "noprefix", "clone_children", "cpuset_v2_mode", "all", "none"}
+
+# The kernel escapes space, tab, newline and backslash in mountinfo paths as \ooo
+_OCTAL_ESCAPE = re.compile(rb"\\([0-7]{3})")
+
+
+class CGroupMount:
+    def __init__(self, mount_point, root, fs_type, controllers):
+        '''
+        A single cgroup (v1) or cgroup2 mount as seen in mountinfo.
+
+        Parameters:
+        - mount_point (str): Where the hierarchy is mounted, e.g. /sys/fs/cgroup/memory.
+        - root (str): Root of the hierarchy that is visible at the mount point.
+        - fs_type (str): Either "cgroup" or "cgroup2".
+        - controllers (tuple): Controllers bound to this hierarchy (v1 only).
+
+        Returns:
+        - None
+        '''
+        self.mount_point = mount_point
+        self.root = root
+        self.fs_type = fs_type
+        self.controllers = controllers
+
+    def __repr__(self):
+        return f"CGroupMount({self.mount_point!r}, {self.fs_type}, {','.join(self.controllers)})"
+
+
+class MountTable:
+    def __init__(self, mounts):
+        '''
+        Controller to mount point map built from a list of CGroupMount objects.
+        Use get_mount_table() to get the cached table of the running system.
+
+        Parameters:
+        - mounts (list): List of CGroupMount objects.
+
+        Returns:
+        - None
+        '''
+        self.mounts = mounts
+        self.v1 = {}
+        self.v2 = None
+
+        for mount in mounts:
+            if mount.fs_type == "cgroup2":
+                # Keep the first unified mount, nested ones (e.g. /sys/fs/cgroup/unified) are equivalent
+                if self.v2 is None:
+                    self.v2 = mount
+                continue
+            for controller in mount.controllers:
+                self.v1.setdefault(controller, mount)
+
+    def controller_mount(self, controller):
+        '''
+        Get the v1 mount a controller is bound to.
+
+        Parameters:
+        - controller (str): Controller name, e.g. "cpu", "memory" or "name=systemd".
+
+        Returns:
+        - mount (CGroupMount or None): Mount of the controller, None if not mounted on v1.
+        '''
+        return self.v1.get(controller)
+
+    def is_v2(self):
+        '''
+        Check whether the CPU and memory controllers should be driven through cgroup v2.
+        On hybrid hosts the unified hierarchy is mounted as well, but a controller can
+        only be attached to one hierarchy, so any of them being on v1 means v1.
+
+        Parameters:
+        - None
+
+        Returns:
+        - is_v2 (bool): Whether the v2 backend should be used.
+        '''
+        if self.v2 is None:
+            return False
+        return not any(c in self.v1 for c in ("cpu", "cpuacct", "memory"))
+
+
+def parse_mountinfo(content):
+    '''
+    Parse the contents of a mountinfo file and return the cgroup mounts in it.
+
+    Parameters:
+    - content (str): Content of /proc/<pid>/mountinfo.
+
+    Returns:
+    - mounts (list): List of CGroupMount objects, in mount order.
+    '''
+    mounts = []
+    for line in content.splitlines():
+        # <id> <parent> <major:minor> <root> <mount point> <options> [optional...] - <type> <source> <super options>
+        left, sep, right = line.partition(" - ")
+        if not sep:
+            continue
+        fields = left.split()
+        right_fields = right.split()
+        if len(fields) < 5 or len(right_fields) < 3:
+            continue
+
+        fs_type = right_fields[0]
+        if fs_type not in ("cgroup", "cgroup2"):
+            continue
+
+        controllers = ()
+        if fs_type == "cgroup":
+            super_options = right_fields[2].split(",")
+            controllers = tuple(
+                opt for opt in super_options
+                if opt not in _V1_MOUNT_OPTIONS and (opt.startswith("name=") or "=" not in opt)
+            )
+
+        mounts.append(CGroupMount(_unescape(fields[4]), _unescape(fields[3]), fs_type, controllers))
+    return mounts
+
+
+def _unescape(path):
+    '''
+    Internal function to decode the octal escapes (e.g. \\040 for space) used in mountinfo.
+    '''
+    if "\\" not in path:
+        return path
+    # Other bytes are the path as is, which need not be valid UTF-8
+    raw = path.encode("utf-8", "surrogateescape")
+    raw = _OCTAL_ESCAPE.sub(lambda match: bytes([int(match.group(1), 8)]), raw)
+    return raw.decode("utf-8", "surrogateescape")
+
+
+@functools.lru_cache(maxsize=None)
+def get_mount_table(mountinfo_path=MOUNTINFO_PATH):
+    '''
+    Parse mountinfo once and cache the result.
+    Call get_mount_table.cache_clear() if the cgroup mounts change at runtime.
+
+    Parameters:
+    - mountinfo_path (str): Path to the mountinfo file. Default is /proc/self/mountinfo.
+
+    Returns:
+    - table (MountTable): Cached mount table. Empty if the file cannot be read.
+    '''
+    try:
+        with open(mountinfo_path, "r", encoding="utf-8", errors="surrogateescape") as f:
+            content = f.read()
+    except OSError:
+        content = ""
+    return MountTable(parse_mountinfo(content))
+
+
+def detect_version(cgroup_base_path=None):
+    '''
+    Pick the cgroup version to use for a given base path.
+    An explicit base path is probed directly, otherwise the mount table decides.
+
+    Parameters:
+    - cgroup_base_path (str): Base path of the cgroup. Default is None (use mountinfo).
+
+    Returns:
+    - version (int): 1 or 2.
+    '''
+    if cgroup_base_path is not None:
+        return 2 if os.path.exists(os.path.join(cgroup_base_path, "cgroup.controllers")) else 1
+    table = get_mount_table()
+    if table.is_v2():
+        return 2
+    if table.v1:
+        return 1
+    # Nothing usable in mountinfo (e.g. restricted /proc), fall back to probing the default path
+    return detect_version(DEFAULT_CGROUP_BASE_PATH)
+
+
+def v1_controller_path(controller, cgroup_name="", cgroup_base_path=None):
+    '''
+    Get the directory of a cgroup in a v1 controller hierarchy.
+
+    Parameters:
+    - controller (str): Controller name, e.g. "cpu", "cpuacct" or "memory".
+    - cgroup_name (str): Name of the cgroup, relative to the hierarchy root. Default is an empty string.
+    - cgroup_base_path (str): Base path holding one directory per controller.
+        Default is None, which uses the mount point from mountinfo.
+
+    Returns:
+    - path (str): Path to the cgroup directory for the controller.
+    '''
+    if cgroup_base_path is None:
+        mount = get_mount_table().controller_mount(controller)
+        base = mount.mount_point if mount else os.path.join(DEFAULT_CGROUP_BASE_PATH, controller)
+    else:
+        base = os.path.join(cgroup_base_path, controller)
+    return os.path.join(base, cgroup_name)
+
+
+def v2_cgroup_path(cgroup_name="", cgroup_base_path=None):
+    '''
+    Get the directory of a cgroup in the unified (v2) hierarchy.
+
+    Parameters:
+    - cgroup_name (str): Name of the cgroup, relative to the hierarchy root. Default is an empty string.
+    - cgroup_base_path (str): Mount point of the unified hierarchy.
+        Default is None, which uses the mount point from mountinfo.
+
+    Returns:
+    - path (str): Path to the cgroup directory.
+    '''
+    if cgroup_base_path is None:
+        mount = get_mount_table().v2
+        cgroup_base_path = mount.mount_point if mount else DEFAULT_CGROUP_BASE_PATH
+    return os.path.join(cgroup_base_path, cgroup_name)
+
+
+def parse_proc_cgroup(content):
+    '''
+    Parse the contents of /proc/<pid>/cgroup.
+    v1 lines may list several controllers ("4:cpu,cpuacct:/path"), each of them
+    gets its own entry. The v2 line ("0::/path") is stored under the "" key.
+
+    Parameters:
+    - content (str): Content of /proc/<pid>/cgroup.
+
+    Returns:
+    - cgroups (dict): Controller name to cgroup path, as shown in the file.
+    '''
+    cgroups = {}
+    for line in content.splitlines():
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        _, controllers, path = parts
+        if not controllers:
+            cgroups[""] = path
+            continue
+        for controller in controllers.split(","):
+            cgroups[controller] = path
+    return cgroups
+
+
+def _relative_to_mount(path, mount):
+    '''
+    Internal function to turn a path from /proc/<pid>/cgroup into a path below the mount point.
+
+    Without a cgroup namespace, a container sees its own cgroup in /proc/self/cgroup
+    (e.g. /docker/abc) while that same cgroup is what is mounted, so the mount root
+    has to be stripped. With a cgroup namespace, both are already "/".
+    '''
+    if path.startswith("/.."):
+        raise RuntimeError(f"Cgroup {path} is outside of the current cgroup namespace.")
+    root = mount.root if mount is not None else "/"
+    if root != "/" and (path == root or path.startswith(root + "/")):
+        path = path[len(root):]
+    return path.lstrip("/")
+
+
+@functools.lru_cache(maxsize=None)
+def pid_cgroup_names(pid):
+    '''
+    Resolve the cgroup of a process, relative to each hierarchy's mount point.
+    Results are cached per pid, call pid_cgroup_names.cache_clear() if the process
+    may have moved to another cgroup.
+
+    Parameters:
+    - pid (int): Process ID.
+
+    Returns:
+    - names (dict): Controller name to cgroup name, "" key for the unified (v2) hierarchy.
+        The names can be passed as cgroup_name to the monitor and manager classes.
+    '''
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            content = f.read()
+    except FileNotFoundError:
+        raise RuntimeError(f"Process {pid} does not exist.")
+
+    table = get_mount_table()
+    names = {}
+    for controller, path in parse_proc_cgroup(content).items():
+        mount = table.v2 if controller == "" else table.controller_mount(controller)
+        names[controller] = _relative_to_mount(path, mount)
+    return names
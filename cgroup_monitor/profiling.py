@@ -0,0 +1,214 @@
+import functools
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+
+# Result of one profiled block. The counters are those of the whole cgroup, so
+# concurrent spans see each other's usage.
+SpanRecord = namedtuple("SpanRecord", [
+    "name",
+    "span_id",
+    "parent_id",
+    "depth",
+    "thread_id",
+    "start_time",
+    "duration_s",
+    "cpu_usage_us",
+    "cpu_usage_cores",
+    "memory_start_bytes",
+    "memory_end_bytes",
+    "memory_peak_bytes",
+    "nr_throttled",
+    "throttled_usec",
+])
+
+_span_ids = itertools.count(1)
+_local = threading.local()
+
+
+def _span_stack():
+    '''
+    Internal function to get the stack of open spans of the current thread.
+    '''
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class SpanSampler:
+    def __init__(self, monitor, interval=0.01):
+        '''
+        Background thread shared by all spans of a monitor. It polls memory usage
+        while at least one span is open, so short peaks inside a span are seen
+        even when memory.peak cannot be used, and sleeps otherwise.
+
+        Parameters:
+        - monitor (CGroupMonitor): Monitor whose spans are tracked.
+        - interval (float): Polling interval in seconds. Default is 0.01.
+
+        Returns:
+        - None
+        '''
+        self.monitor = monitor
+        self.interval = interval
+        self.active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, span):
+        '''
+        Start tracking the memory peak of an open span.
+
+        Parameters:
+        - span (Span): The span.
+
+        Returns:
+        - None
+        '''
+        with self._lock:
+            idle = not self.active
+            self.active[span.span_id] = span
+        # The thread re-checks active after waking, so it only needs waking when it was idle
+        if idle:
+            self._wakeup.set()
+
+    def remove(self, span):
+        '''
+        Stop tracking a span.
+
+        Parameters:
+        - span (Span): The span.
+
+        Returns:
+        - None
+        '''
+        with self._lock:
+            self.active.pop(span.span_id, None)
+
+    def stop(self):
+        '''
+        Stop the background thread.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self._stopped = True
+        self._wakeup.set()
+
+    def _run(self):
+        '''
+        Internal method polling memory usage while spans are open.
+        '''
+        while not self._stopped:
+            if not self.active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            memory = self.monitor.get_raw_memory_usage()
+            for span in list(self.active.values()):
+                if memory > span.memory_peak:
+                    span.memory_peak = memory
+            time.sleep(self.interval)
+
+
+class Span:
+    def __init__(self, monitor, name):
+        '''
+        Context manager measuring the cgroup counters over a block of code.
+        Use CGroupMonitor.span() rather than creating it directly.
+
+        Parameters:
+        - monitor (CGroupMonitor): Monitor of the cgroup.
+        - name (str): Name of the span.
+
+        Returns:
+        - None
+        '''
+        self.monitor = monitor
+        self.name = name
+        self.span_id = None
+        self.record = None
+        self.memory_peak = 0
+
+    def __enter__(self):
+        stack = _span_stack()
+        self.span_id = next(_span_ids)
+        self.parent_id = stack[-1].span_id if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._counters = self.monitor.get_raw_counters()
+        self.memory_peak = self._counters.memory_usage_bytes
+        self.monitor._get_span_sampler().add(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = self.monitor.get_raw_counters()
+        duration = time.perf_counter() - self._start
+        sampler = self.monitor._span_sampler
+        # None if the monitor was closed while the span was open
+        if sampler is not None:
+            sampler.remove(self)
+        stack = _span_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+
+        start = self._counters
+        # The cgroup's lifetime peak only moves if the highest usage happened inside the span
+        if end.memory_peak_bytes > start.memory_peak_bytes:
+            peak = end.memory_peak_bytes
+        else:
+            peak = max(self.memory_peak, end.memory_usage_bytes)
+        cpu_usage = end.cpu_usage_us - start.cpu_usage_us
+
+        self.record = SpanRecord(
+            self.name,
+            self.span_id,
+            self.parent_id,
+            self.depth,
+            threading.get_ident(),
+            self.start_time,
+            duration,
+            cpu_usage,
+            cpu_usage / (duration * 1000000) if duration > 0 else 0.0,
+            start.memory_usage_bytes,
+            end.memory_usage_bytes,
+            peak,
+            end.nr_throttled - start.nr_throttled,
+            end.throttled_usec - start.throttled_usec,
+        )
+        self.monitor.span_records.append(self.record)
+        return False
+
+
+def profile(monitor, name=None):
+    '''
+    Decorator running each call of a function inside a span of the monitor.
+
+    Parameters:
+    - monitor (CGroupMonitor): Monitor of the cgroup.
+    - name (str): Name of the span. Default is None, which uses the function's qualified name.
+
+    Returns:
+    - decorator (callable): Decorator to apply to the function.
+    '''
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(monitor, span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
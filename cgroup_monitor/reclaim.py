@@ -0,0 +1,252 @@
+import logging
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+logger = logging.getLogger(__name__)
+
+# One reclaim step and what it cost. Pressure is the share of time some tasks stalled on
+# memory, refaults are evicted pages read back in, both over the settle time after the
+# step and, for the baselines, over the idle period before the first step.
+ReclaimStep = namedtuple("ReclaimStep", [
+    "timestamp",
+    "requested_bytes",
+    "freed_bytes",
+    "memory_before_bytes",
+    "memory_after_bytes",
+    "pressure_percent",
+    "baseline_pressure_percent",
+    "refaults_per_s",
+    "baseline_refaults_per_s",
+    "stop_reason",
+])
+
+# Reasons to stop reclaiming until the cgroup has been busy and idle again
+PRESSURE = "pressure"
+REFAULTS = "refaults"
+NO_PROGRESS = "no progress"
+FLOOR = "floor"
+
+
+class ReclaimPolicy:
+    def __init__(self, monitor, manager, step_bytes=64 * 1024 ** 2, min_memory_bytes=0, idle_cpu_percent=5.0,
+                 idle_samples=30, settle_s=5.0, max_pressure_increase=1.0, max_refault_increase=100.0,
+                 min_progress=0.1, swappiness=None, sudo=False):
+        '''
+        Proactively reclaim memory from a cgroup while it is idle, one step at a time.
+        The policy subscribes to the monitor's samples. Once CPU usage has stayed below
+        idle_cpu_percent for idle_samples samples it asks for step_bytes through
+        memory.reclaim, waits settle_s seconds, and compares memory pressure and refaults
+        after the step with the idle baseline. It keeps stepping until they rise, a step
+        frees less than min_progress of what it asked for, or usage reaches min_memory_bytes,
+        and starts again after the cgroup has been busy. Needs cgroup v2 and Linux 5.19+.
+        Reclaim blocks until the kernel is done, so steps run on a worker thread and the
+        samples that arrive meanwhile are skipped. The settle time starts when a step ends.
+
+        Parameters:
+        - monitor (CGroupMonitor): Monitor of the cgroup.
+        - manager (CGroupManager): Manager of the same cgroup.
+        - step_bytes (int): Bytes to reclaim per step. Default is 64 MiB.
+        - min_memory_bytes (int): Never reclaim below this usage. Default is 0.
+        - idle_cpu_percent (float): CPU usage percentage under which a sample counts as idle. Default is 5.
+        - idle_samples (int): Consecutive idle samples before the first step. Default is 30.
+        - settle_s (float): Seconds to measure the effect of a step over. Default is 5.
+        - max_pressure_increase (float): Stop when memory pressure (percent of time stalled)
+            rises by more than this over the baseline. Default is 1.
+        - max_refault_increase (float): Stop when refaults per second rise by more than this
+            over the baseline. Default is 100.
+        - min_progress (float): Stop when a step frees less than this fraction of step_bytes. Default is 0.1.
+        - swappiness (int): Swappiness to reclaim with, 0 to only drop page cache. Default is None.
+        - sudo (bool): Whether to use sudo to reclaim. Default is False.
+
+        Returns:
+        - None
+        '''
+        if not hasattr(manager, "reclaim"):
+            raise RuntimeError("Proactive reclaim needs cgroup v2 (memory.reclaim).")
+        self.monitor = monitor
+        self.manager = manager
+        self.step_bytes = step_bytes
+        self.min_memory_bytes = min_memory_bytes
+        self.idle_cpu_percent = idle_cpu_percent
+        self.idle_samples = idle_samples
+        self.settle_s = settle_s
+        self.max_pressure_increase = max_pressure_increase
+        self.max_refault_increase = max_refault_increase
+        self.min_progress = min_progress
+        self.swappiness = swappiness
+        self.sudo = sudo
+
+        self.steps = deque(maxlen=100)
+        self.total_freed_bytes = 0
+        self._idle_count = 0
+        self._idle_start = None
+        self._baseline = None
+        self._pending = None
+        self._stopped = False
+        self._executor = None
+        self._reclaim = None
+
+    def start(self):
+        '''
+        Subscribe to the monitor's samples.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.monitor.subscribe(self.on_sample)
+
+    def stop(self):
+        '''
+        Unsubscribe from the monitor and wait for a step in progress.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self.monitor.unsubscribe(self.on_sample)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wait(self, timeout=None):
+        '''
+        Wait for the reclaim step in progress to end.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is None (no limit).
+
+        Returns:
+        - done (bool): Whether no step is in progress any more.
+        '''
+        future = self._reclaim
+        return future is None or not wait([future], timeout).not_done
+
+    def _counters(self):
+        '''
+        Internal method to read (monotonic time, memory stall us, refaults).
+        '''
+        return time.monotonic(), self.monitor.get_memory_pressure()[0], self.monitor.get_memory_refaults()
+
+    @staticmethod
+    def _rates(start, end):
+        '''
+        Internal method to get (pressure percent, refaults per second) between two readings.
+        '''
+        elapsed = end[0] - start[0]
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (end[1] - start[1]) / (elapsed * 1000000) * 100, (end[2] - start[2]) / elapsed
+
+    def on_sample(self, sample):
+        '''
+        Track idleness and step through reclaim.
+
+        Parameters:
+        - sample (Sample): The latest sample.
+
+        Returns:
+        - None
+        '''
+        if self._reclaim is not None:
+            if not self._reclaim.done():
+                return
+            future, self._reclaim = self._reclaim, None
+            self._pending = future.result()
+        if self._pending is not None:
+            if time.monotonic() - self._pending["counters"][0] >= self.settle_s:
+                self._finish_step()
+            return
+
+        if sample.cpu_usage_percent > self.idle_cpu_percent:
+            # Busy again: start over with a new idle period and baseline
+            self._idle_count = 0
+            self._idle_start = None
+            self._baseline = None
+            self._stopped = False
+            return
+
+        if self._idle_start is None:
+            self._idle_start = self._counters()
+        self._idle_count += 1
+        if self._stopped or self._idle_count < self.idle_samples:
+            return
+        if self._baseline is None:
+            self._baseline = self._rates(self._idle_start, self._counters())
+        self._step(sample)
+
+    def _step(self, sample):
+        '''
+        Internal method to start reclaiming one step on the worker thread.
+        '''
+        memory_before = sample.memory_usage_bytes
+        request = min(self.step_bytes, memory_before - self.min_memory_bytes)
+        if request <= 0:
+            self._stopped = True
+            logger.info("Memory usage %s is at the floor, not reclaiming", memory_before)
+            return
+        self._reclaim = self._executor.submit(self._reclaim_step, request, memory_before)
+
+    def _reclaim_step(self, request, memory_before):
+        '''
+        Internal method to reclaim one step and read the counters once it is done, run on the worker thread.
+        '''
+        try:
+            freed = self.manager.reclaim(request, swappiness=self.swappiness, sudo=self.sudo)
+        except Exception as e:
+            logger.info("Reclaim of %s bytes failed: %s", request, e)
+            freed = 0
+        return {
+            "timestamp": time.time(),
+            "requested": request,
+            "freed": freed,
+            "memory_before": memory_before,
+            "memory_after": self.monitor.get_memory_usage(),
+            "counters": self._counters(),
+        }
+
+    def _finish_step(self):
+        '''
+        Internal method to measure the cost of the last step and decide whether to go on.
+        '''
+        pending, self._pending = self._pending, None
+        pressure, refaults = self._rates(pending["counters"], self._counters())
+        baseline_pressure, baseline_refaults = self._baseline
+
+        stop_reason = None
+        if pressure > baseline_pressure + self.max_pressure_increase:
+            stop_reason = PRESSURE
+        elif refaults > baseline_refaults + self.max_refault_increase:
+            stop_reason = REFAULTS
+        elif pending["freed"] < self.min_progress * pending["requested"]:
+            stop_reason = NO_PROGRESS
+        elif pending["memory_after"] <= self.min_memory_bytes:
+            stop_reason = FLOOR
+        self._stopped = stop_reason is not None
+
+        step = ReclaimStep(
+            pending["timestamp"],
+            pending["requested"],
+            pending["freed"],
+            pending["memory_before"],
+            pending["memory_after"],
+            pressure,
+            baseline_pressure,
+            refaults,
+            baseline_refaults,
+            stop_reason,
+        )
+        self.steps.append(step)
+        self.total_freed_bytes += max(pending["freed"], 0)
+        logger.info(
+            "Reclaimed %s of %s bytes, memory pressure %.2f%% (baseline %.2f%%), %.1f refaults/s (baseline %.1f)%s",
+            step.freed_bytes, step.requested_bytes, pressure, baseline_pressure, refaults, baseline_refaults,
+            f", stopping: {stop_reason}" if stop_reason else "",
+        )
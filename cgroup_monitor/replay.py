@@ -0,0 +1,144 @@
+import bisect
+import json
+from array import array
+
+from .base_monitor import BaseCGroupMonitor, RawCounters
+
+
+def load_trace(path):
+    '''
+    Load a trace saved with save_trace().
+
+    Parameters:
+    - path (str): Path of the trace file.
+
+    Returns:
+    - trace (dict): The trace.
+    '''
+    with open(path) as f:
+        trace = json.load(f)
+    if trace.get("type") != "trace":
+        raise ValueError(f"{path} is not a trace file.")
+    return trace
+
+
+class CGroupMonitor(BaseCGroupMonitor):
+    def __init__(self, trace, cgroup_name=None):
+        '''
+        Replay a trace of raw counters (see save_trace()) through the monitor interface,
+        to test alert rules, auto-tuning or dashboards against repeatable load.
+        The monitor runs on the trace's clock: waiting for the next sample jumps to the
+        trace point closest to the end of the interval instead of sleeping, so an hour
+        of 100 ms samples replays in well under a second. Sampling at the interval the
+        trace was recorded with reproduces the live samples, and their stats, exactly.
+        The monitoring thread ends at the end of the trace, see wait().
+
+        Parameters:
+        - trace (dict or str): Trace, or path of a trace file.
+        - cgroup_name (str): Name to report. Default is None, which uses the traced cgroup's name.
+
+        Returns:
+        - None
+        '''
+        super().__init__()
+        if isinstance(trace, str):
+            trace = load_trace(trace)
+        self.cgroup_name = trace.get("cgroup_name", "") if cgroup_name is None else cgroup_name
+        self.cgroup_base_path = None
+        self.trace_start_time = trace.get("start_time") or 0.0
+        self.cpu_quota = trace.get("cpu_quota")
+        self.cpu_period = trace.get("cpu_period") or 100000
+        self.memory_limit_bytes = trace.get("memory_limit_bytes")
+        self.trace_timestamps_ns = array("q", trace["timestamps_ns"])
+        self.trace_cpu_usage_us = array("q", trace["cpu_usage_us"])
+        self.trace_memory_usage = array("q", trace["memory_usage"])
+        if not len(self.trace_timestamps_ns) == len(self.trace_cpu_usage_us) == len(self.trace_memory_usage):
+            raise ValueError("The counters of the trace differ in length.")
+        if not self.trace_timestamps_ns:
+            raise ValueError("The trace is empty.")
+        self.position = 0
+
+    def _monotonic_ns(self):
+        return self.trace_timestamps_ns[self.position]
+
+    def _wall_time(self):
+        return self.trace_start_time + (self._monotonic_ns() - self.trace_timestamps_ns[0]) / 1e9
+
+    def _wait(self, timeout):
+        '''
+        Internal method to move to the trace point closest to timeout seconds from now, at
+        least one point further. Returns True when stopped or at the end of the trace.
+        '''
+        timestamps = self.trace_timestamps_ns
+        position = self.position
+        if position + 1 >= len(timestamps):
+            # Nothing left to sample, not even a final sample
+            self._final_sample = False
+            return True
+        target = timestamps[position] + int(timeout * 1e9)
+        after = bisect.bisect_left(timestamps, target, position + 1)
+        if after == len(timestamps):
+            after -= 1
+        elif after > position + 1 and target - timestamps[after - 1] <= timestamps[after] - target:
+            after -= 1
+        self.position = after
+        return self._stop_event.is_set()
+
+    def start_monitor(self, *args, **kwargs):
+        '''
+        Replay the trace from its start, see BaseCGroupMonitor.start_monitor().
+        '''
+        self.position = 0
+        super().start_monitor(*args, **kwargs)
+
+    def wait(self, timeout=None):
+        '''
+        Wait for the replay to reach the end of the trace.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is None (no limit).
+
+        Returns:
+        - finished (bool): Whether the whole trace was replayed.
+        '''
+        thread = self.monitor_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def exists(self):
+        return True
+
+    def get_cpu_usage_us(self):
+        return self.trace_cpu_usage_us[self.position]
+
+    def get_cpu_usage_percpu(self):
+        return [self.get_cpu_usage_us()], [0]
+
+    def get_cpu_throttling(self):
+        return 0, 0, 0
+
+    def get_cpu_limit(self):
+        return self.cpu_quota, self.cpu_period
+
+    def get_memory_usage(self):
+        return self.trace_memory_usage[self.position]
+
+    def get_memory_peak(self):
+        return max(self.trace_memory_usage[:self.position + 1])
+
+    def get_memory_limit(self):
+        return self.memory_limit_bytes
+
+    def get_raw_counters(self):
+        return RawCounters(self.get_cpu_usage_us(), self.get_memory_usage(), self.get_memory_peak(), 0, 0)
+
+    def get_raw_memory_usage(self):
+        return self.get_memory_usage()
+
+    def get_pids_counters(self):
+        return None
+
+    def get_memory_numa_stat(self):
+        return None
@@ -0,0 +1,343 @@
+import os
+import resource
+import time
+from collections import namedtuple
+
+from .mounts import detect_version, v1_controller_path, v2_cgroup_path
+
+
+# One cgroup in a scan. CPU and pressure figures are over the time since the previous scan,
+# cpu_percent is relative to the cgroup's CPU limit like the monitors' CPU usage.
+CGroupStats = namedtuple("CGroupStats", [
+    "name",
+    "cpu_cores",
+    "cpu_percent",
+    "cpu_limit_cores",
+    "memory_bytes",
+    "memory_limit_bytes",
+    "memory_percent",
+    "throttled_ratio",
+    "cpu_pressure_percent",
+    "memory_pressure_percent",
+])
+
+
+def _throttling(fields):
+    '''
+    Internal function to get (nr_periods, nr_throttled) from the split contents of a cpu.stat
+    file, (0, 0) when the cpu controller is not enabled.
+    '''
+    try:
+        index = fields.index(b"nr_periods")
+    except ValueError:
+        return 0, 0
+    return int(fields[index + 1]), int(fields[index + 3])
+
+
+def _pressure_total(data):
+    '''
+    Internal function to get the "some" stall total in microseconds from a *.pressure file.
+    '''
+    _, _, rest = data.partition(b"total=")
+    return int(rest.split(b"\n", 1)[0]) if rest else 0
+
+
+def _parse_limit(data):
+    '''
+    Internal function to parse a memory limit, 0 meaning unlimited.
+    '''
+    data = data.strip()
+    if not data or data == b"max":
+        return 0
+    limit = int(data)
+    # v1 reports "unlimited" as a huge page-aligned number
+    return 0 if limit >= 1 << 62 else limit
+
+
+class _FileReader:
+    def __init__(self, max_fds):
+        '''
+        Internal helper reading small cgroup files. Up to max_fds files are kept open
+        and re-read with pread, which skips the path lookup and open/close of every read.
+        '''
+        self.max_fds = max_fds
+        self.open_fds = 0
+
+    def handle(self, path):
+        '''
+        Get what to pass to read() for a path: an open fd while the budget lasts, else the path.
+        '''
+        if path is None or self.open_fds >= self.max_fds:
+            return path
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return path
+        self.open_fds += 1
+        return fd
+
+    @staticmethod
+    def read(handle):
+        if handle.__class__ is int:
+            return os.pread(handle, 4096, 0)
+        with open(handle, "rb", buffering=0) as f:
+            return f.read()
+
+    def release(self, handles):
+        for handle in handles:
+            if handle.__class__ is int:
+                os.close(handle)
+                self.open_fds -= 1
+
+
+class CGroupScanner:
+    def __init__(self, cgroup_name="", cgroup_base_path=None, version=None, max_depth=None,
+                 rescan_interval_s=30.0, max_fds=None):
+        '''
+        Sample every cgroup under a cgroup in one batched pass, for views of many cgroups
+        at once (e.g. cgroup-monitor top). The tree is only walked again every
+        rescan_interval_s, and limits are re-read at the same time, so a pass costs a
+        handful of reads per cgroup. Counters are hierarchical, a cgroup includes its children.
+
+        Parameters:
+        - cgroup_name (str): Cgroup whose descendants are sampled. Default is an empty string (the root).
+        - cgroup_base_path (str): Base path of the cgroups. Default is None, which
+            resolves the mount point from /proc/self/mountinfo.
+        - version (int): cgroup version, 1 or 2. Default is None, which detects it.
+        - max_depth (int): How many levels below cgroup_name to include. Default is None (all).
+        - rescan_interval_s (float): Seconds between two walks of the tree. Default is 30.
+        - max_fds (int): Maximum number of files kept open. Default is None, which uses
+            half of the open files limit.
+
+        Returns:
+        - None
+        '''
+        self.cgroup_name = cgroup_name
+        self.cgroup_base_path = cgroup_base_path
+        self.version = version or detect_version(cgroup_base_path)
+        self.max_depth = max_depth
+        self.rescan_interval_s = rescan_interval_s
+        if max_fds is None:
+            max_fds = resource.getrlimit(resource.RLIMIT_NOFILE)[0] // 2
+        self._reader = _FileReader(max_fds)
+
+        if self.version == 2:
+            self.root = v2_cgroup_path(cgroup_name, cgroup_base_path)
+        else:
+            self.root = v1_controller_path("cpuacct", cgroup_name, cgroup_base_path)
+        self.names = []
+        self._handles = {}
+        self._limits = {}
+        self._previous = {}
+        self._previous_time = None
+        self._last_scan = None
+
+    def discover(self):
+        '''
+        Walk the tree and refresh the list of cgroups and their limits.
+
+        Parameters:
+        - None
+
+        Returns:
+        - names (list): Names of the cgroups, relative to cgroup_name ("" is cgroup_name itself).
+        '''
+        names = []
+        pending = [("", 0)]
+        while pending:
+            name, depth = pending.pop()
+            names.append(name)
+            if self.max_depth is not None and depth >= self.max_depth:
+                continue
+            try:
+                entries = os.scandir(os.path.join(self.root, name))
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((os.path.join(name, entry.name), depth + 1))
+        names.sort()
+
+        for name in set(self._handles) - set(names):
+            self._drop(name)
+        for name in names:
+            if name not in self._handles:
+                self._handles[name] = [self._reader.handle(path) for path in self._paths(name)]
+            self._limits[name] = self._read_limits(name)
+        self.names = names
+        self._last_scan = time.monotonic()
+        return names
+
+    def _paths(self, name):
+        '''
+        Internal method to get the counter files of a cgroup:
+        (cpu usage, cpu.stat, memory usage, cpu pressure, memory pressure).
+        '''
+        if self.version == 2:
+            path = os.path.join(self.root, name)
+            return (
+                None,
+                os.path.join(path, "cpu.stat"),
+                os.path.join(path, "memory.current"),
+                os.path.join(path, "cpu.pressure"),
+                os.path.join(path, "memory.pressure"),
+            )
+        full_name = os.path.join(self.cgroup_name, name)
+        cpu = v1_controller_path("cpu", full_name, self.cgroup_base_path)
+        memory = v1_controller_path("memory", full_name, self.cgroup_base_path)
+        return (
+            os.path.join(self.root, name, "cpuacct.usage"),
+            os.path.join(cpu, "cpu.stat"),
+            os.path.join(memory, "memory.usage_in_bytes"),
+            None,
+            None,
+        )
+
+    def _read_limits(self, name):
+        '''
+        Internal method to read (cpu limit in cores, memory limit in bytes), 0 meaning unlimited.
+        '''
+        try:
+            if self.version == 2:
+                path = os.path.join(self.root, name)
+                cpu_max = self._read_once(os.path.join(path, "cpu.max")).split()
+                cpu_limit = int(cpu_max[0]) / int(cpu_max[1]) if cpu_max and cpu_max[0] != b"max" else 0
+                memory_limit = _parse_limit(self._read_once(os.path.join(path, "memory.max")))
+            else:
+                full_name = os.path.join(self.cgroup_name, name)
+                cpu = v1_controller_path("cpu", full_name, self.cgroup_base_path)
+                quota = int(self._read_once(os.path.join(cpu, "cpu.cfs_quota_us")))
+                period = int(self._read_once(os.path.join(cpu, "cpu.cfs_period_us")))
+                cpu_limit = quota / period if quota > 0 and period else 0
+                memory = v1_controller_path("memory", full_name, self.cgroup_base_path)
+                memory_limit = _parse_limit(self._read_once(os.path.join(memory, "memory.limit_in_bytes")))
+        except (OSError, ValueError, IndexError):
+            return 0, 0
+        return cpu_limit, memory_limit
+
+    @staticmethod
+    def _read_once(path):
+        '''
+        Internal method to read a file that is not kept open.
+        '''
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _drop(self, name):
+        '''
+        Internal method to forget a cgroup that went away.
+        '''
+        self._reader.release(self._handles.pop(name, ()))
+        self._limits.pop(name, None)
+        self._previous.pop(name, None)
+
+    def _read_counters(self, name):
+        '''
+        Internal method to read the raw counters of a cgroup:
+        (cpu usage us, nr_periods, nr_throttled, memory bytes, cpu stall us, memory stall us).
+        '''
+        handles = self._handles[name]
+        cpu_usage_handle, cpu_stat_handle, memory_handle, cpu_pressure_handle, memory_pressure_handle = handles
+        read = self._reader.read
+        if self.version == 2:
+            fields = read(cpu_stat_handle).split()
+            # usage_usec is always the first line
+            cpu_usage = int(fields[1])
+        else:
+            cpu_usage = int(read(cpu_usage_handle)) // 1000
+            try:
+                fields = read(cpu_stat_handle).split()
+            except OSError:
+                fields = []
+        nr_periods, nr_throttled = _throttling(fields)
+        # Only the CPU counters decide whether the cgroup still exists: on v1 the memory
+        # hierarchy need not hold the same cgroups, and on v2 the controller may be disabled
+        try:
+            memory = int(read(memory_handle))
+        except (OSError, ValueError):
+            memory = 0
+        cpu_stall = memory_stall = 0
+        if cpu_pressure_handle is not None:
+            try:
+                cpu_stall = _pressure_total(read(cpu_pressure_handle))
+                memory_stall = _pressure_total(read(memory_pressure_handle))
+            except OSError:
+                # No PSI support in this kernel, or the controllers are not enabled
+                self._reader.release(handles[3:])
+                handles[3:] = [None, None]
+        return cpu_usage, nr_periods, nr_throttled, memory, cpu_stall, memory_stall
+
+    def sample(self):
+        '''
+        Read the counters of every cgroup in one pass. The first call (and a cgroup's
+        first pass after it appears) has no previous counters, so its rates are 0.
+        A cgroup is gone when its CPU counters cannot be read, its memory usage is 0
+        when it has none.
+
+        Parameters:
+        - None
+
+        Returns:
+        - stats (list): CGroupStats of every cgroup that could be read.
+        '''
+        now = time.monotonic()
+        if self._last_scan is None or now - self._last_scan >= self.rescan_interval_s:
+            self.discover()
+        elapsed_us = (now - self._previous_time) * 1000000 if self._previous_time is not None else 0
+        self._previous_time = now
+        num_cpus = os.cpu_count()
+
+        stats = []
+        gone = []
+        for name in self.names:
+            try:
+                counters = self._read_counters(name)
+            except (OSError, ValueError, IndexError):
+                gone.append(name)
+                continue
+            previous = self._previous.get(name)
+            self._previous[name] = counters
+            cpu_limit, memory_limit = self._limits[name]
+            memory = counters[3]
+
+            cpu_cores = throttled = cpu_pressure = memory_pressure = 0.0
+            if previous is not None and elapsed_us > 0:
+                cpu_cores = (counters[0] - previous[0]) / elapsed_us
+                periods = counters[1] - previous[1]
+                throttled = (counters[2] - previous[2]) / periods if periods > 0 else 0.0
+                cpu_pressure = (counters[4] - previous[4]) / elapsed_us * 100
+                memory_pressure = (counters[5] - previous[5]) / elapsed_us * 100
+            stats.append(CGroupStats(
+                name,
+                cpu_cores,
+                cpu_cores / (cpu_limit or num_cpus) * 100,
+                cpu_limit,
+                memory,
+                memory_limit,
+                memory / memory_limit * 100 if memory_limit else 0.0,
+                throttled,
+                cpu_pressure,
+                memory_pressure,
+            ))
+
+        for name in gone:
+            self._drop(name)
+        if gone:
+            self.names = [name for name in self.names if name in self._handles]
+        return stats
+
+    def close(self):
+        '''
+        Close the files kept open.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        for name in list(self._handles):
+            self._drop(name)
+        self.names = []
+        self._last_scan = None
@@ -0,0 +1,253 @@
+'''
+Publish monitor samples to a shared memory segment that other processes can read
+without touching sysfs or going through IPC. The writer requires Python 3.8+.
+
+Layout of the segment (little-endian, offsets in bytes):
+
+Header, HEADER_SIZE bytes:
+- 0   magic (4s): b"CGMS"
+- 4   layout version (uint32)
+- 8   sequence (uint64): even when the segment is consistent, odd while the writer updates it
+- 16  capacity (uint32): number of records in the ring
+- 20  record size (uint32)
+- 24  count (uint64): total number of samples written, the latest is at (count - 1) % capacity
+- 32  total time (float64): sum of sample intervals in seconds
+- 40  time weighted CPU sum (float64): sum of cpu_usage_percent * interval
+- 48  time weighted memory sum (float64): sum of memory_usage_bytes * interval
+- 56  max CPU usage percent (float64)
+- 64  max memory usage bytes (uint64)
+- 72  memory limit bytes of the latest sample (uint64), 0 if there is no limit
+- 80  reserved (uint64)
+
+Ring of `capacity` records following the header, RECORD_SIZE bytes each:
+- 0   timestamp (float64): wall clock time of the sample
+- 8   interval (float64): seconds covered by the sample
+- 16  CPU usage percent (float64)
+- 24  memory usage bytes (uint64)
+
+Readers use the sequence as a seqlock: read it, copy what they need, read it again,
+and retry if it was odd or has changed.
+'''
+import mmap
+import os
+import struct
+import time
+
+from .base_monitor import Sample
+
+
+MAGIC = b"CGMS"
+LAYOUT_VERSION = 1
+# Where POSIX shared memory segments live on Linux
+SHM_DIR = "/dev/shm"
+
+_HEADER = struct.Struct("<4sIQIIQdddd3Q")
+_SEQUENCE = struct.Struct("<Q")
+_AGGREGATES = struct.Struct("<QddddQQ")
+_RECORD = struct.Struct("<dddQ")
+HEADER_SIZE = _HEADER.size
+RECORD_SIZE = _RECORD.size
+_SEQUENCE_OFFSET = 8
+_AGGREGATES_OFFSET = 24
+
+
+def _shared_memory_module():
+    '''
+    Internal function to import multiprocessing.shared_memory, which is only available on Python 3.8+.
+    '''
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise RuntimeError("Publishing shared memory stats requires Python 3.8 or newer.")
+    return shared_memory
+
+
+class SharedStatsWriter:
+    def __init__(self, name=None, capacity=1024):
+        '''
+        Create a shared memory segment and publish samples into it.
+        Pass the writer to a monitor with CGroupMonitor.share_stats(), or call publish() directly.
+        The segment is removed by close().
+
+        Parameters:
+        - name (str): Name of the segment. Default is None, which generates a unique name.
+        - capacity (int): Number of samples kept in the ring. Default is 1024.
+
+        Returns:
+        - None
+        '''
+        shared_memory = _shared_memory_module()
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + capacity * RECORD_SIZE)
+        self.name = self.shm.name
+        self._buf = self.shm.buf
+        # Monitor publishing into the segment, set by CGroupMonitor.share_stats()
+        self.monitor = None
+
+        self._sequence = 0
+        self._count = 0
+        self._total_time = 0.0
+        self._cpu_sum = 0.0
+        self._memory_sum = 0.0
+        self._max_cpu = 0.0
+        self._max_memory = 0
+        _HEADER.pack_into(
+            self._buf, 0, MAGIC, LAYOUT_VERSION, 0, capacity, RECORD_SIZE, 0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0
+        )
+
+    def publish(self, sample):
+        '''
+        Append a sample to the ring and update the running aggregates.
+
+        Parameters:
+        - sample (Sample): Sample to publish.
+
+        Returns:
+        - None
+        '''
+        buf = self._buf
+        if buf is None:
+            # Closed while the monitor thread was already calling its listeners
+            return
+        memory = int(sample.memory_usage_bytes)
+        self._total_time += sample.interval
+        self._cpu_sum += sample.cpu_usage_percent * sample.interval
+        self._memory_sum += memory * sample.interval
+        self._max_cpu = max(self._max_cpu, sample.cpu_usage_percent)
+        self._max_memory = max(self._max_memory, memory)
+
+        self._sequence += 1
+        _SEQUENCE.pack_into(buf, _SEQUENCE_OFFSET, self._sequence)
+        _RECORD.pack_into(
+            buf, HEADER_SIZE + (self._count % self.capacity) * RECORD_SIZE,
+            sample.timestamp, sample.interval, sample.cpu_usage_percent, memory,
+        )
+        self._count += 1
+        _AGGREGATES.pack_into(
+            buf, _AGGREGATES_OFFSET, self._count, self._total_time, self._cpu_sum, self._memory_sum,
+            self._max_cpu, self._max_memory, int(sample.memory_limit_bytes or 0),
+        )
+        self._sequence += 1
+        _SEQUENCE.pack_into(buf, _SEQUENCE_OFFSET, self._sequence)
+
+    __call__ = publish
+
+    def close(self, unlink=True):
+        '''
+        Stop publishing the monitor's samples, close the segment, and remove it unless unlink is False.
+
+        Parameters:
+        - unlink (bool): Whether to remove the segment. Default is True.
+
+        Returns:
+        - None
+        '''
+        if self.monitor is not None:
+            self.monitor.unsubscribe(self.publish)
+            self.monitor = None
+        self._buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedStatsReader:
+    def __init__(self, name):
+        '''
+        Attach to a segment created by SharedStatsWriter.
+
+        Parameters:
+        - name (str): Name of the segment.
+
+        Returns:
+        - None
+        '''
+        # Map the segment directly instead of through SharedMemory, whose resource
+        # tracker would remove the segment when a reader process exits (bpo-39959)
+        fd = os.open(os.path.join(SHM_DIR, name.lstrip("/")), os.O_RDONLY)
+        try:
+            self._mmap = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        self.name = name
+        self._buf = memoryview(self._mmap)
+
+        magic, version, _, capacity, record_size = _HEADER.unpack_from(self._buf, 0)[:5]
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != RECORD_SIZE:
+            self.close()
+            raise RuntimeError(f"Shared memory segment {name} does not hold cgroup monitor stats.")
+        self.capacity = capacity
+
+    def _read_consistent(self, read):
+        '''
+        Internal method to run read() under the seqlock until it sees a consistent segment.
+        '''
+        buf = self._buf
+        while True:
+            before = _SEQUENCE.unpack_from(buf, _SEQUENCE_OFFSET)[0]
+            if before & 1:
+                time.sleep(0)
+                continue
+            result = read(buf)
+            if _SEQUENCE.unpack_from(buf, _SEQUENCE_OFFSET)[0] == before:
+                return result
+
+    def read_samples(self, n=1):
+        '''
+        Read the last n samples.
+
+        Parameters:
+        - n (int): Number of samples to read, at most the ring capacity. Default is 1.
+
+        Returns:
+        - samples (list): List of Sample, oldest first.
+        '''
+        def read(buf):
+            aggregates = _AGGREGATES.unpack_from(buf, _AGGREGATES_OFFSET)
+            count, memory_limit = aggregates[0], aggregates[6]
+            samples = []
+            for i in range(max(count - min(n, self.capacity), 0), count):
+                record = _RECORD.unpack_from(buf, HEADER_SIZE + (i % self.capacity) * RECORD_SIZE)
+                samples.append(Sample(*record, memory_limit))
+            return samples
+
+        return self._read_consistent(read)
+
+    def get_stats(self):
+        '''
+        Get the running aggregates over every published sample, in the format of
+        CGroupMonitor.get_last_n_stats().
+
+        Parameters:
+        - None
+
+        Returns:
+        - stats (dict): Dictionary containing average and max usage stats, and the sample count.
+        '''
+        count, total_time, cpu_sum, memory_sum, max_cpu, max_memory, memory_limit = self._read_consistent(
+            lambda buf: _AGGREGATES.unpack_from(buf, _AGGREGATES_OFFSET)
+        )
+        avg_cpu = cpu_sum / total_time if total_time else 0
+        avg_memory = memory_sum / total_time if total_time else 0
+        return {
+            "average_cpu_usage_percent": round(avg_cpu, 2),
+            "max_cpu_usage_percent": round(max_cpu, 2),
+            "average_memory_usage_gib": round(avg_memory / (1024 ** 3), 2),
+            "max_memory_usage_gib": round(max_memory / (1024 ** 3), 2),
+            "average_memory_usage_percent": round(avg_memory / memory_limit * 100, 2) if memory_limit else 0,
+            "max_memory_usage_percent": round(max_memory / memory_limit * 100, 2) if memory_limit else 0,
+            "sample_count": count,
+        }
+
+    def close(self):
+        '''
+        Detach from the segment. The segment itself is left for the writer to remove.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        self._buf.release()
+        self._mmap.close()
@@ -0,0 +1,407 @@
+import argparse
+import json
+import math
+import sys
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        '''
+        Mergeable quantile sketch with log-spaced buckets (as in DDSketch).
+        Quantiles are within relative_accuracy of the exact value, and merging two
+        sketches gives the same result as sketching all of their values at once.
+
+        Parameters:
+        - relative_accuracy (float): Relative error bound of the quantiles. Default is 0.01.
+
+        Returns:
+        - None
+        '''
+        self.relative_accuracy = relative_accuracy
+        self._gamma_log = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        '''
+        Add a non-negative value.
+
+        Parameters:
+        - value (float): Value to add. Values below 1e-9 are counted as zero.
+        - count (int): Number of times to add it. Default is 1.
+
+        Returns:
+        - None
+        '''
+        self.count += count
+        if value < 1e-9:
+            self.zero_count += count
+            return
+        key = math.ceil(math.log(value) / self._gamma_log)
+        self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def merge(self, other):
+        '''
+        Add the values of another sketch to this one.
+
+        Parameters:
+        - other (QuantileSketch): Sketch with the same relative accuracy.
+
+        Returns:
+        - self (QuantileSketch): This sketch.
+        '''
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with a different relative accuracy.")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        '''
+        Get an approximate quantile.
+
+        Parameters:
+        - q (float): Quantile between 0 and 1.
+
+        Returns:
+        - value (float): Approximate quantile, 0 if the sketch is empty.
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Middle of the bucket in log space, to stay within the relative accuracy
+                return 2 * math.exp(key * self._gamma_log) / (1 + math.exp(self._gamma_log))
+        return 2 * math.exp(max(self.buckets) * self._gamma_log) / (1 + math.exp(self._gamma_log))
+
+    def to_dict(self):
+        '''
+        Serialise the sketch to a JSON compatible dict.
+        '''
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "buckets": {str(key): count for key, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Load a sketch serialised with to_dict().
+        '''
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(key): count for key, count in data["buckets"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+class Summary:
+    def __init__(self, memory_limit_bytes=None):
+        '''
+        Mergeable summary of monitor samples: counts, sums, time-weighted sums, min/max and
+        quantile sketches. Summaries of different runs, cgroups or hosts combine exactly
+        with merge(), without going back to the raw samples.
+
+        Parameters:
+        - memory_limit_bytes (int): Memory limit the samples were taken under. Default is None.
+
+        Returns:
+        - None
+        '''
+        self.count = 0
+        self.runs = 1
+        self.duration_s = 0.0
+        self.start_time = None
+        self.end_time = None
+        self.memory_limit_bytes = memory_limit_bytes
+        self.cpu_sum = 0.0
+        self.cpu_weighted_sum = 0.0
+        self.cpu_min = math.inf
+        self.cpu_max = -math.inf
+        self.memory_sum = 0.0
+        self.memory_weighted_sum = 0.0
+        self.memory_min = math.inf
+        self.memory_max = -math.inf
+        self.cpu_sketch = QuantileSketch()
+        self.memory_sketch = QuantileSketch()
+
+    def add(self, cpu_usage_percent, memory_usage_bytes, interval, timestamp=None):
+        '''
+        Add one sample.
+
+        Parameters:
+        - cpu_usage_percent (float): CPU usage percentage of the sample.
+        - memory_usage_bytes (int): Memory usage in bytes of the sample.
+        - interval (float): Seconds covered by the sample.
+        - timestamp (float): Wall clock time at the end of the sample. Default is None.
+
+        Returns:
+        - None
+        '''
+        self.count += 1
+        self.duration_s += interval
+        self.cpu_sum += cpu_usage_percent
+        self.cpu_weighted_sum += cpu_usage_percent * interval
+        self.cpu_min = min(self.cpu_min, cpu_usage_percent)
+        self.cpu_max = max(self.cpu_max, cpu_usage_percent)
+        self.memory_sum += memory_usage_bytes
+        self.memory_weighted_sum += memory_usage_bytes * interval
+        self.memory_min = min(self.memory_min, memory_usage_bytes)
+        self.memory_max = max(self.memory_max, memory_usage_bytes)
+        self.cpu_sketch.add(cpu_usage_percent)
+        self.memory_sketch.add(memory_usage_bytes)
+        if timestamp is not None:
+            start = timestamp - interval
+            self.start_time = start if self.start_time is None else min(self.start_time, start)
+            self.end_time = timestamp if self.end_time is None else max(self.end_time, timestamp)
+
+    def merge(self, other):
+        '''
+        Add another summary to this one. Merging is associative and commutative.
+
+        Parameters:
+        - other (Summary): Summary to merge in.
+
+        Returns:
+        - self (Summary): This summary.
+        '''
+        if self.memory_limit_bytes != other.memory_limit_bytes:
+            # Percentages of different limits cannot be combined
+            self.memory_limit_bytes = None
+
+        self.runs += other.runs
+        self.count += other.count
+        self.duration_s += other.duration_s
+        self.cpu_sum += other.cpu_sum
+        self.cpu_weighted_sum += other.cpu_weighted_sum
+        self.cpu_min = min(self.cpu_min, other.cpu_min)
+        self.cpu_max = max(self.cpu_max, other.cpu_max)
+        self.memory_sum += other.memory_sum
+        self.memory_weighted_sum += other.memory_weighted_sum
+        self.memory_min = min(self.memory_min, other.memory_min)
+        self.memory_max = max(self.memory_max, other.memory_max)
+        self.cpu_sketch.merge(other.cpu_sketch)
+        self.memory_sketch.merge(other.memory_sketch)
+        for attr, pick in (("start_time", min), ("end_time", max)):
+            values = [v for v in (getattr(self, attr), getattr(other, attr)) if v is not None]
+            setattr(self, attr, pick(values) if values else None)
+        return self
+
+    @classmethod
+    def merge_all(cls, summaries):
+        '''
+        Merge any number of summaries into a new one.
+
+        Parameters:
+        - summaries (iterable): Summaries to merge.
+
+        Returns:
+        - summary (Summary): The merged summary.
+        '''
+        merged = None
+        for summary in summaries:
+            if merged is None:
+                merged = cls.from_dict(summary.to_dict())
+            else:
+                merged.merge(summary)
+        if merged is None:
+            raise ValueError("Nothing to merge.")
+        return merged
+
+    @classmethod
+    def from_samples(cls, cpu_usage_percentages, memory_usage, sample_intervals, memory_limit_bytes=None,
+                     start_time=None):
+        '''
+        Build a summary from the sample lists of a monitor or a recording.
+
+        Parameters:
+        - cpu_usage_percentages (list): CPU usage percentage of each sample.
+        - memory_usage (list): Memory usage in bytes of each sample.
+        - sample_intervals (list): Interval in seconds covered by each sample.
+        - memory_limit_bytes (int): Memory limit the samples were taken under. Default is None.
+        - start_time (float): Wall clock time at which the first sample started. Default is None.
+
+        Returns:
+        - summary (Summary): Summary of the samples.
+        '''
+        summary = cls(memory_limit_bytes or None)
+        timestamp = start_time
+        for cpu, memory, interval in zip(cpu_usage_percentages, memory_usage, sample_intervals):
+            if timestamp is not None:
+                timestamp += interval
+            summary.add(cpu, memory, interval, timestamp)
+        return summary
+
+    def report(self):
+        '''
+        Get the summary in the format of CGroupMonitor.stop_monitor(), plus quantiles and counts.
+
+        Parameters:
+        - None
+
+        Returns:
+        - stats (dict): Dictionary containing average, max and quantile usage stats.
+        '''
+        if self.count == 0:
+            return {"sample_count": 0, "runs": self.runs}
+        limit = self.memory_limit_bytes
+        avg_cpu = self.cpu_weighted_sum / self.duration_s if self.duration_s else self.cpu_sum / self.count
+        avg_memory = self.memory_weighted_sum / self.duration_s if self.duration_s else self.memory_sum / self.count
+        return {
+            "average_cpu_usage_percent": round(avg_cpu, 2),
+            "min_cpu_usage_percent": round(self.cpu_min, 2),
+            "max_cpu_usage_percent": round(self.cpu_max, 2),
+            "p50_cpu_usage_percent": round(self.cpu_sketch.quantile(0.5), 2),
+            "p95_cpu_usage_percent": round(self.cpu_sketch.quantile(0.95), 2),
+            "p99_cpu_usage_percent": round(self.cpu_sketch.quantile(0.99), 2),
+            "average_memory_usage_gib": round(avg_memory / (1024 ** 3), 2),
+            "min_memory_usage_gib": round(self.memory_min / (1024 ** 3), 2),
+            "max_memory_usage_gib": round(self.memory_max / (1024 ** 3), 2),
+            "p95_memory_usage_gib": round(self.memory_sketch.quantile(0.95) / (1024 ** 3), 2),
+            "average_memory_usage_percent": round(avg_memory / limit * 100, 2) if limit else 0,
+            "max_memory_usage_percent": round(self.memory_max / limit * 100, 2) if limit else 0,
+            "monitoring_duration_s": round(self.duration_s, 2),
+            "sample_count": self.count,
+            "runs": self.runs,
+        }
+
+    def to_dict(self):
+        '''
+        Serialise the summary to a JSON compatible dict.
+
+        Parameters:
+        - None
+
+        Returns:
+        - data (dict): The summary, loadable with Summary.from_dict().
+        '''
+        data = {"type": "summary", "version": 1}
+        for attr in ("count", "runs", "duration_s", "start_time", "end_time", "memory_limit_bytes",
+                     "cpu_sum", "cpu_weighted_sum", "memory_sum", "memory_weighted_sum"):
+            data[attr] = getattr(self, attr)
+        for attr in ("cpu_min", "cpu_max", "memory_min", "memory_max"):
+            value = getattr(self, attr)
+            data[attr] = value if math.isfinite(value) else None
+        data["cpu_sketch"] = self.cpu_sketch.to_dict()
+        data["memory_sketch"] = self.memory_sketch.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        '''
+        Load a summary serialised with to_dict().
+
+        Parameters:
+        - data (dict): The serialised summary.
+
+        Returns:
+        - summary (Summary): The summary.
+        '''
+        summary = cls()
+        for attr in ("count", "runs", "duration_s", "start_time", "end_time", "memory_limit_bytes",
+                     "cpu_sum", "cpu_weighted_sum", "memory_sum", "memory_weighted_sum"):
+            setattr(summary, attr, data[attr])
+        for attr, default in (("cpu_min", math.inf), ("cpu_max", -math.inf),
+                              ("memory_min", math.inf), ("memory_max", -math.inf)):
+            setattr(summary, attr, default if data[attr] is None else data[attr])
+        summary.cpu_sketch = QuantileSketch.from_dict(data["cpu_sketch"])
+        summary.memory_sketch = QuantileSketch.from_dict(data["memory_sketch"])
+        return summary
+
+    def save(self, path):
+        '''
+        Save the summary as JSON.
+
+        Parameters:
+        - path (str): Path of the file to write.
+
+        Returns:
+        - None
+        '''
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+def summary_from_recording(data):
+    '''
+    Build a summary from a recording saved with CGroupMonitor.save_recording().
+
+    Parameters:
+    - data (dict): The loaded recording.
+
+    Returns:
+    - summary (Summary): Summary of the recorded samples.
+    '''
+    return Summary.from_samples(
+        data["cpu_usage_percentages"],
+        data["memory_usage"],
+        data["sample_intervals"],
+        data.get("memory_limit_bytes"),
+        data.get("start_time"),
+    )
+
+
+def load_summary(path):
+    '''
+    Load a summary file, or summarise a recording file.
+
+    Parameters:
+    - path (str): Path to a file written by Summary.save(), CGroupMonitor.save_recording()
+        or cgroup-monitor record.
+
+    Returns:
+    - summary (Summary): The summary.
+    '''
+    with open(path, "r") as f:
+        data = json.load(f)
+    if data.get("type") == "summary":
+        return Summary.from_dict(data)
+    if data.get("type") == "recording":
+        return summary_from_recording(data)
+    if data.get("type") == "recording_set":
+        return Summary.merge_all(summary_from_recording(recording) for recording in data["recordings"])
+    raise ValueError(f"{path} is neither a summary nor a recording.")
+
+
+def merge_files(paths):
+    '''
+    Merge summary and recording files into one summary.
+
+    Parameters:
+    - paths (list): Paths to summary or recording files.
+
+    Returns:
+    - summary (Summary): The merged summary.
+    '''
+    return Summary.merge_all(load_summary(path) for path in paths)
+
+
+def main(argv=None):
+    '''
+    Merge summary and recording files and print the combined report as JSON.
+    Usage: python -m cgroup_monitor.summary FILE [FILE ...] [--output merged.json]
+    '''
+    parser = argparse.ArgumentParser(description="Merge cgroup-monitor summaries and recordings into one report.")
+    parser.add_argument("files", nargs="+", help="Summary or recording files.")
+    parser.add_argument("--output", "-o", help="Also save the merged summary to this file.")
+    args = parser.parse_args(argv)
+
+    merged = merge_files(args.files)
+    if args.output:
+        merged.save(args.output)
+    json.dump(merged.report(), sys.stdout, indent=4)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import os
 import subprocess
 
+from .mounts import v1_controller_path
+
 
 class CGroupManager:
-    def __init__(self, cgroup_name, cgroup_base_path="/sys/fs/cgroup", helper_script=None):
+    def __init__(self, cgroup_name, cgroup_base_path=None, helper_script=None, controller_names=None):
         '''
         Initialize the CGroupManager object. If helper_script is not provided,
         the script will use the default method of managing cgroups.
@@ -13,21 +15,52 @@ class CGroupManager:
 
         Parameters:
         - cgroup_name (str): Name of the cgroup. Necessary argument.
-        - cgroup_base_path (str): Base path of the cgroup. Default is /sys/fs/cgroup.
+        - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+            resolves the mount point of each controller from /proc/self/mountinfo.
         - helper_script (str): Path to the helper script to manage cgroups. Default is None.
+        - controller_names (dict): Per controller cgroup names, overriding cgroup_name.
+            Needed when a process sits in different cgroups per hierarchy. Default is None.
 
         Returns:
         - None
         '''
         self.cgroup_name = cgroup_name
         self.cgroup_base_path = cgroup_base_path
-        self.cpu_path = os.path.join(self.cgroup_base_path, "cpu", cgroup_name)
-        self.mem_path = os.path.join(self.cgroup_base_path, "memory", cgroup_name)
+        self.controller_names = controller_names or {}
+        self.cpu_path = self._controller_path("cpu")
+        self.cpuacct_path = self._controller_path("cpuacct")
+        self.mem_path = self._controller_path("memory")
+        self.freezer_path = self._controller_path("freezer")
+        # The v1 freezer has no change notifications
+        self.freeze_events_path = None
         self.helper_script = None
 
+        # cpu and cpuacct are usually co-mounted, only keep one path per hierarchy.
+        # The freezer is only managed where its hierarchy is mounted.
+        paths = [self.cpu_path, self.cpuacct_path, self.mem_path]
+        if os.path.isdir(v1_controller_path("freezer", "", cgroup_base_path)):
+            paths.append(self.freezer_path)
+        self.controller_paths = []
+        for path in paths:
+            if all(os.path.realpath(path) != os.path.realpath(p) for p in self.controller_paths):
+                self.controller_paths.append(path)
+
         if helper_script is not None:
             self.helper_script = os.path.join(os.path.dirname(__file__), helper_script)
 
+    def _controller_path(self, controller):
+        '''
+        Internal method to get the cgroup directory in a controller's hierarchy.
+
+        Parameters:
+        - controller (str): Controller name, e.g. "cpu" or "memory".
+
+        Returns:
+        - path (str): Path to the cgroup directory.
+        '''
+        name = self.controller_names.get(controller, self.cgroup_name)
+        return v1_controller_path(controller, name, self.cgroup_base_path)
+
     def _run_command(self, runner_cmd, helper_cmd, sudo):
         '''
         Internal function to run given command conditionally.
@@ -70,7 +103,7 @@ class CGroupManager:
         - returncode (int): Return whether the command was successful.
         '''
         # Create cgroup if it does not exist
-        for path in [self.cpu_path, self.mem_path]:
+        for path in self.controller_paths:
             if not os.path.exists(path):
                 if self.helper_script is None:
                     proc = subprocess.run(["sudo", "mkdir", path], check=True)
@@ -81,7 +114,7 @@ class CGroupManager:
                     raise Exception(f"Failed to create cgroup: {path}")
 
         # Take ownership of cgroup
-        for path in [self.cpu_path, self.mem_path]:
+        for path in self.controller_paths:
             if self.helper_script is None:
                 proc = subprocess.run(["sudo", "chown", "-R", f"{os.getuid()}:{os.getgid()}", path], check=True)
             else:
@@ -97,7 +130,7 @@ class CGroupManager:
         Set the CPU limits.
 
         Parameters:
-        - quota (int): CPU quota in microseconds.
+        - quota (float): CPU quota in number of cores.
         - period (int): CPU period in microseconds. Default is 100000.
         - sudo (bool): Whether to use sudo to run the command. Default is True.
 
@@ -107,9 +140,9 @@ class CGroupManager:
         cpu_quota_path = os.path.join(self.cpu_path, "cpu.cfs_quota_us")
         cpu_period_path = os.path.join(self.cpu_path, "cpu.cfs_period_us")
 
-        runner_cmd_quota = f"echo \"{quota * period}\" > {cpu_quota_path}"
+        runner_cmd_quota = f"echo \"{int(quota * period)}\" > {cpu_quota_path}"
         runner_cmd_period = f"echo \"{period}\" > {cpu_period_path}"
-        helper_cmd_quota = [self.helper_script, "write", cpu_quota_path, str(quota)]
+        helper_cmd_quota = [self.helper_script, "write", cpu_quota_path, str(int(quota * period))]
         helper_cmd_period = [self.helper_script, "write", cpu_period_path, str(period)]
 
         self._run_command(runner_cmd_quota, helper_cmd_quota, sudo)
@@ -150,6 +183,64 @@ class CGroupManager:
 
         return self._run_command(runner_cmd, helper_cmd, sudo)
 
+    def _request_frozen(self, frozen, sudo=False):
+        '''
+        Internal method to ask the kernel to freeze or thaw the cgroup, without waiting.
+        '''
+        state_path = os.path.join(self.freezer_path, "freezer.state")
+        state = "FROZEN" if frozen else "THAWED"
+        runner_cmd = f"echo \"{state}\" > {state_path}"
+        helper_cmd = [self.helper_script, "write", state_path, state]
+
+        return self._run_command(runner_cmd, helper_cmd, sudo)
+
+    def is_frozen(self):
+        '''
+        Check whether the cgroup is frozen (freezer.state is FROZEN, not FREEZING).
+
+        Parameters:
+        - None
+
+        Returns:
+        - frozen (bool): True if the cgroup is frozen.
+        '''
+        try:
+            with open(os.path.join(self.freezer_path, "freezer.state"), "r") as f:
+                return f.read().strip() == "FROZEN"
+        except FileNotFoundError:
+            return False
+
+    def freeze(self, timeout=5.0, sudo=False):
+        '''
+        Freeze the cgroup (freezer.state) and wait until all of its processes are stopped.
+        v1 has no notifications for the freezer, so the state is polled with backoff.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is 5, 0 to not wait.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - frozen (bool): Whether the cgroup was frozen in time, always True if not waiting.
+        '''
+        from .freezer import freeze_all
+
+        return not freeze_all([self], timeout, sudo)
+
+    def thaw(self, timeout=5.0, sudo=False):
+        '''
+        Thaw the cgroup and wait until it is no longer frozen.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is 5, 0 to not wait.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - thawed (bool): Whether the cgroup was thawed in time, always True if not waiting.
+        '''
+        from .freezer import thaw_all
+
+        return not thaw_all([self], timeout, sudo)
+
     def add_process(self, pid, sudo=False):
         '''
         Add a process to the cgroup.
@@ -161,7 +252,7 @@ class CGroupManager:
         Returns:
         - returncode (int): Return whether the command was successful.
         '''
-        for path in [self.cpu_path, self.mem_path]:
+        for path in self.controller_paths:
             procs_path = os.path.join(path, "cgroup.procs")
             runner_cmd = f"echo \"{pid}\" > {procs_path}"
             helper_cmd = [self.helper_script, "write", procs_path, str(pid)]
@@ -178,7 +269,7 @@ class CGroupManager:
         Returns:
         - returncode (int): Return whether the command was successful.
         '''
-        for path in [self.cpu_path, self.mem_path]:
+        for path in self.controller_paths:
             if os.path.exists(path):
                 runner_cmd = f"rmdir {path}"
                 helper_cmd = [self.helper_script, "delete", path]
@@ -1,46 +1,93 @@
-import time
 import os
-import threading
 
+from .base_monitor import BaseCGroupMonitor, RawCounters
+from .mounts import pid_cgroup_names, v1_controller_path
+from .v2_manager import parse_cpu_list
 
-class CGroupMonitor:
-    def __init__(self, cgroup_name="", cgroup_base_path="/sys/fs/cgroup"):
+
+class CGroupMonitor(BaseCGroupMonitor):
+    def __init__(self, cgroup_name="", cgroup_base_path=None, controller_names=None):
         '''
         Initialize the CGroupMonitor object.
 
         Parameters:
         - cgroup_name (str): Name of the cgroup. Default is an empty string.
-        - cgroup_base_path (str): Base path of the cgroup. Default is /sys/fs/cgroup.
+        - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+            resolves the mount point of each controller from /proc/self/mountinfo.
+        - controller_names (dict): Per controller cgroup names, overriding cgroup_name.
+            Needed when a process sits in different cgroups per hierarchy. Default is None.
 
         Returns:
         - None
         '''
+        super().__init__()
         self.cgroup_name = cgroup_name
         self.cgroup_base_path = cgroup_base_path
-        self.cpu_path = os.path.join(self.cgroup_base_path, "cpu", cgroup_name)
-        self.mem_path = os.path.join(self.cgroup_base_path, "memory", cgroup_name)
+        self.controller_names = controller_names or {}
+        self.cpu_path = self._controller_path("cpu")
+        self.cpuacct_path = self._controller_path("cpuacct")
+        self.mem_path = self._controller_path("memory")
+        self.pids_path = self._controller_path("pids")
+        self.cpuset_path = self._controller_path("cpuset")
+        # Files of get_raw_counters(), joined once as spans read them on every entry and exit
+        self._raw_paths = (
+            os.path.join(self.cpuacct_path, "cpuacct.usage"),
+            os.path.join(self.cpu_path, "cpu.stat"),
+            os.path.join(self.mem_path, "memory.usage_in_bytes"),
+            os.path.join(self.mem_path, "memory.max_usage_in_bytes"),
+        )
 
-        self.monitoring = False
-        self.cpu_usage_percentages = []
-        self.memory_usage = []
-        self.monitor_thread = None
-        self.start_time = None
+    def _controller_path(self, controller):
+        '''
+        Internal method to get the cgroup directory in a controller's hierarchy.
 
-    def _read_file(self, path):
+        Parameters:
+        - controller (str): Controller name, e.g. "cpu" or "memory".
+
+        Returns:
+        - path (str): Path to the cgroup directory.
         '''
-        Internal method to read the contents of a file.
+        name = self.controller_names.get(controller, self.cgroup_name)
+        return v1_controller_path(controller, name, self.cgroup_base_path)
+
+    @classmethod
+    def for_pid(cls, pid):
+        '''
+        Create a monitor for the cgroups a process belongs to, read from /proc/<pid>/cgroup.
 
         Parameters:
-        - path (str): Path to the file.
+        - pid (int): Process ID.
 
         Returns:
-        - content (str): Content of the file.
+        - monitor (CGroupMonitor): Monitor for the cgroups of the process.
         '''
-        try:
-            with open(path, "r") as f:
-                return f.read().strip()
-        except FileNotFoundError:
-            return None
+        names = pid_cgroup_names(pid)
+        return cls(names.get("memory", ""), controller_names=names)
+
+    @classmethod
+    def for_self(cls):
+        '''
+        Create a monitor for the cgroups of the current process, e.g. the container it runs in.
+
+        Parameters:
+        - None
+
+        Returns:
+        - monitor (CGroupMonitor): Monitor for the cgroups of the current process.
+        '''
+        return cls.for_pid(os.getpid())
+
+    def exists(self):
+        '''
+        Check whether the cgroup still exists.
+
+        Parameters:
+        - None
+
+        Returns:
+        - exists (bool): True if the cgroup directory exists.
+        '''
+        return os.path.isdir(self.cpuacct_path)
 
     def get_cpu_usage_us(self):
         '''
@@ -52,9 +99,48 @@ class CGroupMonitor:
         Returns:
         - usage_usec (int): CPU usage in microseconds.
         '''
-        cpu_stat_path = os.path.join(self.cpu_path, "cpuacct.usage")
+        cpu_stat_path = os.path.join(self.cpuacct_path, "cpuacct.usage")
         content = self._read_file(cpu_stat_path)
-        return int(content) if content else 0
+        # cpuacct.usage is in nanoseconds
+        return int(content) // 1000 if content else 0
+
+    def get_cpu_usage_percpu(self):
+        '''
+        Get the cumulative CPU usage of each CPU, split into user and system time.
+
+        Parameters:
+        - None
+
+        Returns:
+        - user_usec (list): User time in microseconds, one entry per CPU.
+        - system_usec (list): System time in microseconds, one entry per CPU.
+        '''
+        # cpuacct.usage_all has one "cpu user system" row per CPU, in nanoseconds
+        content = self._read_file(os.path.join(self.cpuacct_path, "cpuacct.usage_all"))
+        if content:
+            rows = [line.split() for line in content.splitlines()[1:]]
+            return [int(row[1]) // 1000 for row in rows], [int(row[2]) // 1000 for row in rows]
+
+        # Kernels before 4.7 only have the per-CPU total
+        content = self._read_file(os.path.join(self.cpuacct_path, "cpuacct.usage_percpu"))
+        usage = [int(value) // 1000 for value in content.split()] if content else []
+        return usage, [0] * len(usage)
+
+    def get_cpu_throttling(self):
+        '''
+        Get the cumulative CFS throttling counters.
+
+        Parameters:
+        - None
+
+        Returns:
+        - nr_periods (int): Number of enforcement periods that have elapsed.
+        - nr_throttled (int): Number of periods in which the cgroup was throttled.
+        - throttled_usec (int): Total time the cgroup was throttled, in microseconds.
+        '''
+        stat = self._read_keyed_file(os.path.join(self.cpu_path, "cpu.stat"))
+        # throttled_time is in nanoseconds
+        return stat.get("nr_periods", 0), stat.get("nr_throttled", 0), stat.get("throttled_time", 0) // 1000
 
     def get_cpu_limit(self):
         '''
@@ -90,199 +176,156 @@ class CGroupMonitor:
         content = self._read_file(memory_current_path)
         return int(content) if content else 0
 
-    def get_memory_limit(self):
+    def get_memory_peak(self):
         '''
-        Get the memory limit in bytes.
+        Get the highest memory usage recorded for the cgroup, in bytes (memory.max_usage_in_bytes).
 
         Parameters:
         - None
 
         Returns:
-        - memory_limit (int): Memory limit in bytes.
+        - memory_peak (int): Peak memory usage in bytes, 0 if not available.
         '''
-        memory_max_path = os.path.join(self.mem_path, "memory.limit_in_bytes")
-        content = self._read_file(memory_max_path)
-        return int(content) if content else None
+        memory_peak_path = os.path.join(self.mem_path, "memory.max_usage_in_bytes")
+        content = self._read_file(memory_peak_path)
+        return int(content) if content else 0
 
-    def get_swap_limit(self):
+    def get_raw_counters(self):
         '''
-        Get the memory+swap limit in bytes.
+        Read the cumulative CPU, memory and throttling counters with as few reads as possible.
 
         Parameters:
         - None
 
         Returns:
-        - memory_swap_limit (int): Memory+swap limit in bytes.
+        - counters (RawCounters): Current counter values.
         '''
-        memory_swap_max_path = os.path.join(self.mem_path, "memory.memsw.limit_in_bytes")
-        content = self._read_file(memory_swap_max_path)
-        return int(content) if content else None
+        usage_path, cpu_stat_path, memory_path, peak_path = self._raw_paths
+        usage = self._pread(usage_path)
+        cpu_stat = {}
+        for line in (self._pread(cpu_stat_path) or "").splitlines():
+            key, _, value = line.partition(" ")
+            cpu_stat[key] = value
+        memory = self._pread(memory_path)
+        peak = self._pread(peak_path)
+        # cpuacct.usage and throttled_time are in nanoseconds
+        return RawCounters(
+            int(usage) // 1000 if usage else 0,
+            int(memory) if memory else 0,
+            int(peak) if peak else 0,
+            int(cpu_stat.get("nr_throttled", 0)),
+            int(cpu_stat.get("throttled_time", 0)) // 1000,
+        )
 
-    def _monitor(self, interval):
+    def get_raw_memory_usage(self):
         '''
-        Internal method to monitor CPU and memory usage.
+        Read the current memory usage in bytes through a cached file descriptor.
 
         Parameters:
-        - interval (int): Monitoring interval in seconds.
+        - None
 
         Returns:
-        - None
+        - memory_usage (int): Memory usage in bytes.
         '''
-        prev_cpu_usage = self.get_cpu_usage_us()
-        while self.monitoring:
-            time.sleep(interval)
-
-            # CPU percentage calculation
-            current_cpu_usage = self.get_cpu_usage_us()
-            delta = current_cpu_usage - prev_cpu_usage
-            prev_cpu_usage = current_cpu_usage
+        memory = self._pread(self._raw_paths[2])
+        return int(memory) if memory else 0
 
-            quota, period = self.get_cpu_limit()
-            num_cores = quota / period if quota > 0 else os.cpu_count()
-            total_cpu_time_available = num_cores * (interval * 1e9)
-            cpu_usage_percent = (delta / total_cpu_time_available) * 100
+    def get_pids_counters(self):
+        '''
+        Read the number of tasks and how often forks failed on the limit, in one go.
 
-            # Store results
-            self.cpu_usage_percentages.append(cpu_usage_percent)
-            self.memory_usage.append(self.get_memory_usage())
+        Parameters:
+        - None
 
-    def start_monitor(self, interval=1):
+        Returns:
+        - counters (tuple): (pids.current, "max" count of pids.events), None if the
+            pids controller is not enabled for the cgroup.
         '''
-        Start monitoring CPU and memory usage.
+        current = self._pread(os.path.join(self.pids_path, "pids.current"))
+        if current is None:
+            return None
+        events = self._pread(os.path.join(self.pids_path, "pids.events")) or ""
+        limit_hits = 0
+        for line in events.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "max":
+                limit_hits = int(value)
+        return int(current), limit_hits
+
+    def get_pids_limit(self):
+        '''
+        Get the maximum number of tasks (pids.max).
 
         Parameters:
-        - interval (int): Monitoring interval in seconds. Default is 1.
-            Uses time.sleep() and can be float value for higher precision.
+        - None
 
         Returns:
-        - None
+        - pids_limit (int): Maximum number of processes and threads, 0 if there is no limit.
+        '''
+        content = self._read_file(os.path.join(self.pids_path, "pids.max"))
+        return int(content) if content and content != "max" else 0
+
+    def get_memory_numa_stat(self):
         '''
-        if self.monitoring:
-            raise RuntimeError("Monitoring is already running.")
+        Get the anonymous and file memory of the cgroup on each NUMA node.
+        cgroup v1 counts pages, which are converted to bytes.
 
-        self.monitoring = True
-        self.cpu_usage_percentages = []
-        self.memory_usage = []
-        self.start_time = time.time()
-        self.monitor_thread = threading.Thread(
-            target=self._monitor, args=(interval,), daemon=True
+        Parameters:
+        - None
+
+        Returns:
+        - numa_stat (tuple): (nodes, anon_bytes, file_bytes), the last two with one entry per
+            node, None if memory.numa_stat does not exist.
+        '''
+        content = self._pread(os.path.join(self.mem_path, "memory.numa_stat"))
+        if content is None:
+            return None
+        return self._parse_numa_stat(
+            content,
+            # Prefer the counters including the descendants, like memory.usage_in_bytes
+            (("hierarchical_anon=", "hierarchical_file="), ("anon=", "file=")),
+            scale=os.sysconf("SC_PAGE_SIZE"),
         )
-        self.monitor_thread.start()
 
-    def get_last_n_stats(self, n=1, info_level=0):
+    def get_cpuset_mems(self):
         '''
-        Get the last n stats recorded.
+        Get the NUMA nodes the cgroup may allocate memory from.
 
         Parameters:
-        - n (int): Number of stats to retrieve. Default is 1.
-        - info_level (int): Level of information to return. Default is 0.
-            - 0: Return average and max usage stats.
-            - 1: Return detailed stats including all recorded values.
+        - None
 
         Returns:
-        - stats (dict): Dictionary containing average and max usage stats.
-        '''
-        if not self.monitoring:
-            raise RuntimeError("Monitoring is not running.")
-
-        avg_cpu = (sum(self.cpu_usage_percentages[-n:]) / n
-                   if self.cpu_usage_percentages else 0)
-        avg_mem = (sum(self.memory_usage[-n:]) / n
-                   if self.memory_usage else 0)
-
-        avg_memory_gb = avg_mem / (1024 ** 3)
-        avg_memory_percent = (avg_mem / self.get_memory_limit()) * 100 if self.get_memory_limit() else 0
-
-        max_cpu = max(self.cpu_usage_percentages) if self.cpu_usage_percentages else 0
-        max_mem = max(self.memory_usage) if self.memory_usage else 0
-        max_memory_gb = max_mem / (1024 ** 3)
-        max_memory_percent = (max_mem / self.get_memory_limit()) * 100 if self.get_memory_limit() else 0
-
-        if info_level == 1:
-            return {
-                "average_cpu_usage_percent": round(avg_cpu, 2),
-                "max_cpu_usage_percent": round(max_cpu, 2),
-                "cpu_usage_percentage_list": self.cpu_usage_percentages[-n:],
-                "average_memory_usage_gib": round(avg_memory_gb, 2),
-                "max_memory_usage_gib": round(max_memory_gb, 2),
-                "average_memory_usage_percent": round(avg_memory_percent, 2),
-                "max_memory_usage_percent": round(max_memory_percent, 2),
-                "memory_usage_bytes_list": self.memory_usage[-n:],
-            }
-
-        return {
-            "average_cpu_usage_percent": round(avg_cpu, 2),
-            "max_cpu_usage_percent": round(max_cpu, 2),
-            "average_memory_usage_gib": round(avg_memory_gb, 2),
-            "max_memory_usage_gib": round(max_memory_gb, 2),
-            "average_memory_usage_percent": round(avg_memory_percent, 2),
-            "max_memory_usage_percent": round(max_memory_percent, 2),
-        }
-
-    def stop_monitor(self, info_level=0):
-        '''
-        Stop monitoring and return average and max usage stats.
-        ```
+        - mems (list): Node numbers, empty if unknown (e.g. no cpuset controller).
+        '''
+        content = self._read_file(os.path.join(self.cpuset_path, "cpuset.effective_mems"))
+        if content is None:
+            content = self._read_file(os.path.join(self.cpuset_path, "cpuset.mems"))
+        return parse_cpu_list(content)
+
+    def get_memory_limit(self):
+        '''
+        Get the memory limit in bytes.
+
+        Parameters:
+        - None
+
         Returns:
-            dict = {
-                "average_cpu_usage_percent": float,
-                "max_cpu_usage_percent": float,
-                "average_memory_usage_gib": float,
-                "max_memory_usage_gib": float,
-                "average_memory_usage_percent": float,
-                "max_memory_usage_percent": float,
-                "monitoring_duration_s": float
-            }
-        ```
+        - memory_limit (int): Memory limit in bytes.
+        '''
+        memory_max_path = os.path.join(self.mem_path, "memory.limit_in_bytes")
+        content = self._read_file(memory_max_path)
+        return int(content) if content else None
+
+    def get_swap_limit(self):
+        '''
+        Get the memory+swap limit in bytes.
 
         Parameters:
-        - info_level (int): Level of information to return. Default is 0.
-            - 0: Return average and max usage stats.
-            - 1: Return detailed stats including all recorded values.
+        - None
 
         Returns:
-        - stats (dict): Dictionary containing average and max usage stats.
-        '''
-        if not self.monitoring:
-            raise RuntimeError("Monitoring is not running.")
-
-        self.monitoring = False
-        self.monitor_thread.join()
-        total_time = time.time() - self.start_time
-
-        avg_cpu = (sum(self.cpu_usage_percentages) / len(self.cpu_usage_percentages)
-                   if self.cpu_usage_percentages else 0)
-        avg_mem = (sum(self.memory_usage) / len(self.memory_usage)
-                   if self.memory_usage else 0)
-        avg_memory_gb = avg_mem / (1024 ** 3)
-        mem_limit = self.get_memory_limit()
-        avg_memory_percent = (avg_mem / mem_limit) * 100 if mem_limit else 0
-
-        max_cpu = max(self.cpu_usage_percentages) if self.cpu_usage_percentages else 0
-        max_mem = max(self.memory_usage) if self.memory_usage else 0
-        max_memory_gb = max_mem / (1024 ** 3)
-        max_memory_percent = (max_mem / mem_limit) * 100 if mem_limit else 0
-
-        if info_level == 1:
-            return {
-                "average_cpu_usage_percent": round(avg_cpu, 2),
-                "max_cpu_usage_percent": round(max_cpu, 2),
-                "cpu_usage_percentage_list": self.cpu_usage_percentages,
-                "average_memory_usage_gib": round(avg_memory_gb, 2),
-                "max_memory_usage_gib": round(max_memory_gb, 2),
-                "average_memory_usage_percent": round(avg_memory_percent, 2),
-                "max_memory_usage_percent": round(max_memory_percent, 2),
-                "memory_usage_bytes_list": self.memory_usage,
-                "start_time": self.start_time,
-                "monitoring_duration_s": round(total_time, 2),
-            }
-
-        return {
-            "average_cpu_usage_percent": round(avg_cpu, 2),
-            "max_cpu_usage_percent": round(max_cpu, 2),
-            "average_memory_usage_gib": round(avg_memory_gb, 2),
-            "max_memory_usage_gib": round(max_memory_gb, 2),
-            "average_memory_usage_percent": round(avg_memory_percent, 2),
-            "max_memory_usage_percent": round(max_memory_percent, 2),
-            "monitoring_duration_s": round(total_time, 2),
-        }
+        - memory_swap_limit (int): Memory+swap limit in bytes.
+        '''
+        memory_swap_max_path = os.path.join(self.mem_path, "memory.memsw.limit_in_bytes")
+        content = self._read_file(memory_swap_max_path)
+        return int(content) if content else None
@@ -1,9 +1,68 @@
 import os
 import subprocess
 
+from .mounts import v2_cgroup_path
+
+
+def parse_cpu_list(content):
+    '''
+    Parse a kernel CPU or node list such as "0-3,8,10-11".
+
+    Parameters:
+    - content (str): List in kernel format.
+
+    Returns:
+    - cpus (list): Sorted CPU or node numbers.
+    '''
+    cpus = []
+    for part in (content or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus):
+    '''
+    Format CPU or node numbers as a kernel list, collapsing consecutive numbers into ranges.
+
+    Parameters:
+    - cpus (str or list): Already formatted list, or CPU or node numbers.
+
+    Returns:
+    - content (str): List in kernel format, e.g. "0-3,8".
+    '''
+    if isinstance(cpus, str):
+        return cpus
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def device_number(device):
+    '''
+    Get the "MAJ:MIN" number of a block device.
+
+    Parameters:
+    - device (str): "MAJ:MIN" or path to the block device.
+
+    Returns:
+    - device (str): Device number as "MAJ:MIN".
+    '''
+    if ":" in device and not device.startswith("/"):
+        return device
+    rdev = os.stat(device).st_rdev
+    return f"{os.major(rdev)}:{os.minor(rdev)}"
+
 
 class CGroupManager:
-    def __init__(self, cgroup_name, cgroup_base_path="/sys/fs/cgroup", helper_script=None):
+    def __init__(self, cgroup_name, cgroup_base_path=None, helper_script=None):
         '''
         Initialize the CGroupManager object. If helper_script is not provided,
         the script will use the default method of managing cgroups.
@@ -13,7 +72,8 @@ class CGroupManager:
 
         Parameters:
         - cgroup_name (str): Name of the cgroup. Necessary argument.
-        - cgroup_base_path (str): Base path of the cgroup. Default is /sys/fs/cgroup.
+        - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+            resolves the mount point from /proc/self/mountinfo.
         - helper_script (str): Path to the helper script to manage cgroups. Default is None.
 
         Returns:
@@ -21,7 +81,9 @@ class CGroupManager:
         '''
         self.cgroup_name = cgroup_name
         self.cgroup_base_path = cgroup_base_path
-        self.cgroup_path = os.path.join(self.cgroup_base_path, cgroup_name)
+        self.cgroup_path = v2_cgroup_path(cgroup_name, cgroup_base_path)
+        self.cgroup_root = v2_cgroup_path("", cgroup_base_path)
+        self.freeze_events_path = os.path.join(self.cgroup_path, "cgroup.events")
         self.helper_script = None
 
         if helper_script is not None:
@@ -57,13 +119,63 @@ class CGroupManager:
         except Exception as e:
             raise Exception(f"Failed to run command: {e}")
 
-    def create_cgroup(self):
+    def _read_file(self, filename):
+        '''
+        Internal method to read an interface file of the cgroup.
+
+        Parameters:
+        - filename (str): Name of the file, e.g. memory.high.
+
+        Returns:
+        - content (str): Content of the file, None if it does not exist.
+        '''
+        try:
+            with open(os.path.join(self.cgroup_path, filename), "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, filename, data, sudo, path=None):
+        '''
+        Internal method to write an interface file of the cgroup.
+
+        Parameters:
+        - filename (str): Name of the file, e.g. memory.high.
+        - data (str): Data to write.
+        - sudo (bool): Whether to use sudo to run the command.
+        - path (str): Directory of the file. Default is None, which uses the cgroup's directory.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        file_path = os.path.join(path or self.cgroup_path, filename)
+        runner_cmd = f"echo \"{data}\" > {file_path}"
+        helper_cmd = [self.helper_script, "write", file_path, str(data)]
+
+        return self._run_command(runner_cmd, helper_cmd, sudo)
+
+    def _read_limit(self, filename):
+        '''
+        Internal method to read a single value file where "max" means no limit.
+
+        Parameters:
+        - filename (str): Name of the file, e.g. memory.high.
+
+        Returns:
+        - value (int or None): Value of the file, None if it is "max" or does not exist.
         '''
-        If non-existant, create cgroup and take ownership.
+        content = self._read_file(filename)
+        return int(content) if content and content != "max" else None
+
+    def create_cgroup(self, controllers=None, sudo=False):
+        '''
+        If non-existant, create cgroup (and missing parents) and take ownership.
         Note, this command requires sudo privileges.
 
         Parameters:
-        - None
+        - controllers (list): Controllers to enable for the cgroup, e.g. ["cpu", "memory", "cpuset"].
+            They are added to cgroup.subtree_control of every ancestor. Default is None.
+        - sudo (bool): Whether to use sudo to enable the controllers. Default is False.
 
         Returns:
         - returncode (int): Return whether the command was successful.
@@ -71,7 +183,7 @@ class CGroupManager:
         # Create the cgroup
         if not os.path.exists(self.cgroup_path):
             if self.helper_script is None:
-                proc = subprocess.run(["sudo", "mkdir", self.cgroup_path], check=True)
+                proc = subprocess.run(["sudo", "mkdir", "-p", self.cgroup_path], check=True)
             else:
                 proc = subprocess.run(["sudo", self.helper_script, "create", self.cgroup_path], check=True)
 
@@ -87,21 +199,62 @@ class CGroupManager:
         if proc.returncode != 0:
             raise Exception(f"Failed to taking ownership of cgroup with command: {proc.args}")
 
+        if controllers:
+            self.enable_controllers(controllers, sudo=sudo)
+
         return proc.returncode
 
+    def enable_controllers(self, controllers, subtree=False, sudo=False):
+        '''
+        Make controllers available to the cgroup by adding them to cgroup.subtree_control
+        of each of its ancestors, starting from the root.
+
+        Parameters:
+        - controllers (list): Controllers to enable, e.g. ["cpu", "memory", "io", "pids"].
+        - subtree (bool): Also enable them for the cgroup's own children. Default is False.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        data = " ".join(f"+{controller}" for controller in controllers)
+        parts = [part for part in self.cgroup_name.split("/") if part]
+        if not subtree:
+            parts = parts[:-1]
+
+        path = self.cgroup_root
+        returncode = self._write_file("cgroup.subtree_control", data, sudo, path=path)
+        for part in parts:
+            path = os.path.join(path, part)
+            returncode = self._write_file("cgroup.subtree_control", data, sudo, path=path)
+        return returncode
+
+    def get_enabled_controllers(self):
+        '''
+        Get the controllers available to the cgroup.
+
+        Parameters:
+        - None
+
+        Returns:
+        - controllers (list): Controller names from cgroup.controllers.
+        '''
+        content = self._read_file("cgroup.controllers")
+        return content.split() if content else []
+
     def set_cpu_limit(self, quota, period=100000, sudo=False):
         '''
         Set the CPU limits. Sets the CPU using quota*period.
 
         Parameters:
-        - quota (int): CPU quota in number of cores.
+        - quota (float): CPU quota in number of cores.
         - period (int): CPU period in microseconds. Default is 100000.
         - sudo (bool): Whether to use sudo to run the command. Default is False.
 
         Returns:
         - returncode (int): Return whether the command was successful.
         '''
-        cpu_max_data = f"{quota * period} {period}"
+        cpu_max_data = f"{int(quota * period)} {period}"
         cpu_max_path = os.path.join(self.cgroup_path, "cpu.max")
         runner_cmd = f"echo \"{cpu_max_data}\" > {cpu_max_path}"
         helper_cmd = [self.helper_script, "write", cpu_max_path, str(cpu_max_data)]
@@ -143,6 +296,344 @@ class CGroupManager:
 
         return self._run_command(runner_cmd, helper_cmd, sudo)
 
+    def set_memory_high(self, limit, sudo=False):
+        '''
+        Set the memory throttling limit in bytes. Above it the cgroup is put under
+        heavy reclaim instead of being OOM killed.
+
+        Parameters:
+        - limit (int or str): Memory high limit in bytes, or "max" for no limit.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("memory.high", limit, sudo)
+
+    def get_memory_high(self):
+        '''
+        Get the memory throttling limit in bytes.
+
+        Parameters:
+        - None
+
+        Returns:
+        - limit (int or None): Memory high limit in bytes, None if there is no limit.
+        '''
+        return self._read_limit("memory.high")
+
+    def set_memory_low(self, limit, sudo=False):
+        '''
+        Set the best-effort memory protection in bytes.
+
+        Parameters:
+        - limit (int): Memory below this is only reclaimed if unprotected memory is exhausted.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("memory.low", limit, sudo)
+
+    def get_memory_low(self):
+        '''
+        Get the best-effort memory protection in bytes.
+
+        Parameters:
+        - None
+
+        Returns:
+        - limit (int or None): Memory low in bytes, None if set to "max".
+        '''
+        return self._read_limit("memory.low")
+
+    def set_memory_min(self, limit, sudo=False):
+        '''
+        Set the hard memory protection in bytes.
+
+        Parameters:
+        - limit (int): Memory below this is never reclaimed.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("memory.min", limit, sudo)
+
+    def get_memory_min(self):
+        '''
+        Get the hard memory protection in bytes.
+
+        Parameters:
+        - None
+
+        Returns:
+        - limit (int or None): Memory min in bytes, None if set to "max".
+        '''
+        return self._read_limit("memory.min")
+
+    def reclaim(self, size, swappiness=None, sudo=False):
+        '''
+        Ask the kernel to reclaim memory from the cgroup (memory.reclaim, Linux 5.19+),
+        e.g. to drop the page cache of an idle container before the host runs short.
+        The kernel may reclaim less than asked, the return value is what memory.current
+        actually dropped by, which can also include memory freed by the cgroup itself.
+
+        Parameters:
+        - size (int): Number of bytes to reclaim.
+        - swappiness (int): Swappiness to reclaim with, 0 to only drop page cache (Linux 6.7+).
+            Default is None, which uses the cgroup's swappiness.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - freed (int): Bytes by which memory usage went down.
+        '''
+        if not os.path.exists(os.path.join(self.cgroup_path, "memory.reclaim")):
+            raise RuntimeError("memory.reclaim is not available, it needs Linux 5.19+ and the memory controller.")
+        data = str(int(size)) if swappiness is None else f"{int(size)} swappiness={swappiness}"
+        before = int(self._read_file("memory.current") or 0)
+        try:
+            self._write_file("memory.reclaim", data, sudo)
+        except Exception:
+            # The write fails with EAGAIN when less than size could be reclaimed,
+            # only report an error if nothing was
+            freed = before - int(self._read_file("memory.current") or 0)
+            if freed <= 0:
+                raise
+            return freed
+        return before - int(self._read_file("memory.current") or 0)
+
+    def set_cpu_weight(self, weight, sudo=False):
+        '''
+        Set the proportional CPU weight, relative to sibling cgroups.
+
+        Parameters:
+        - weight (int): Weight between 1 and 10000. The kernel default is 100.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        if not 1 <= weight <= 10000:
+            raise ValueError("CPU weight must be between 1 and 10000.")
+        return self._write_file("cpu.weight", int(weight), sudo)
+
+    def get_cpu_weight(self):
+        '''
+        Get the proportional CPU weight.
+
+        Parameters:
+        - None
+
+        Returns:
+        - weight (int or None): CPU weight, None if the cpu controller is not enabled.
+        '''
+        return self._read_limit("cpu.weight")
+
+    def set_cpuset_cpus(self, cpus, sudo=False):
+        '''
+        Pin the cgroup to a set of CPUs. Requires the cpuset controller.
+
+        Parameters:
+        - cpus (str or list): CPU list, either in kernel format ("0-3,8") or as a list of CPU numbers.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("cpuset.cpus", format_cpu_list(cpus), sudo)
+
+    def get_cpuset_cpus(self, effective=False):
+        '''
+        Get the CPUs the cgroup is pinned to.
+
+        Parameters:
+        - effective (bool): Read the CPUs actually granted (cpuset.cpus.effective). Default is False.
+
+        Returns:
+        - cpus (list): CPU numbers, empty if not restricted.
+        '''
+        return parse_cpu_list(self._read_file("cpuset.cpus.effective" if effective else "cpuset.cpus"))
+
+    def set_cpuset_mems(self, mems, sudo=False):
+        '''
+        Restrict the cgroup to a set of NUMA memory nodes. Requires the cpuset controller.
+
+        Parameters:
+        - mems (str or list): Node list, either in kernel format ("0-1") or as a list of node numbers.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("cpuset.mems", format_cpu_list(mems), sudo)
+
+    def get_cpuset_mems(self, effective=False):
+        '''
+        Get the NUMA memory nodes the cgroup is restricted to.
+
+        Parameters:
+        - effective (bool): Read the nodes actually granted (cpuset.mems.effective). Default is False.
+
+        Returns:
+        - mems (list): Node numbers, empty if not restricted.
+        '''
+        return parse_cpu_list(self._read_file("cpuset.mems.effective" if effective else "cpuset.mems"))
+
+    def set_io_max(self, device, rbps=None, wbps=None, riops=None, wiops=None, sudo=False):
+        '''
+        Set I/O bandwidth and IOPS limits for a block device. Requires the io controller.
+        Limits left as None are not changed, "max" removes a limit.
+
+        Parameters:
+        - device (str): "MAJ:MIN" or path to the block device, e.g. /dev/sda.
+        - rbps (int or str): Read bytes per second. Default is None.
+        - wbps (int or str): Write bytes per second. Default is None.
+        - riops (int or str): Read operations per second. Default is None.
+        - wiops (int or str): Write operations per second. Default is None.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        limits = {"rbps": rbps, "wbps": wbps, "riops": riops, "wiops": wiops}
+        fields = [f"{key}={value}" for key, value in limits.items() if value is not None]
+        if not fields:
+            raise ValueError("At least one of rbps, wbps, riops or wiops is needed.")
+        return self._write_file("io.max", f"{device_number(device)} {' '.join(fields)}", sudo)
+
+    def get_io_max(self):
+        '''
+        Get the I/O limits of every device that has one.
+
+        Parameters:
+        - None
+
+        Returns:
+        - limits (dict): "MAJ:MIN" to a dict of rbps/wbps/riops/wiops, None where there is no limit.
+        '''
+        limits = {}
+        content = self._read_file("io.max")
+        for line in (content or "").splitlines():
+            device, *fields = line.split()
+            limits[device] = {
+                key: (None if value == "max" else int(value))
+                for key, value in (field.split("=", 1) for field in fields)
+            }
+        return limits
+
+    def set_io_weight(self, weight, device=None, sudo=False):
+        '''
+        Set the proportional I/O weight, for all devices or for one device.
+
+        Parameters:
+        - weight (int): Weight between 1 and 10000. The kernel default is 100.
+        - device (str): "MAJ:MIN" or path to the block device. Default is None (all devices).
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        if not 1 <= weight <= 10000:
+            raise ValueError("I/O weight must be between 1 and 10000.")
+        target = "default" if device is None else device_number(device)
+        return self._write_file("io.weight", f"{target} {int(weight)}", sudo)
+
+    def get_io_weight(self):
+        '''
+        Get the proportional I/O weights.
+
+        Parameters:
+        - None
+
+        Returns:
+        - weights (dict): "default" or "MAJ:MIN" to weight, empty if the io controller is not enabled.
+        '''
+        weights = {}
+        content = self._read_file("io.weight")
+        for line in (content or "").splitlines():
+            target, weight = line.split()
+            weights[target] = int(weight)
+        return weights
+
+    def set_pids_max(self, limit, sudo=False):
+        '''
+        Set the maximum number of processes and threads in the cgroup. Requires the pids controller.
+
+        Parameters:
+        - limit (int or str): Maximum number of tasks, or "max" for no limit.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - returncode (int): Return whether the command was successful.
+        '''
+        return self._write_file("pids.max", limit, sudo)
+
+    def get_pids_max(self):
+        '''
+        Get the maximum number of processes and threads in the cgroup.
+
+        Parameters:
+        - None
+
+        Returns:
+        - limit (int or None): Maximum number of tasks, None if there is no limit.
+        '''
+        return self._read_limit("pids.max")
+
+    def _request_frozen(self, frozen, sudo=False):
+        '''
+        Internal method to ask the kernel to freeze or thaw the cgroup, without waiting.
+        '''
+        return self._write_file("cgroup.freeze", 1 if frozen else 0, sudo)
+
+    def is_frozen(self):
+        '''
+        Check whether the cgroup is frozen, i.e. all of its processes are stopped (cgroup.events).
+
+        Parameters:
+        - None
+
+        Returns:
+        - frozen (bool): True if the cgroup is frozen.
+        '''
+        for line in (self._read_file("cgroup.events") or "").splitlines():
+            key, _, value = line.partition(" ")
+            if key == "frozen":
+                return value.strip() == "1"
+        return False
+
+    def freeze(self, timeout=5.0, sudo=False):
+        '''
+        Freeze the cgroup (cgroup.freeze) and wait until all of its processes are stopped.
+        The wait blocks on cgroup.events notifications rather than polling.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is 5, 0 to not wait.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - frozen (bool): Whether the cgroup was frozen in time, always True if not waiting.
+        '''
+        from .freezer import freeze_all
+
+        return not freeze_all([self], timeout, sudo)
+
+    def thaw(self, timeout=5.0, sudo=False):
+        '''
+        Thaw the cgroup and wait until it is no longer frozen.
+
+        Parameters:
+        - timeout (float): Maximum number of seconds to wait. Default is 5, 0 to not wait.
+        - sudo (bool): Whether to use sudo to run the command.
+
+        Returns:
+        - thawed (bool): Whether the cgroup was thawed in time, always True if not waiting.
+        '''
+        from .freezer import thaw_all
+
+        return not thaw_all([self], timeout, sudo)
+
     def add_process(self, pid, sudo=False):
         '''
         Add a process to the cgroup.
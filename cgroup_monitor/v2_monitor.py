@@ -1,45 +1,74 @@
-import time
 import os
-import threading
 
+from .base_monitor import BaseCGroupMonitor, RawCounters
+from .mounts import pid_cgroup_names, v2_cgroup_path
+from .v2_manager import parse_cpu_list
 
-class CGroupMonitor:
-    def __init__(self, cgroup_name="", cgroup_base_path="/sys/fs/cgroup"):
+
+class CGroupMonitor(BaseCGroupMonitor):
+    def __init__(self, cgroup_name="", cgroup_base_path=None):
         '''
         Initialize the CGroupMonitor object.
 
         Parameters:
         - cgroup_name (str): Name of the cgroup. Default is an empty string.
-        - cgroup_base_path (str): Base path of the cgroup. Default is /sys/fs/cgroup.
+        - cgroup_base_path (str): Base path of the cgroup. Default is None, which
+            resolves the mount point from /proc/self/mountinfo.
 
         Returns:
         - None
         '''
+        super().__init__()
         self.cgroup_name = cgroup_name
         self.cgroup_base_path = cgroup_base_path
-        self.cgroup_path = os.path.join(cgroup_base_path, cgroup_name)
+        self.cgroup_path = v2_cgroup_path(cgroup_name, cgroup_base_path)
+        # Files of get_raw_counters(), joined once as spans read them on every entry and exit
+        self._raw_paths = (
+            os.path.join(self.cgroup_path, "cpu.stat"),
+            os.path.join(self.cgroup_path, "memory.current"),
+            os.path.join(self.cgroup_path, "memory.peak"),
+        )
 
-        self.monitoring = False
-        self.cpu_usage_percentages = []
-        self.memory_usage = []
-        self.monitor_thread = None
-        self.start_time = None
+    @classmethod
+    def for_pid(cls, pid):
+        '''
+        Create a monitor for the cgroup a process belongs to, read from /proc/<pid>/cgroup.
 
-    def _read_file(self, path):
+        Parameters:
+        - pid (int): Process ID.
+
+        Returns:
+        - monitor (CGroupMonitor): Monitor for the cgroup of the process.
         '''
-        Internal method to read the contents of a file.
+        names = pid_cgroup_names(pid)
+        if "" not in names:
+            raise RuntimeError(f"Process {pid} is not in a cgroup v2 hierarchy.")
+        return cls(names[""])
+
+    @classmethod
+    def for_self(cls):
+        '''
+        Create a monitor for the cgroup of the current process, e.g. the container it runs in.
 
         Parameters:
-        - path (str): Path to the file.
+        - None
 
         Returns:
-        - content (str): Content of the file.
+        - monitor (CGroupMonitor): Monitor for the cgroup of the current process.
         '''
-        try:
-            with open(path, "r") as f:
-                return f.read().strip()
-        except FileNotFoundError:
-            return None
+        return cls.for_pid(os.getpid())
+
+    def exists(self):
+        '''
+        Check whether the cgroup still exists.
+
+        Parameters:
+        - None
+
+        Returns:
+        - exists (bool): True if the cgroup directory exists.
+        '''
+        return os.path.isdir(self.cgroup_path)
 
     def get_cpu_usage_us(self):
         '''
@@ -59,6 +88,36 @@ class CGroupMonitor:
                     return int(line.split()[1])
         return 0
 
+    def get_cpu_usage_percpu(self):
+        '''
+        Get the cumulative CPU usage split into user and system time.
+        cgroup v2 has no per-CPU usage counters, so a single entry covering all CPUs is returned.
+
+        Parameters:
+        - None
+
+        Returns:
+        - user_usec (list): User time in microseconds, one entry.
+        - system_usec (list): System time in microseconds, one entry.
+        '''
+        stat = self._read_keyed_file(os.path.join(self.cgroup_path, "cpu.stat"))
+        return [stat.get("user_usec", 0)], [stat.get("system_usec", 0)]
+
+    def get_cpu_throttling(self):
+        '''
+        Get the cumulative CFS throttling counters.
+
+        Parameters:
+        - None
+
+        Returns:
+        - nr_periods (int): Number of enforcement periods that have elapsed.
+        - nr_throttled (int): Number of periods in which the cgroup was throttled.
+        - throttled_usec (int): Total time the cgroup was throttled, in microseconds.
+        '''
+        stat = self._read_keyed_file(os.path.join(self.cgroup_path, "cpu.stat"))
+        return stat.get("nr_periods", 0), stat.get("nr_throttled", 0), stat.get("throttled_usec", 0)
+
     def get_cpu_limit(self):
         '''
         Get the CPU quota and period.
@@ -94,218 +153,179 @@ class CGroupMonitor:
         content = self._read_file(memory_current_path)
         return int(content) if content else 0
 
-    def get_memory_limit(self):
+    def get_memory_peak(self):
         '''
-        Get the memory limit in bytes.
+        Get the highest memory usage recorded for the cgroup, in bytes (memory.peak, Linux 5.19+).
 
         Parameters:
         - None
 
         Returns:
-        - memory_limit (int): Memory limit in bytes.
+        - memory_peak (int): Peak memory usage in bytes, 0 if not available.
         '''
-        memory_max_path = os.path.join(self.cgroup_path, "memory.max")
-        content = self._read_file(memory_max_path)
+        memory_peak_path = os.path.join(self.cgroup_path, "memory.peak")
+        content = self._read_file(memory_peak_path)
         return int(content) if content else 0
 
-    def get_swap_limit(self):
+    def get_raw_counters(self):
         '''
-        Get the memory+swap limit in bytes.
+        Read the cumulative CPU, memory and throttling counters with as few reads as possible.
 
         Parameters:
         - None
 
         Returns:
-        - memory_swap_limit (int): Memory+Swap limit in bytes.
+        - counters (RawCounters): Current counter values.
         '''
-        swap_max_path = os.path.join(self.cgroup_path, "memory.swap.max")
-        content = self._read_file(swap_max_path)
-        return int(content) if content else 0
+        cpu_stat_path, memory_path, peak_path = self._raw_paths
+        cpu_stat = {}
+        for line in (self._pread(cpu_stat_path) or "").splitlines():
+            key, _, value = line.partition(" ")
+            cpu_stat[key] = value
+        memory = self._pread(memory_path)
+        peak = self._pread(peak_path)
+        return RawCounters(
+            int(cpu_stat.get("usage_usec", 0)),
+            int(memory) if memory else 0,
+            int(peak) if peak else 0,
+            int(cpu_stat.get("nr_throttled", 0)),
+            int(cpu_stat.get("throttled_usec", 0)),
+        )
 
-    def _monitor(self, interval):
+    def get_raw_memory_usage(self):
         '''
-        Internal method to monitor CPU and memory usage.
+        Read the current memory usage in bytes through a cached file descriptor.
 
         Parameters:
-        - interval (int): Monitoring interval in seconds.
+        - None
 
         Returns:
-        - None
+        - memory_usage (int): Memory usage in bytes.
         '''
-        previous_cpu_usage = self.get_cpu_usage_us()
-        while self.monitoring:
-            time.sleep(interval)
+        memory = self._pread(self._raw_paths[1])
+        return int(memory) if memory else 0
 
-            # CPU percentage calculation
-            current_cpu_usage = self.get_cpu_usage_us()
-            delta_cpu_usage = current_cpu_usage - previous_cpu_usage
-            previous_cpu_usage = current_cpu_usage
-
-            quota, period = self.get_cpu_limit()
-            num_cores = quota / period if quota else os.cpu_count()
-            total_cpu_time_available = num_cores * (interval * 1000000)
-            cpu_usage_percentage = (delta_cpu_usage / total_cpu_time_available) * 100
+    def get_memory_pressure(self):
+        '''
+        Get the cumulative time tasks of the cgroup stalled on memory (memory.pressure).
 
-            # Store results
-            self.cpu_usage_percentages.append(cpu_usage_percentage)
-            self.memory_usage.append(self.get_memory_usage())
+        Parameters:
+        - None
 
-    def start_monitor(self, interval=1.0):
+        Returns:
+        - stall_us (tuple): ("some", "full") stall totals in microseconds, (0, 0) without PSI.
         '''
-        Start monitoring CPU and memory usage.
+        content = self._read_file(os.path.join(self.cgroup_path, "memory.pressure"))
+        totals = {}
+        for line in (content or "").splitlines():
+            kind, _, fields = line.partition(" ")
+            for field in fields.split():
+                if field.startswith("total="):
+                    totals[kind] = int(field[6:])
+        return totals.get("some", 0), totals.get("full", 0)
+
+    def get_memory_refaults(self):
+        '''
+        Get the cumulative number of refaults, evicted pages that had to be read back in (memory.stat).
 
         Parameters:
-        - interval (float): Monitoring interval in seconds. Default is 1 second.
-            Uses time.sleep() and can be float value for higher precision.
+        - None
 
         Returns:
-        - None
+        - refaults (int): Anonymous and file refaults, or workingset_refault on kernels before 5.9.
         '''
-        if self.monitoring:
-            raise RuntimeError("Monitoring is already running.")
+        stat = self._read_keyed_file(os.path.join(self.cgroup_path, "memory.stat"))
+        if "workingset_refault_file" in stat:
+            return stat["workingset_refault_file"] + stat.get("workingset_refault_anon", 0)
+        return stat.get("workingset_refault", 0)
 
-        self.monitoring = True
-        self.cpu_usage_percentages = []
-        self.memory_usage = []
-        self.start_time = time.time()
-        self.monitor_thread = threading.Thread(
-            target=self._monitor, args=(interval,), daemon=True
-        )
-        self.monitor_thread.start()
+    def get_pids_counters(self):
+        '''
+        Read the number of tasks and how often forks failed on the limit, in one go.
 
-    def get_last_n_stats(self, n=1, info_level=0):
+        Parameters:
+        - None
+
+        Returns:
+        - counters (tuple): (pids.current, "max" count of pids.events), None if the
+            pids controller is not enabled for the cgroup.
+        '''
+        current = self._pread(os.path.join(self.cgroup_path, "pids.current"))
+        if current is None:
+            return None
+        events = self._pread(os.path.join(self.cgroup_path, "pids.events")) or ""
+        limit_hits = 0
+        for line in events.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "max":
+                limit_hits = int(value)
+        return int(current), limit_hits
+
+    def get_pids_limit(self):
         '''
-        Get the last n stats recorded.
+        Get the maximum number of tasks (pids.max).
 
         Parameters:
-        - n (int): Number of stats to retrieve. Default is 1.
-        - info_level (int): Level of information to return. Default is 0.
-            - 0: Return average and max usage stats.
-            - 1: Return detailed stats including all recorded values.
+        - None
 
         Returns:
-        - stats (dict): Dictionary containing average and max usage stats.
+        - pids_limit (int): Maximum number of processes and threads, 0 if there is no limit.
         '''
-        if not self.monitoring:
-            raise RuntimeError("Monitoring is not running.")
+        content = self._read_file(os.path.join(self.cgroup_path, "pids.max"))
+        return int(content) if content and content != "max" else 0
 
-        avg_cpu = (
-            sum(self.cpu_usage_percentages[-n:]) / n
-            if self.cpu_usage_percentages else 0
-        )
-        avg_memory = (
-            sum(self.memory_usage[-n:]) / n
-            if self.memory_usage else 0
-        )
-        avg_memory_gb = avg_memory / (1024 ** 3)
-        avg_memory_percent = (
-            (avg_memory / self.get_memory_limit()) * 100
-            if self.get_memory_limit() else 0
-        )
+    def get_memory_numa_stat(self):
+        '''
+        Get the anonymous and file memory of the cgroup on each NUMA node.
 
-        max_cpu = max(self.cpu_usage_percentages[-n:], default=0)
-        max_memory = max(self.memory_usage[-n:], default=0)
-        max_memory_gb = max_memory / (1024 ** 3)
-        max_memory_percent = (
-            (max_memory / self.get_memory_limit()) * 100
-            if self.get_memory_limit() else 0
-        )
+        Parameters:
+        - None
 
-        if info_level == 1:
-            return {
-                "average_cpu_usage_percent": round(avg_cpu, 2),
-                "max_cpu_usage_percent": round(max_cpu, 2),
-                "cpu_usage_percentage_list": self.cpu_usage_percentages[-n:],
-                "average_memory_usage_gib": round(avg_memory_gb, 2),
-                "max_memory_usage_gib": round(max_memory_gb, 2),
-                "average_memory_usage_percent": round(avg_memory_percent, 2),
-                "max_memory_usage_percent": round(max_memory_percent, 2),
-                "memory_usage_bytes_list": self.memory_usage[-n:],
-            }
-
-        return {
-            "average_cpu_usage_percent": round(avg_cpu, 2),
-            "max_cpu_usage_percent": round(max_cpu, 2),
-            "average_memory_usage_gib": round(avg_memory_gb, 2),
-            "max_memory_usage_gib": round(max_memory_gb, 2),
-            "average_memory_usage_percent": round(avg_memory_percent, 2),
-            "max_memory_usage_percent": round(max_memory_percent, 2),
-        }
-
-    def stop_monitor(self, info_level=0):
-        '''
-        Stop monitoring and return average and max usage stats.
-        ```
         Returns:
-            dict = {
-                "average_cpu_usage_percent": float,
-                "max_cpu_usage_percent": float,
-                "average_memory_usage_gib": float,
-                "max_memory_usage_gib": float,
-                "average_memory_usage_percent": float,
-                "max_memory_usage_percent": float,
-                "monitoring_duration_s": float
-            }
-        ```
+        - numa_stat (tuple): (nodes, anon_bytes, file_bytes), the last two with one entry per
+            node, None if memory.numa_stat does not exist.
+        '''
+        content = self._pread(os.path.join(self.cgroup_path, "memory.numa_stat"))
+        if content is None:
+            return None
+        return self._parse_numa_stat(content, (("anon ", "file "),))
+
+    def get_cpuset_mems(self):
+        '''
+        Get the NUMA nodes the cgroup may allocate memory from.
 
         Parameters:
-        - info_level (int): Level of information to return. Default is 0.
-            - 0: Return average and max usage stats.
-            - 1: Return detailed stats including all recorded values.
+        - None
 
         Returns:
-        - stats (dict): Dictionary containing average and max usage stats.
+        - mems (list): Node numbers, empty if unknown (e.g. no cpuset controller).
         '''
-        if not self.monitoring:
-            raise RuntimeError("Monitoring is not running.")
+        return parse_cpu_list(self._read_file(os.path.join(self.cgroup_path, "cpuset.mems.effective")))
 
-        self.monitoring = False
-        self.monitor_thread.join()
-        self.monitor_thread = None
-        total_time = time.time() - self.start_time
+    def get_memory_limit(self):
+        '''
+        Get the memory limit in bytes.
 
-        avg_cpu = (
-            sum(self.cpu_usage_percentages) / len(self.cpu_usage_percentages)
-            if self.cpu_usage_percentages else 0
-        )
-        avg_memory = (
-            sum(self.memory_usage) / len(self.memory_usage)
-            if self.memory_usage else 0
-        )
-        avg_memory_gb = avg_memory / (1024 ** 3)
-        avg_memory_percent = (
-            (avg_memory / self.get_memory_limit()) * 100
-            if self.get_memory_limit() else 0
-        )
+        Parameters:
+        - None
 
-        max_cpu = max(self.cpu_usage_percentages, default=0)
-        max_memory = max(self.memory_usage, default=0)
-        max_memory_gb = max_memory / (1024 ** 3)
-        max_memory_percent = (
-            (max_memory / self.get_memory_limit()) * 100
-            if self.get_memory_limit() else 0
-        )
+        Returns:
+        - memory_limit (int): Memory limit in bytes, 0 if there is no limit.
+        '''
+        memory_max_path = os.path.join(self.cgroup_path, "memory.max")
+        content = self._read_file(memory_max_path)
+        return int(content) if content and content != "max" else 0
+
+    def get_swap_limit(self):
+        '''
+        Get the memory+swap limit in bytes.
+
+        Parameters:
+        - None
 
-        if info_level == 1:
-            return {
-                "average_cpu_usage_percent": round(avg_cpu, 2),
-                "max_cpu_usage_percent": round(max_cpu, 2),
-                "cpu_usage_percentage_list": self.cpu_usage_percentages,
-                "average_memory_usage_gib": round(avg_memory_gb, 2),
-                "max_memory_usage_gib": round(max_memory_gb, 2),
-                "average_memory_usage_percent": round(avg_memory_percent, 2),
-                "max_memory_usage_percent": round(max_memory_percent, 2),
-                "memory_usage_bytes_list": self.memory_usage,
-                "start_time": self.start_time,
-                "monitoring_duration_s": round(total_time, 2),
-            }
-
-        return {
-            "average_cpu_usage_percent": round(avg_cpu, 2),
-            "max_cpu_usage_percent": round(max_cpu, 2),
-            "average_memory_usage_gib": round(avg_memory_gb, 2),
-            "max_memory_usage_gib": round(max_memory_gb, 2),
-            "average_memory_usage_percent": round(avg_memory_percent, 2),
-            "max_memory_usage_percent": round(max_memory_percent, 2),
-            "monitoring_duration_s": round(total_time, 2),
-        }
+        Returns:
+        - memory_swap_limit (int): Memory+Swap limit in bytes, 0 if there is no limit.
+        '''
+        swap_max_path = os.path.join(self.cgroup_path, "memory.swap.max")
+        content = self._read_file(swap_max_path)
+        return int(content) if content and content != "max" else 0
@@ -0,0 +1,306 @@
+import errno
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import namedtuple
+
+from . import CGroupMonitor
+from .inotify import (
+    IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_IGNORED, IN_ISDIR, IN_MODIFY, IN_MOVED_FROM, IN_MOVED_TO,
+    IN_ONLYDIR, IN_Q_OVERFLOW, Inotify,
+)
+from .mounts import detect_version, v1_controller_path, v2_cgroup_path
+from .summary import Summary
+
+
+logger = logging.getLogger(__name__)
+
+# A cgroup that was removed, with the summary of everything sampled while it existed
+FinishedCGroup = namedtuple("FinishedCGroup", ["name", "created_time", "removed_time", "summary"])
+
+
+class _Tracked:
+    def __init__(self, monitor):
+        '''
+        Internal state of one watched cgroup.
+        '''
+        self.monitor = monitor
+        self.created_time = time.time()
+        self.summary = None
+        self.num_cores = None
+        self.memory_limit = None
+
+    def read_limits(self):
+        '''
+        Read the limits while the cgroup still exists, summaries are computed against them.
+        The files of a cgroup being removed read as no limit, so only a limit that is set
+        replaces the one read before.
+        '''
+        try:
+            quota, period = self.monitor.get_cpu_limit()
+            memory_limit = self.monitor.get_memory_limit()
+        except (OSError, ValueError):
+            return
+        if quota and quota > 0 and period:
+            self.num_cores = quota / period
+        if memory_limit:
+            self.memory_limit = memory_limit
+
+    def fold(self, final_sample=False):
+        '''
+        Stop sampling and add the samples to the summary of the cgroup.
+        '''
+        monitor = self.monitor
+        monitor.stop_sampling(final_sample)
+        run = Summary.from_samples(
+            monitor.get_cpu_usage_percentages(num_cores=self.num_cores or os.cpu_count()),
+            monitor.memory_usage,
+            monitor.get_sample_intervals(),
+            self.memory_limit,
+            monitor.start_time,
+        )
+        self.summary = run if self.summary is None else self.summary.merge(run)
+
+
+class CGroupWatcher:
+    def __init__(self, cgroup_name="", cgroup_base_path=None, version=None, interval=1.0, max_depth=None,
+                 on_created=None, on_removed=None):
+        '''
+        Watch a cgroup subtree (e.g. system.slice or kubepods) with inotify and attach a
+        CGroupMonitor to every cgroup created under it, then summarise each cgroup when it
+        is removed. The tree is only walked once at start (and after an inotify queue
+        overflow), new cgroups are seen as soon as they are created.
+        On cgroup v2 the watcher also follows cgroup.events, so it takes a last sample
+        when a cgroup's last process exits, just before the cgroup is removed.
+
+        Parameters:
+        - cgroup_name (str): Cgroup whose descendants are watched. Default is an empty string (the root).
+        - cgroup_base_path (str): Base path of the cgroups. Default is None, which
+            resolves the mount point from /proc/self/mountinfo.
+        - version (int): cgroup version, 1 or 2. Default is None, which detects it.
+        - interval (float): Sampling interval of the monitors in seconds. Default is 1 second.
+        - max_depth (int): How many levels below cgroup_name to watch. Default is None (all).
+        - on_created (callable): Called with (name, monitor) when a monitor is attached. Default is None.
+        - on_removed (callable): Called with a FinishedCGroup when a cgroup is removed.
+            Default is None, which puts them on the finished queue instead.
+
+        Returns:
+        - None
+        '''
+        self.cgroup_name = cgroup_name
+        self.cgroup_base_path = cgroup_base_path
+        self.version = version or detect_version(cgroup_base_path)
+        self.interval = interval
+        self.max_depth = max_depth
+        self.on_created = on_created
+        self.on_removed = on_removed
+        self.finished = queue.Queue()
+
+        if self.version == 2:
+            self.root = v2_cgroup_path(cgroup_name, cgroup_base_path)
+        else:
+            self.root = v1_controller_path("cpuacct", cgroup_name, cgroup_base_path)
+        self.cgroups = {}
+        self._watches = {}
+        self._inotify = None
+        self._thread = None
+        self._wakeup = None
+        self._lock = threading.Lock()
+
+    @property
+    def monitors(self):
+        '''
+        Monitors of the cgroups that currently exist, by name.
+        '''
+        return {name: tracked.monitor for name, tracked in self.cgroups.items()}
+
+    def start(self):
+        '''
+        Attach monitors to the existing cgroups and start watching for new ones.
+
+        Parameters:
+        - None
+
+        Returns:
+        - None
+        '''
+        if self._thread is not None:
+            raise RuntimeError("The watcher is already running.")
+        self._inotify = Inotify()
+        self._wakeup = os.pipe()
+        with self._lock:
+            self._add_tree("", 0)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Stop watching and summarise the cgroups that still exist, as if they were removed.
+
+        Parameters:
+        - None
+
+        Returns:
+        - finished (list): FinishedCGroup of the cgroups that were still being monitored.
+        '''
+        if self._thread is None:
+            raise RuntimeError("The watcher is not running.")
+        os.write(self._wakeup[1], b"x")
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            finished = [self._remove(name, notify=False) for name in sorted(self.cgroups, reverse=True)]
+        self._inotify.close()
+        for fd in self._wakeup:
+            os.close(fd)
+        self._inotify = self._wakeup = None
+        self._watches = {}
+        return finished
+
+    def _add_watch(self, path, mask):
+        '''
+        Internal method to add an inotify watch, returns the watch descriptor or None.
+        '''
+        try:
+            return self._inotify.add_watch(path, mask)
+        except OSError as e:
+            if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                logger.warning("%s", e)
+            return None
+
+    def _add_tree(self, name, depth):
+        '''
+        Internal method to watch a cgroup directory, attach a monitor to it and walk its
+        existing children, which may have been created before the watch was in place.
+        '''
+        if self.max_depth is not None and depth > self.max_depth:
+            return
+        path = os.path.join(self.root, name)
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE_SELF | IN_ONLYDIR
+        wd = self._add_watch(path, mask)
+        if wd is None:
+            return
+        self._watches[wd] = (name, "dir")
+        if name:
+            self._attach(name)
+        if self.max_depth is not None and depth >= self.max_depth:
+            return
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            return
+        with entries:
+            children = [entry.name for entry in entries if entry.is_dir(follow_symlinks=False)]
+        for child in children:
+            child_name = os.path.join(name, child)
+            if child_name not in self.cgroups:
+                self._add_tree(child_name, depth + 1)
+
+    def _attach(self, name):
+        '''
+        Internal method to start monitoring a new cgroup.
+        '''
+        monitor = CGroupMonitor(os.path.join(self.cgroup_name, name), self.cgroup_base_path, version=self.version)
+        tracked = _Tracked(monitor)
+        monitor.start_monitor(self.interval)
+        tracked.read_limits()
+        self.cgroups[name] = tracked
+        if self.version == 2:
+            wd = self._add_watch(os.path.join(self.root, name, "cgroup.events"), IN_MODIFY)
+            if wd is not None:
+                self._watches[wd] = (name, "events")
+        if self.on_created is not None:
+            self.on_created(name, monitor)
+
+    def _populated_changed(self, name):
+        '''
+        Internal method to follow "populated" in cgroup.events: sample one last time when the
+        last process leaves, and start sampling again if processes come back.
+        '''
+        tracked = self.cgroups.get(name)
+        if tracked is None:
+            return
+        try:
+            events = tracked.monitor._read_keyed_file(os.path.join(tracked.monitor.cgroup_path, "cgroup.events"))
+        except OSError:
+            return
+        if "populated" not in events:
+            return
+        populated = events["populated"]
+        if not populated and tracked.monitor.monitoring:
+            tracked.read_limits()
+            tracked.fold(final_sample=True)
+        elif populated and not tracked.monitor.monitoring:
+            tracked.monitor.start_monitor(self.interval)
+
+    def _remove(self, name, notify=True):
+        '''
+        Internal method to summarise a removed cgroup and deliver it.
+        '''
+        tracked = self.cgroups.pop(name)
+        if tracked.monitor.monitoring:
+            tracked.fold()
+        tracked.monitor.close()
+        finished = FinishedCGroup(name, tracked.created_time, time.time(), tracked.summary)
+        if notify:
+            if self.on_removed is not None:
+                self.on_removed(finished)
+            else:
+                self.finished.put(finished)
+        return finished
+
+    def _resync(self):
+        '''
+        Internal method to catch up after the inotify queue overflowed and events were lost.
+        '''
+        logger.warning("inotify queue overflow, walking %s again", self.root)
+        for name in sorted(self.cgroups, reverse=True):
+            if not os.path.isdir(os.path.join(self.root, name)):
+                self._remove(name)
+        self._add_tree("", 0)
+
+    def _handle(self, wd, mask, child):
+        '''
+        Internal method to handle one inotify event.
+        '''
+        if mask & IN_Q_OVERFLOW:
+            self._resync()
+            return
+        watched = self._watches.get(wd)
+        if watched is None:
+            return
+        name, kind = watched
+        if mask & IN_IGNORED:
+            # The watched directory or file is gone
+            del self._watches[wd]
+        elif kind == "events":
+            if mask & IN_MODIFY:
+                self._populated_changed(name)
+        elif mask & IN_ISDIR:
+            child_name = os.path.join(name, child)
+            # Cgroups can be renamed within their parent, which looks like a removal and a creation
+            if mask & (IN_CREATE | IN_MOVED_TO) and child_name not in self.cgroups:
+                self._add_tree(child_name, child_name.count(os.sep) + 1)
+            elif mask & (IN_DELETE | IN_MOVED_FROM) and child_name in self.cgroups:
+                self._remove(child_name)
+        elif mask & IN_DELETE_SELF and name in self.cgroups:
+            self._remove(name)
+
+    def _run(self):
+        '''
+        Internal method reading inotify events until the watcher is stopped.
+        '''
+        while True:
+            ready, _, _ = select.select([self._inotify, self._wakeup[0]], [], [])
+            if self._wakeup[0] in ready:
+                return
+            events = self._inotify.read(0)
+            with self._lock:
+                for wd, mask, child in events:
+                    try:
+                        self._handle(wd, mask, child)
+                    except Exception:
+                        logger.exception("Error handling inotify event for %s", self._watches.get(wd))
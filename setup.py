@@ -33,5 +33,8 @@ setuptools.setup(
     ],
     packages=['cgroup_monitor'],
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['cgroup-monitor=cgroup_monitor.cli:main'],
+    },
     test_suite='tests',
 )
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+from cgroup_monitor.base_monitor import BaseCGroupMonitor
+
+
+class TestAdaptiveSampling(unittest.TestCase):
+
+    def test_next_interval(self):
+        monitor = BaseCGroupMonitor()
+        steady = monitor._next_interval(1.0, 0.1, 10.0, 0.0, 0.0, False)
+        assert steady == 1.0 * monitor.ADAPTIVE_GROW_FACTOR
+        assert monitor._next_interval(1.0, 0.1, 10.0, monitor.ADAPTIVE_CPU_DELTA + 1, 0.0, False) == 0.5
+        assert monitor._next_interval(1.0, 0.1, 10.0, 0.0, monitor.ADAPTIVE_MEMORY_DELTA * 2, False) == 0.5
+        assert monitor._next_interval(1.0, 0.1, 10.0, 0.0, 0.0, True) == 0.5
+        # Between a fifth of the threshold and the threshold the interval is kept
+        assert monitor._next_interval(1.0, 0.1, 10.0, monitor.ADAPTIVE_CPU_DELTA / 2, 0.0, False) == 1.0
+
+        # Clamped to the bounds
+        assert monitor._next_interval(8.0, 0.1, 10.0, 0.0, 0.0, False) == 10.0
+        assert monitor._next_interval(0.15, 0.1, 10.0, 0.0, 0.0, True) == 0.1
+
+    def test_arguments(self):
+        monitor = CGroupMonitor()
+        with self.assertRaises(ValueError):
+            monitor.start_monitor(min_interval=0.1)
+        with self.assertRaises(ValueError):
+            monitor.start_monitor(max_interval=1.0)
+        with self.assertRaises(ValueError):
+            monitor.start_monitor(min_interval=2.0, max_interval=1.0)
+        with self.assertRaises(ValueError):
+            monitor.start_monitor(min_interval=0, max_interval=1.0)
+        assert not monitor.monitoring
+
+    def test_interval_follows_load(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            os.makedirs(path)
+            for name, content in {"cpu.stat": "usage_usec 0\n", "cpu.max": "max 100000\n",
+                                  "memory.current": "1000\n", "memory.max": "max\n"}.items():
+                with open(os.path.join(path, name), "w") as f:
+                    f.write(content)
+            monitor = CGroupMonitor("job", base, version=2)
+
+            # Idle: the interval grows from the initial one up to max_interval
+            monitor.start_monitor(interval=0.02, min_interval=0.01, max_interval=0.08)
+            time.sleep(0.6)
+            monitor.stop_monitor()
+            idle_intervals = monitor.get_sample_intervals()
+            assert idle_intervals[-1] > 0.06
+            assert max(idle_intervals) < 0.2
+
+            # Busy: one full core more per check, far above ADAPTIVE_CPU_DELTA, keeps the interval at the minimum
+            monitor.start_monitor(interval=0.08, min_interval=0.01, max_interval=0.08)
+            usage = 0
+            for _ in range(40):
+                usage += 10 ** 6
+                with open(os.path.join(path, "cpu.stat"), "w") as f:
+                    f.write(f"usage_usec {usage}\n")
+                time.sleep(0.01)
+            monitor.stop_monitor()
+            monitor.close()
+            busy_intervals = monitor.get_sample_intervals()
+            assert len(busy_intervals) > 10
+            assert min(busy_intervals) < 0.03
@@ -0,0 +1,57 @@
+import unittest
+
+from cgroup_monitor.alerts import FIRING, RESOLVED, AlertEngine, AlertRule
+from cgroup_monitor.base_monitor import Sample
+
+
+def cpu_samples(values, interval=1.0):
+    return [Sample(float(i) * interval, interval, value, 0, 0) for i, value in enumerate(values)]
+
+
+class TestAlertRule(unittest.TestCase):
+
+    def test_consecutive_and_hysteresis(self):
+        events = []
+        rule = AlertRule("cpu", "cpu_usage_percent", 90, for_samples=3, clear_threshold=70, callback=events.append)
+        engine = AlertEngine([rule])
+
+        for sample in cpu_samples([95, 95, 50, 95, 95, 95, 80, 85, 60, 95]):
+            engine.evaluate(sample)
+
+        assert [(e.state, e.timestamp) for e in events] == [(FIRING, 5.0), (RESOLVED, 8.0)]
+        assert engine.events.empty()
+
+    def test_window_average_and_cooldown(self):
+        rule = AlertRule("cpu", "cpu_usage_percent", 50, window_s=2, cooldown_s=10)
+        engine = AlertEngine([rule])
+
+        for sample in cpu_samples([0, 100, 0, 100, 100, 0, 0, 100, 100]):
+            engine.evaluate(sample)
+
+        first = engine.events.get_nowait()
+        assert (first.state, first.timestamp, first.value) == (FIRING, 4.0, 100)
+        second = engine.events.get_nowait()
+        assert (second.state, second.timestamp) == (RESOLVED, 6.0)
+        # breaching again at t=8 is within the cooldown
+        assert engine.events.empty()
+        assert not rule.firing
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            AlertRule("x", "disk", 1)
+
+    def test_failing_callback(self):
+        def failing(event):
+            raise RuntimeError("callback failure")
+
+        events = []
+        bad = AlertRule("bad", "cpu_usage_percent", 50, callback=failing)
+        good = AlertRule("good", "cpu_usage_percent", 50, callback=events.append)
+        engine = AlertEngine([bad, good])
+
+        with self.assertLogs("cgroup_monitor.alerts", "ERROR"):
+            for sample in cpu_samples([100, 0]):
+                engine.evaluate(sample)
+
+        assert [e.state for e in events] == [FIRING, RESOLVED]
+        assert not bad.firing
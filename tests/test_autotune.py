@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from cgroup_monitor.autotune import AutoTuner
+from cgroup_monitor.base_monitor import Sample
+
+
+class FakeMonitor:
+    def __init__(self, cgroup_path=None):
+        self.cgroup_path = cgroup_path
+        self.stall_us = 0
+
+    def get_num_cores(self):
+        return 4
+
+    def get_memory_limit(self):
+        return 8 << 30
+
+    def get_memory_pressure(self):
+        return self.stall_us, 0
+
+    def subscribe(self, listener):
+        pass
+
+    def unsubscribe(self, listener):
+        pass
+
+
+class FakeManager:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def set_cpu_limit(self, quota, sudo=False):
+        if self.fail:
+            raise Exception("Failed to run command")
+        self.calls.append(("cpu", quota))
+
+    def set_memory_limit(self, limit, sudo=False):
+        self.calls.append(("memory", limit))
+
+
+class FakeV2Manager(FakeManager):
+    def set_memory_high(self, limit, sudo=False):
+        self.calls.append(("high", limit))
+
+
+class TestAutoTuner(unittest.TestCase):
+
+    def make_tuner(self, memory_bounds=(1 << 30, 16 << 30), manager=None, monitor=None, **kwargs):
+        manager = manager or FakeManager()
+        tuner = AutoTuner(
+            monitor or FakeMonitor(), manager, cpu_bounds=(0.5, 8), memory_bounds=memory_bounds,
+            window=5, min_change_interval_s=0, **kwargs
+        )
+        tuner.start()
+        self.addCleanup(tuner.stop)
+        return tuner, manager
+
+    def feed(self, tuner, samples):
+        for sample in samples:
+            tuner.on_sample(sample)
+            assert tuner.wait(5)
+
+    def test_shrinks_within_step_and_bounds(self):
+        tuner, manager = self.make_tuner()
+        self.feed(tuner, [Sample(i, 1.0, 5.0, 512 << 20, 8 << 30) for i in range(15)])
+
+        # 5% of 4 cores, halved at most once per decision, never below 0.5 cores / 1 GiB
+        assert [q for r, q in manager.calls if r == "cpu"] == [2.0, 1.0, 0.5]
+        assert [q for r, q in manager.calls if r == "memory"] == [4 << 30, 2 << 30, 1 << 30]
+
+    def test_grows_when_throttled(self):
+        tuner, manager = self.make_tuner(memory_bounds=None)
+        self.feed(tuner, [Sample(i, 1.0, 100.0, 0, 0, 0.5) for i in range(5)])
+
+        assert manager.calls == [("cpu", 8)]
+
+    def test_dry_run(self):
+        tuner, manager = self.make_tuner(dry_run=True)
+        self.feed(tuner, [Sample(i, 1.0, 5.0, 512 << 20, 8 << 30) for i in range(5)])
+
+        assert manager.calls == []
+        assert [d.applied for d in tuner.decisions] == [False, False]
+        assert tuner.cpu_limit == 4
+
+    def test_failed_write(self):
+        tuner, manager = self.make_tuner(memory_bounds=None, manager=FakeManager(fail=True))
+        with self.assertLogs("cgroup_monitor.autotune", "ERROR"):
+            self.feed(tuner, [Sample(i, 1.0, 5.0, 0, 0) for i in range(5)])
+
+        assert [(d.resource, d.applied) for d in tuner.decisions] == [("cpu_cores", False)]
+        assert tuner.cpu_limit == 4
+
+    def test_memory_max_within_bounds(self):
+        tuner, manager = self.make_tuner(memory_bounds=(1 << 30, 5632 << 20), manager=FakeV2Manager())
+        # Peak of 4 GiB: memory.high 5 GiB, memory.max would be 6.25 GiB without the bound
+        self.feed(tuner, [Sample(i, 1.0, 50.0, 4 << 30, 8 << 30) for i in range(5)])
+
+        high = [limit for kind, limit in manager.calls if kind == "high"]
+        memory_max = [limit for kind, limit in manager.calls if kind == "memory"]
+        assert high == [5 << 30]
+        assert memory_max == [5632 << 20]
+
+    def test_grows_on_memory_stalls(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "memory.pressure"), "w") as f:
+                f.write("some avg10=0.00 avg60=0.00 avg300=0.00 total=0\n")
+            monitor = FakeMonitor(path)
+            tuner, manager = self.make_tuner(monitor=monitor)
+            tuner.cpu_bounds = None
+
+            # Usage is far below the limit, but tasks stall on memory all the time
+            samples = [Sample(i, 1.0, 5.0, 512 << 20, 8 << 30) for i in range(5)]
+            self.feed(tuner, samples[:4])
+            monitor.stall_us = 10 ** 9
+            self.feed(tuner, samples[4:])
+
+        assert manager.calls == [("memory", 16 << 30)]
+        assert "stalled" in tuner.decisions[0].reason
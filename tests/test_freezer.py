@@ -0,0 +1,82 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cgroup_monitor import CGroupManager
+from cgroup_monitor.freezer import freeze_all
+
+
+def make_cgroup(base, name):
+    path = os.path.join(base, name)
+    os.makedirs(path)
+    for filename, content in (("cgroup.freeze", "0\n"), ("cgroup.events", "populated 1\nfrozen 0\n")):
+        with open(os.path.join(path, filename), "w") as f:
+            f.write(content)
+    return CGroupManager(name, base, version=2)
+
+
+def fake_kernel(managers, delay):
+    '''
+    Report each cgroup as frozen in cgroup.events some time after cgroup.freeze was written.
+    '''
+    time.sleep(delay)
+    for manager in managers:
+        with open(os.path.join(manager.cgroup_path, "cgroup.freeze")) as f:
+            frozen = f.read().strip()
+        with open(manager.freeze_events_path, "w") as f:
+            f.write(f"populated 1\nfrozen {frozen}\n")
+
+
+class TestFreezer(unittest.TestCase):
+
+    def test_freeze_all_waits_for_events(self):
+        with tempfile.TemporaryDirectory() as base:
+            managers = [make_cgroup(base, f"cg{i}") for i in range(4)]
+            kernel = threading.Thread(target=fake_kernel, args=(managers[:3], 0.3))
+            kernel.start()
+
+            start = time.monotonic()
+            pending = freeze_all(managers, timeout=1.0)
+            elapsed = time.monotonic() - start
+            kernel.join()
+
+            assert pending == [managers[3]]
+            assert all(manager.is_frozen() for manager in managers[:3])
+            assert 0.3 <= elapsed < 1.5
+
+    def test_v1_freezer_state(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, "freezer", "app"))
+            manager = CGroupManager("app", base, version=1)
+
+            assert manager.freeze(timeout=1.0)
+            assert manager.is_frozen()
+            assert manager.thaw(timeout=1.0)
+            assert not manager.is_frozen()
+
+    def test_v1_created_cgroup(self):
+        run = subprocess.run
+
+        def run_without_sudo(args, **kwargs):
+            # The test owns the fake hierarchies, so the commands need no sudo
+            if isinstance(args, list) and args[0] == "sudo":
+                args = args[1:]
+            return run(args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as base:
+            for controller in ("cpu", "cpuacct", "memory", "freezer"):
+                os.makedirs(os.path.join(base, controller))
+            manager = CGroupManager("app", base, version=1)
+            with mock.patch("cgroup_monitor.v1_manager.subprocess.run", run_without_sudo):
+                manager.create_cgroup()
+            manager.add_process(os.getpid())
+
+            with open(os.path.join(base, "freezer", "app", "cgroup.procs")) as f:
+                assert f.read().strip() == str(os.getpid())
+            assert manager.freeze(timeout=1.0)
+            assert manager.is_frozen()
+            assert manager.thaw(timeout=1.0)
@@ -0,0 +1,71 @@
+import unittest
+
+from cgroup_monitor.mounts import MountTable, _relative_to_mount, _unescape, parse_mountinfo, parse_proc_cgroup
+
+
+HYBRID_MOUNTINFO = """\
+24 1 0:22 / /sys rw,nosuid,nodev,noexec,relatime shared:7 - sysfs sysfs rw
+32 24 0:28 / /sys/fs/cgroup ro,nosuid,nodev,noexec shared:9 - tmpfs tmpfs ro,mode=755
+33 32 0:29 / /sys/fs/cgroup/unified rw,nosuid,nodev,noexec,relatime shared:10 - cgroup2 cgroup2 rw,nsdelegate
+35 32 0:31 / /sys/fs/cgroup/cpu,cpuacct rw,nosuid,nodev,noexec,relatime shared:14 - cgroup cgroup rw,cpu,cpuacct
+36 32 0:32 /docker/abc /sys/fs/cgroup/memory rw,nosuid,nodev,noexec,relatime shared:15 - cgroup cgroup rw,memory
+37 32 0:33 / /sys/fs/cgroup/systemd rw,nosuid,nodev,noexec,relatime shared:11 - cgroup cgroup rw,xattr,name=systemd
+"""
+
+PROC_CGROUP = """\
+12:memory:/docker/abc
+4:cpu,cpuacct:/docker/abc
+1:name=systemd:/system.slice/docker.service
+0::/system.slice/docker-abc.scope
+"""
+
+V2_MOUNTINFO = """\
+30 24 0:26 / /mnt/cgroup\\040root rw,nosuid,nodev,noexec,relatime shared:4 - cgroup2 cgroup2 rw,nsdelegate
+"""
+
+
+class TestMountTable(unittest.TestCase):
+
+    def test_hybrid(self):
+        table = MountTable(parse_mountinfo(HYBRID_MOUNTINFO))
+
+        assert not table.is_v2()
+        assert table.v2.mount_point == "/sys/fs/cgroup/unified"
+        assert table.controller_mount("cpu") is table.controller_mount("cpuacct")
+        assert table.controller_mount("cpu").mount_point == "/sys/fs/cgroup/cpu,cpuacct"
+        assert table.controller_mount("memory").root == "/docker/abc"
+        assert table.controller_mount("name=systemd") is not None
+        assert table.controller_mount("xattr") is None
+
+    def test_v2_only(self):
+        table = MountTable(parse_mountinfo(V2_MOUNTINFO))
+
+        assert table.is_v2()
+        assert table.v2.mount_point == "/mnt/cgroup root"
+        assert table.v1 == {}
+
+    def test_unescape(self):
+        assert _unescape("/mnt/a\\040b\\011c\\012d\\134e") == "/mnt/a b\tc\nd\\e"
+        assert _unescape("/mnt/caf\u00e9\\040\u6570\u636e") == "/mnt/caf\u00e9 \u6570\u636e"
+        assert _unescape("/mnt/\udcff\\040x") == "/mnt/\udcff x"
+
+
+class TestProcCGroup(unittest.TestCase):
+
+    def test_parse(self):
+        cgroups = parse_proc_cgroup(PROC_CGROUP)
+
+        assert cgroups["cpu"] == cgroups["cpuacct"] == "/docker/abc"
+        assert cgroups["name=systemd"] == "/system.slice/docker.service"
+        assert cgroups[""] == "/system.slice/docker-abc.scope"
+
+    def test_namespaced_paths(self):
+        table = MountTable(parse_mountinfo(HYBRID_MOUNTINFO))
+
+        # memory hierarchy is mounted at the container's own cgroup
+        assert _relative_to_mount("/docker/abc", table.controller_mount("memory")) == ""
+        assert _relative_to_mount("/docker/abc/job", table.controller_mount("memory")) == "job"
+        # cpu hierarchy is mounted at the root
+        assert _relative_to_mount("/docker/abc", table.controller_mount("cpu")) == "docker/abc"
+        with self.assertRaises(RuntimeError):
+            _relative_to_mount("/../sibling", table.controller_mount("cpu"))
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+
+
+def write_files(path, files):
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+
+
+def make_cgroup(path):
+    os.makedirs(path)
+    write_files(path, {
+        "cpu.stat": "usage_usec 0\nnr_periods 0\nnr_throttled 0\nthrottled_usec 0\n",
+        "cpu.max": "max 100000\n",
+        "memory.current": "4096\n",
+        "memory.max": "8192\n",
+    })
+
+
+class TestNuma(unittest.TestCase):
+
+    def test_numa_stats(self):
+        def numa_stat(anon, file):
+            return (
+                f"anon N0={anon[0]} N1={anon[1]}\n"
+                f"anon_thp N0=0 N1=0\n"
+                f"file N0={file[0]} N1={file[1]}\n"
+            )
+
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            make_cgroup(path)
+            write_files(path, {"memory.numa_stat": numa_stat((300, 100), (0, 0)), "cpuset.mems.effective": "0\n"})
+            monitor = CGroupMonitor("job", base, version=2)
+            monitor.start_monitor(interval=0.05, numa=True)
+            layout = monitor._numa_layout
+            time.sleep(0.3)
+            stats = monitor.get_last_n_stats(3)["numa"]
+            monitor.stop_monitor()
+            monitor.close()
+
+        assert monitor.numa_nodes == [0, 1]
+        assert monitor._numa_layout is layout
+        assert len(monitor.numa_anon_bytes) == 2 * len(monitor.timestamps_ns)
+        assert stats["average_anon_bytes"] == [300, 100]
+        assert stats["node_distribution_percent"] == [75, 25]
+        assert stats["allowed_nodes"] == [0]
+        assert stats["average_remote_bytes"] == 100
+        assert stats["locality_ratio"] == 0.75
+
+        monitor = CGroupMonitor(version=1, cgroup_base_path="/nonexistent")
+        content = "total=3 N0=1 N1=2\nanon=1 N0=1 N1=0\nfile=2 N0=0 N1=2\nhierarchical_anon=5 N0=4 N1=1\n" \
+            "hierarchical_file=2 N0=0 N1=2\n"
+        page = os.sysconf("SC_PAGE_SIZE")
+        assert monitor._parse_numa_stat(content, (("hierarchical_anon=", "hierarchical_file="),), page) == \
+            ([0, 1], [4 * page, page], [0, 2 * page])
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import time
 
@@ -21,3 +23,103 @@ class TestCGroupMonitor(unittest.TestCase):
 
         assert op["monitoring_duration_s"] >= 5
         assert op["monitoring_duration_s"] < 6
+
+    def test_spans(self):
+        monitor = CGroupMonitor()
+
+        @monitor.profile
+        def outer():
+            with monitor.span("inner"):
+                sum(range(10000))
+
+        outer()
+        monitor.close()
+
+        inner, outer_record = monitor.span_records
+        assert inner.name == "inner"
+        assert outer_record.name.endswith("outer")
+        assert inner.parent_id == outer_record.span_id
+        assert (inner.depth, outer_record.depth) == (1, 0)
+        assert outer_record.duration_s >= inner.duration_s
+        assert inner.memory_peak_bytes >= inner.memory_start_bytes
+
+    def test_span_records_bounded(self):
+        monitor = CGroupMonitor()
+        monitor.MAX_SPAN_RECORDS = 5
+        monitor.span_records = type(monitor.span_records)(maxlen=monitor.MAX_SPAN_RECORDS)
+        for i in range(8):
+            with monitor.span(f"span{i}"):
+                pass
+
+        assert [record.name for record in monitor.span_records] == [f"span{i}" for i in range(3, 8)]
+
+        # Closing the monitor inside a span stops the sampler, the span still completes
+        with monitor.span("closed") as span:
+            monitor.close()
+        assert span.record.name == "closed"
+
+    def test_lazy_metrics(self):
+        monitor = CGroupMonitor()
+        monitor.start_monitor(interval=0.05)
+        time.sleep(0.5)
+        monitor.stop_monitor()
+
+        count = len(monitor.memory_usage)
+        assert count > 0
+        assert len(monitor.cpu_usage_us) == len(monitor.timestamps_ns) == count + 1
+        assert monitor.cpu_usage_percentages is monitor.cpu_usage_percentages
+        assert len(monitor.get_sample_intervals(3)) == min(count, 3)
+        # The cached series are shared, callers cannot change them for later readers
+        with self.assertRaises(AttributeError):
+            monitor.cpu_usage_percentages.append(0.0)
+        with self.assertRaises(TypeError):
+            monitor.sample_intervals[0] = 0.0
+
+        one_core = monitor.get_cpu_usage_percentages(num_cores=1)
+        two_cores = monitor.get_cpu_usage_percentages(num_cores=2)
+        assert all(abs(a - 2 * b) < 1e-9 for a, b in zip(one_core, two_cores))
+
+    def test_failing_listener(self):
+        calls = []
+
+        def failing(sample):
+            calls.append(sample)
+            raise RuntimeError("listener failure")
+
+        monitor = CGroupMonitor()
+        monitor.subscribe(failing)
+        monitor.subscribe(calls.append)
+        with self.assertLogs("cgroup_monitor.base_monitor", "ERROR"):
+            monitor.start_monitor(interval=0.02)
+            time.sleep(0.15)
+        assert monitor.monitor_thread.is_alive()
+        monitor.stop_monitor()
+        # Both listeners got every sample
+        assert len(calls) >= 4 and len(calls) % 2 == 0
+        monitor.unsubscribe(failing)
+        monitor.unsubscribe(calls.append)
+        assert monitor._sample_listeners == []
+
+
+class TestBackendReaders(unittest.TestCase):
+
+    def write(self, path, name, content):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+
+    def test_v1_cpu_usage_in_microseconds(self):
+        with tempfile.TemporaryDirectory() as base:
+            # cpuacct.usage is in nanoseconds
+            self.write(os.path.join(base, "cpuacct", "job"), "cpuacct.usage", "123456789\n")
+            monitor = CGroupMonitor("job", base, version=1)
+            assert monitor.get_cpu_usage_us() == 123456
+
+    def test_v2_unlimited_memory(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            self.write(path, "memory.max", "max\n")
+            monitor = CGroupMonitor("job", base, version=2)
+            assert monitor.get_memory_limit() == 0
+            self.write(path, "memory.max", "1073741824\n")
+            assert monitor.get_memory_limit() == 1 << 30
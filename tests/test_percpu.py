@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+
+
+def write_files(path, files):
+    os.makedirs(path, exist_ok=True)
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+
+
+def usage_all(rows):
+    # cpuacct.usage_all is in nanoseconds, with a header line
+    return "cpu user system\n" + "".join(f"{cpu} {user} {system}\n" for cpu, (user, system) in enumerate(rows))
+
+
+class TestPerCpu(unittest.TestCase):
+
+    def test_v1_usage_all(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "cpuacct", "job")
+            write_files(path, {"cpuacct.usage_all": usage_all([(3000000, 1000000), (0, 2000), (1999, 0)])})
+            monitor = CGroupMonitor("job", base, version=1)
+            assert monitor.get_cpu_usage_percpu() == ([3000, 0, 1], [1000, 2, 0])
+
+    def test_v1_usage_percpu_fallback(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "cpuacct", "job")
+            write_files(path, {"cpuacct.usage_percpu": "5000000 7000 0 \n"})
+            monitor = CGroupMonitor("job", base, version=1)
+            assert monitor.get_cpu_usage_percpu() == ([5000, 7, 0], [0, 0, 0])
+
+            os.remove(os.path.join(path, "cpuacct.usage_percpu"))
+            assert monitor.get_cpu_usage_percpu() == ([], [])
+
+    def test_v1_percpu_stats(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "cpuacct", "job")
+            write_files(path, {"cpuacct.usage": "0\n", "cpuacct.usage_all": usage_all([(0, 0), (0, 0)])})
+            monitor = CGroupMonitor("job", base, version=1)
+            monitor.start_monitor(interval=0.02, percpu=True)
+            time.sleep(0.05)
+            # Core 0 busy, three quarters of it in user time, core 1 idle
+            write_files(path, {"cpuacct.usage": "400000000\n",
+                               "cpuacct.usage_all": usage_all([(300000000, 100000000), (0, 0)])})
+            time.sleep(0.1)
+            stats = monitor.stop_monitor()["percpu"]
+            monitor.close()
+
+        assert monitor.percpu_columns == 2
+        assert len(monitor.percpu_user_us) == 2 * len(monitor.timestamps_ns)
+        user, system = stats["per_core_user_percent"], stats["per_core_system_percent"]
+        assert user[0] > 0 and abs(user[0] - 3 * system[0]) < 0.05
+        assert user[1] == system[1] == 0
+        assert stats["per_core_usage_percent"][0] == stats["max_core_usage_percent"] > 0
+        assert stats["busiest_core"] == 0
+        assert stats["imbalance_ratio"] == 2
+
+    def test_v2_single_column(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            write_files(path, {"cpu.stat": "usage_usec 0\nuser_usec 0\nsystem_usec 0\n", "memory.current": "0\n"})
+            monitor = CGroupMonitor("job", base, version=2)
+            monitor.start_monitor(interval=0.02, percpu=True)
+            time.sleep(0.05)
+            write_files(path, {"cpu.stat": "usage_usec 200000\nuser_usec 150000\nsystem_usec 50000\n"})
+            time.sleep(0.05)
+            stats = monitor.stop_monitor()["percpu"]
+            monitor.close()
+
+        assert monitor.percpu_columns == 1
+        assert len(stats["per_core_usage_percent"]) == 1
+        assert stats["per_core_usage_percent"][0] > 0
+        # There is no per-core breakdown to compare
+        assert stats["busiest_core"] is None
+        assert stats["max_core_usage_percent"] is None
+        assert stats["imbalance_ratio"] is None
+
+    def test_rows_aligned_after_failed_read(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            write_files(path, {"cpu.stat": "usage_usec 0\nuser_usec 0\nsystem_usec 0\n", "memory.current": "0\n",
+                               "pids.current": "1\n", "pids.events": "max 0\n"})
+            monitor = CGroupMonitor("job", base, version=2)
+            reads = []
+            get_pids_counters = monitor.get_pids_counters
+
+            def failing_read():
+                reads.append(True)
+                if len(reads) == 3:
+                    raise OSError("transient")
+                return get_pids_counters()
+
+            # pids are read after the per-CPU usage of the same sample
+            monitor.get_pids_counters = failing_read
+            monitor.start_monitor(interval=0.01, percpu=True, pids=True)
+            time.sleep(0.1)
+            monitor.stop_monitor()
+            monitor.close()
+
+        assert len(reads) > 3
+        assert len(monitor.percpu_user_us) == len(monitor.pids_current) == len(monitor.timestamps_ns)
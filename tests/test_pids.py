@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+
+
+def write_files(path, files):
+    # Rewrite in place with a single write, so the monitor never reads an empty file. Replacing
+    # the file would leave the monitor's cached descriptors on the old one.
+    for name, content in files.items():
+        data = content.encode()
+        fd = os.open(os.path.join(path, name), os.O_WRONLY | os.O_CREAT)
+        try:
+            os.pwrite(fd, data, 0)
+            os.ftruncate(fd, len(data))
+        finally:
+            os.close(fd)
+
+
+def make_cgroup(path):
+    os.makedirs(path)
+    write_files(path, {
+        "cpu.stat": "usage_usec 0\nnr_periods 0\nnr_throttled 0\nthrottled_usec 0\n",
+        "cpu.max": "max 100000\n",
+        "memory.current": "4096\n",
+        "memory.max": "8192\n",
+    })
+
+
+class TestPids(unittest.TestCase):
+
+    def test_pids_stats(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            make_cgroup(path)
+            monitor = CGroupMonitor("job", base, version=2)
+            monitor.start_monitor(interval=0.05, pids=True)
+            assert not monitor.pids_enabled
+            monitor.stop_monitor()
+
+            write_files(path, {"pids.current": "10\n", "pids.max": "100\n", "pids.events": "max 0\n"})
+            monitor.start_monitor(interval=0.05, pids=True)
+            time.sleep(0.2)
+            write_files(path, {"pids.current": "50\n", "pids.events": "max 3\n"})
+            time.sleep(0.2)
+            write_files(path, {"pids.current": "20\n"})
+            time.sleep(0.2)
+            stats = monitor.stop_monitor()["pids"]
+            monitor.close()
+
+        assert len(monitor.pids_current) == len(monitor.timestamps_ns)
+        assert stats["max_pids"] == 50
+        assert stats["max_pids_percent"] == 50
+        assert stats["pids_limit"] == 100
+        assert 20 <= stats["average_pids"] <= 50
+        assert stats["pids_limit_hits"] == 3
+        elapsed_s = (monitor.timestamps_ns[-1] - monitor.timestamps_ns[0]) / 1e9
+        assert abs(stats["fork_rate_per_s"] - 40 / elapsed_s) < 1
+        assert abs(stats["exit_rate_per_s"] - 30 / elapsed_s) < 1
+
+    def test_partial_read_drops_sample(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "job")
+            make_cgroup(path)
+            write_files(path, {"pids.current": "10\n", "pids.max": "100\n", "pids.events": "max 0\n"})
+            monitor = CGroupMonitor("job", base, version=2)
+            reads = []
+            get_pids_counters = monitor.get_pids_counters
+
+            def partial_read():
+                reads.append(True)
+                if len(reads) == 2:
+                    # pids.current read while it is rewritten
+                    int("")
+                return get_pids_counters()
+
+            monitor.get_pids_counters = partial_read
+            monitor.start_monitor(interval=0.01, pids=True)
+            time.sleep(0.1)
+            alive = monitor.monitor_thread.is_alive()
+            monitor.stop_monitor()
+            monitor.close()
+
+        assert alive
+        assert len(reads) > 3
+        assert len(monitor.pids_current) == len(monitor.timestamps_ns) == len(monitor.memory_usage) + 1
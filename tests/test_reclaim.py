@@ -0,0 +1,108 @@
+import threading
+import unittest
+
+from cgroup_monitor.base_monitor import Sample
+from cgroup_monitor.reclaim import NO_PROGRESS, REFAULTS, ReclaimPolicy
+
+MIB = 1 << 20
+
+
+class FakeCGroup:
+    # 100 MiB of page cache can go for free, reclaiming into the 200 MiB working set refaults
+    def __init__(self):
+        self.memory = 300 * MIB
+        self.working_set = 200 * MIB
+        self.refaults = 0
+        self.stall_us = 0
+
+    def subscribe(self, listener):
+        pass
+
+    def unsubscribe(self, listener):
+        pass
+
+    def get_memory_usage(self):
+        return self.memory
+
+    def get_memory_pressure(self):
+        return self.stall_us, 0
+
+    def get_memory_refaults(self):
+        # The workload keeps touching the pages it lost
+        if self.memory < self.working_set:
+            self.refaults += 1000
+        return self.refaults
+
+    def reclaim(self, size, swappiness=None, sudo=False):
+        freed = min(size, self.memory)
+        self.memory -= freed
+        return freed
+
+
+class TestReclaimPolicy(unittest.TestCase):
+
+    def run_policy(self, cgroup, samples, cpu=0.0, **kwargs):
+        policy = ReclaimPolicy(cgroup, cgroup, step_bytes=40 * MIB, idle_samples=3, settle_s=0, **kwargs)
+        policy.start()
+        for i in range(samples):
+            policy.on_sample(Sample(i, 1.0, cpu, cgroup.memory, 0))
+            assert policy.wait(1)
+        policy.stop()
+        return policy
+
+    def test_steps_until_refaults_rise(self):
+        cgroup = FakeCGroup()
+        policy = self.run_policy(cgroup, 20)
+
+        assert [step.freed_bytes for step in policy.steps] == [40 * MIB, 40 * MIB, 40 * MIB]
+        assert [step.stop_reason for step in policy.steps] == [None, None, REFAULTS]
+        assert policy.steps[-1].refaults_per_s > 0
+        assert policy.total_freed_bytes == 120 * MIB
+
+    def test_busy_cgroup_is_left_alone(self):
+        cgroup = FakeCGroup()
+        policy = self.run_policy(cgroup, 20, cpu=50.0)
+
+        assert not policy.steps
+        assert cgroup.memory == 300 * MIB
+
+    def test_floor(self):
+        cgroup = FakeCGroup()
+        policy = self.run_policy(cgroup, 20, min_memory_bytes=280 * MIB)
+
+        assert [step.requested_bytes for step in policy.steps] == [20 * MIB]
+        assert cgroup.memory == 280 * MIB
+
+    def test_no_progress(self):
+        cgroup = FakeCGroup()
+        cgroup.reclaim = lambda size, swappiness=None, sudo=False: 0
+        policy = self.run_policy(cgroup, 20)
+
+        assert [step.stop_reason for step in policy.steps] == [NO_PROGRESS]
+
+    def test_reclaim_off_the_sampler_thread(self):
+        cgroup = FakeCGroup()
+        release = threading.Event()
+        reclaim = cgroup.reclaim
+
+        def slow_reclaim(size, swappiness=None, sudo=False):
+            release.wait(5)
+            return reclaim(size, swappiness, sudo)
+
+        cgroup.reclaim = slow_reclaim
+        policy = ReclaimPolicy(cgroup, cgroup, step_bytes=40 * MIB, idle_samples=3, settle_s=0)
+        policy.start()
+        # Samples keep coming while the kernel reclaims, and do not start more steps
+        for i in range(10):
+            policy.on_sample(Sample(i, 1.0, 0.0, cgroup.memory, 0))
+        assert not policy.wait(0.05)
+        assert not policy.steps
+        assert cgroup.memory == 300 * MIB
+
+        release.set()
+        assert policy.wait(1)
+        policy.on_sample(Sample(10, 1.0, 0.0, cgroup.memory, 0))
+        policy.stop()
+
+        assert [step.freed_bytes for step in policy.steps] == [40 * MIB]
+        assert policy.steps[0].memory_after_bytes == 260 * MIB
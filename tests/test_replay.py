@@ -0,0 +1,136 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+from cgroup_monitor.replay import CGroupMonitor as ReplayMonitor, load_trace
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replay_matches_live(self):
+        monitor = CGroupMonitor()
+        monitor.start_monitor(interval=0.05)
+        time.sleep(0.5)
+        live = monitor.stop_monitor(info_level=1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            monitor.save_trace(path)
+            replay = ReplayMonitor(load_trace(path))
+
+        replay.start_monitor(interval=0.05)
+        assert replay.wait(5)
+        replayed = replay.stop_monitor(info_level=1)
+
+        assert list(replay.timestamps_ns) == list(monitor.timestamps_ns)
+        assert list(replay.cpu_usage_us) == list(monitor.cpu_usage_us)
+        assert list(replay.memory_usage) == list(monitor.memory_usage)
+        del live["monitoring_duration_s"], replayed["monitoring_duration_s"]
+        assert replayed == live
+
+    def test_virtual_clock(self):
+        # One hour of 100 ms samples at 50% of one core
+        count = 36000
+        trace = {
+            "type": "trace",
+            "version": 1,
+            "start_time": 1000.0,
+            "cpu_quota": 100000,
+            "cpu_period": 100000,
+            "memory_limit_bytes": 1 << 30,
+            "timestamps_ns": [i * 100000000 for i in range(count + 1)],
+            "cpu_usage_us": [i * 50000 for i in range(count + 1)],
+            "memory_usage": [(i % 100) << 20 for i in range(count + 1)],
+        }
+        replay = ReplayMonitor(trace, cgroup_name="job")
+        samples = []
+        replay.subscribe(samples.append)
+
+        start = time.perf_counter()
+        replay.start_monitor(interval=0.1)
+        assert replay.wait(5)
+        stats = replay.stop_monitor()
+        assert time.perf_counter() - start < 1
+
+        assert len(samples) == len(replay.memory_usage) == count
+        assert samples[-1].timestamp == 1000.0 + 3600
+        assert stats["average_cpu_usage_percent"] == 50
+        assert stats["monitoring_duration_s"] == 3600
+
+        # Coarser intervals land on the closest trace points
+        replay.start_monitor(interval=1.0)
+        replay.wait(5)
+        replay.stop_monitor()
+        assert len(replay.memory_usage) == count // 10
+        assert replay.get_sample_intervals(1) == (1.0,)
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def test_consistent_snapshots(self):
+        # Memory usage i at i * 100 ms, so every series of a snapshot can be checked against the timestamps
+        count = 36000
+        trace = {
+            "type": "trace",
+            "version": 1,
+            "cpu_quota": 100000,
+            "cpu_period": 100000,
+            "timestamps_ns": [i * 100000000 for i in range(count + 1)],
+            "cpu_usage_us": [i * 50000 for i in range(count + 1)],
+            "memory_usage": list(range(count + 1)),
+        }
+        replay = ReplayMonitor(trace)
+        replay.start_monitor(interval=0.1)
+        snapshots = 0
+        while replay.monitor_thread.is_alive() or not snapshots:
+            snapshot = replay.snapshot(50)
+            assert len(snapshot.timestamps_ns) == len(snapshot.cpu_usage_us) == len(snapshot.memory_usage) + 1
+            assert len(snapshot.cpu_usage_percentages) == len(snapshot.sample_intervals) == len(snapshot.memory_usage)
+            assert list(snapshot.memory_usage) == [t // 100000000 for t in snapshot.timestamps_ns[1:]]
+            assert all(abs(x - 50) < 1e-9 for x in snapshot.cpu_usage_percentages)
+            stats = replay.get_last_n_stats(50, info_level=1)
+            assert len(stats["cpu_usage_percentage_list"]) == len(stats["memory_usage_bytes_list"])
+            snapshots += 1
+
+        stats = replay.get_last_n_stats(10, info_level=1)
+        stats["memory_usage_bytes_list"].clear()
+        assert len(replay.get_last_n_stats(10, info_level=1)["memory_usage_bytes_list"]) == 10
+        stats = replay.stop_monitor(info_level=1)
+        stats["memory_usage_bytes_list"].clear()
+        stats["cpu_usage_percentage_list"].clear()
+        assert len(replay.memory_usage) == len(replay.cpu_usage_percentages) == count
+        assert len(replay.snapshot().memory_usage) == count
+
+    def test_sub_stats_use_the_same_samples(self):
+        # CPU usage speeds up every sample, so windows ending at different samples differ
+        count = 100
+        trace = {
+            "type": "trace",
+            "version": 1,
+            "cpu_quota": 100000,
+            "cpu_period": 100000,
+            "timestamps_ns": [i * 100000000 for i in range(count + 1)],
+            "cpu_usage_us": [i * i * 1000 for i in range(count + 1)],
+            "memory_usage": list(range(count + 1)),
+        }
+        replay = ReplayMonitor(trace)
+        replay.start_monitor(interval=0.1, percpu=True)
+        assert replay.wait(5)
+
+        # A sample lands while the stats of the earlier samples are computed
+        full = replay._view
+        replay._view = full._replace(count=full.count - 5)
+        expected = replay.get_percpu_stats(3)
+        usage_stats = replay._usage_stats
+
+        def sample_lands(*args):
+            replay._view = full
+            return usage_stats(*args)
+
+        replay._usage_stats = sample_lands
+        stats = replay.get_last_n_stats(3)
+        assert stats["percpu"] == expected
+        assert stats["percpu"] != replay.get_percpu_stats(3)
+        replay.stop_monitor()
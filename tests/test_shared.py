@@ -0,0 +1,47 @@
+import sys
+import time
+import unittest
+
+from cgroup_monitor.base_monitor import Sample
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "multiprocessing.shared_memory requires Python 3.8+")
+class TestSharedStats(unittest.TestCase):
+
+    def test_ring_and_aggregates(self):
+        from cgroup_monitor.shared import SharedStatsReader, SharedStatsWriter
+
+        writer = SharedStatsWriter(capacity=4)
+        try:
+            for i in range(6):
+                writer.publish(Sample(float(i), 0.5 if i % 2 else 1.5, 10.0 * i, 1024 * i, 4096))
+
+            reader = SharedStatsReader(writer.name)
+            samples = reader.read_samples(10)
+            stats = reader.get_stats()
+            reader.close()
+        finally:
+            writer.close()
+
+        assert [s.timestamp for s in samples] == [2.0, 3.0, 4.0, 5.0]
+        assert samples[-1].memory_limit_bytes == 4096
+        assert stats["sample_count"] == 6
+        assert stats["max_cpu_usage_percent"] == 50.0
+        # (0*1.5 + 10*0.5 + 20*1.5 + 30*0.5 + 40*1.5 + 50*0.5) / 6
+        assert stats["average_cpu_usage_percent"] == 22.5
+        assert stats["max_memory_usage_percent"] == 125.0
+
+    def test_close_unsubscribes(self):
+        from cgroup_monitor import CGroupMonitor
+
+        monitor = CGroupMonitor()
+        writer = monitor.share_stats(capacity=16)
+        monitor.start_monitor(interval=0.02)
+        time.sleep(0.1)
+        writer.close()
+        assert monitor._sample_listeners == []
+        count = len(monitor.memory_usage)
+        time.sleep(0.1)
+        assert monitor.monitor_thread.is_alive()
+        assert len(monitor.memory_usage) > count
+        monitor.stop_monitor()
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import unittest
+
+from cgroup_monitor.summary import QuantileSketch, Summary, load_summary, merge_files
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_merge_matches_single_pass(self):
+        cpu = [float(i % 97) for i in range(1000)]
+        memory = [1000 + 7 * i for i in range(1000)]
+        intervals = [0.5 if i % 3 else 2.0 for i in range(1000)]
+
+        whole = Summary.from_samples(cpu, memory, intervals, 1 << 30)
+        parts = [
+            Summary.from_samples(cpu[i:i + 100], memory[i:i + 100], intervals[i:i + 100], 1 << 30)
+            for i in range(0, 1000, 100)
+        ]
+        merged = Summary.merge_all(parts)
+
+        assert merged.runs == 10
+        assert merged.count == whole.count == 1000
+        assert merged.report() == dict(whole.report(), runs=10)
+        assert merged.cpu_sketch.buckets == whole.cpu_sketch.buckets
+
+    def test_time_weighted_average(self):
+        short = Summary.from_samples([100.0], [0], [1.0])
+        long = Summary.from_samples([0.0], [0], [3.0])
+
+        assert short.merge(long).report()["average_cpu_usage_percent"] == 25.0
+
+    def test_sketch_accuracy(self):
+        sketch = QuantileSketch(0.01)
+        for value in range(1, 10001):
+            sketch.add(value)
+
+        for q in (0.5, 0.95, 0.99):
+            exact = q * 9999 + 1
+            assert abs(sketch.quantile(q) - exact) <= 0.01 * exact + 1
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            summary_path = os.path.join(tmp, "summary.json")
+            recording_path = os.path.join(tmp, "recording.json")
+            Summary.from_samples([10.0, 20.0], [100, 200], [1.0, 1.0], 1000).save(summary_path)
+            with open(recording_path, "w") as f:
+                json.dump({
+                    "type": "recording",
+                    "memory_limit_bytes": 1000,
+                    "cpu_usage_percentages": [30.0],
+                    "memory_usage": [400],
+                    "sample_intervals": [2.0],
+                }, f)
+
+            assert load_summary(summary_path).count == 2
+            report = merge_files([summary_path, recording_path]).report()
+
+        assert report["average_cpu_usage_percent"] == 22.5
+        assert report["max_memory_usage_percent"] == 40.0
+        assert report["runs"] == 2
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from cgroup_monitor import CGroupManager
+from cgroup_monitor.v2_manager import format_cpu_list, parse_cpu_list
+
+
+def make_tree(base, name):
+    '''
+    Create the cgroup and every ancestor with an empty cgroup.subtree_control.
+    '''
+    path = base
+    for part in [""] + name.split("/"):
+        path = os.path.join(path, part)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "cgroup.subtree_control"), "w"):
+            pass
+    return CGroupManager(name, base, version=2)
+
+
+def read(path, filename):
+    with open(os.path.join(path, filename)) as f:
+        return f.read().strip()
+
+
+class TestCpuList(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(parse_cpu_list("5"), [5])
+        self.assertEqual(parse_cpu_list(" 2,0-1\n"), [0, 1, 2])
+        self.assertEqual(parse_cpu_list(""), [])
+        self.assertEqual(parse_cpu_list(None), [])
+
+    def test_format(self):
+        self.assertEqual(format_cpu_list([8, 0, 1, 2, 3, 10, 11]), "0-3,8,10-11")
+        self.assertEqual(format_cpu_list([5]), "5")
+        self.assertEqual(format_cpu_list([1, 1, 2]), "1-2")
+        self.assertEqual(format_cpu_list([]), "")
+        self.assertEqual(format_cpu_list("0-1"), "0-1")
+
+    def test_round_trip(self):
+        for content in ("0-3,8,10-11", "0", "1,3,5", "0-63", ""):
+            self.assertEqual(format_cpu_list(parse_cpu_list(content)), content)
+
+
+class TestCGroupManager(unittest.TestCase):
+
+    def test_get_io_max(self):
+        with tempfile.TemporaryDirectory() as base:
+            manager = make_tree(base, "test")
+            with open(os.path.join(manager.cgroup_path, "io.max"), "w") as f:
+                f.write("8:0 rbps=1048576 wbps=max riops=max wiops=120\n")
+                f.write("259:0 rbps=max wbps=2097152 riops=max wiops=max\n")
+
+            self.assertEqual(manager.get_io_max(), {
+                "8:0": {"rbps": 1048576, "wbps": None, "riops": None, "wiops": 120},
+                "259:0": {"rbps": None, "wbps": 2097152, "riops": None, "wiops": None},
+            })
+
+    def test_get_io_max_empty(self):
+        with tempfile.TemporaryDirectory() as base:
+            manager = make_tree(base, "test")
+            self.assertEqual(manager.get_io_max(), {})
+            with open(os.path.join(manager.cgroup_path, "io.max"), "w"):
+                pass
+            self.assertEqual(manager.get_io_max(), {})
+
+    def test_enable_controllers(self):
+        with tempfile.TemporaryDirectory() as base:
+            manager = make_tree(base, "a/b/c")
+            manager.enable_controllers(["cpu", "memory"])
+
+            for path in (base, os.path.join(base, "a"), os.path.join(base, "a/b")):
+                self.assertEqual(read(path, "cgroup.subtree_control"), "+cpu +memory")
+            self.assertEqual(read(manager.cgroup_path, "cgroup.subtree_control"), "")
+
+    def test_enable_controllers_subtree(self):
+        with tempfile.TemporaryDirectory() as base:
+            manager = make_tree(base, "a/b")
+            manager.enable_controllers(["pids"], subtree=True)
+
+            for path in (base, os.path.join(base, "a"), manager.cgroup_path):
+                self.assertEqual(read(path, "cgroup.subtree_control"), "+pids")
+
+    def test_set_cpu_weight(self):
+        with tempfile.TemporaryDirectory() as base:
+            manager = make_tree(base, "test")
+            for weight in (0, -1, 10001):
+                with self.assertRaises(ValueError):
+                    manager.set_cpu_weight(weight)
+            self.assertFalse(os.path.exists(os.path.join(manager.cgroup_path, "cpu.weight")))
+
+            for weight in (1, 10000):
+                manager.set_cpu_weight(weight)
+                self.assertEqual(manager.get_cpu_weight(), weight)
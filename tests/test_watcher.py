@@ -0,0 +1,143 @@
+import os
+import queue
+import shutil
+import tempfile
+import time
+import unittest
+
+from cgroup_monitor import CGroupMonitor
+from cgroup_monitor.watcher import CGroupWatcher, _Tracked
+
+
+def write_files(path, files):
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+
+
+def make_cgroup(path, usage_usec=0, populated=1):
+    os.makedirs(path)
+    write_files(path, {
+        "cpu.stat": f"usage_usec {usage_usec}\nnr_periods 0\nnr_throttled 0\nthrottled_usec 0\n",
+        "cpu.max": "max 100000\n",
+        "memory.current": "4096\n",
+        "memory.max": "8192\n",
+        "cgroup.events": f"populated {populated}\nfrozen 0\n",
+    })
+
+
+class TestCGroupWatcher(unittest.TestCase):
+
+    def test_lifecycle(self):
+        created = queue.Queue()
+        with tempfile.TemporaryDirectory() as base:
+            root = os.path.join(base, "slice")
+            staging = os.path.join(base, "staging")
+            os.makedirs(root)
+            make_cgroup(os.path.join(root, "existing"))
+
+            watcher = CGroupWatcher("slice", base, version=2, interval=0.02,
+                                    on_created=lambda name, monitor: created.put(name))
+            watcher.start()
+            assert created.get(timeout=1) == "existing"
+
+            # Move a complete cgroup in, so its files exist when the monitor starts
+            make_cgroup(os.path.join(staging, "app"))
+            os.rename(os.path.join(staging, "app"), os.path.join(root, "app"))
+            assert created.get(timeout=1) == "app"
+            assert set(watcher.monitors) == {"existing", "app"}
+
+            # The last process leaves, then the cgroup is removed
+            monitor = watcher.monitors["app"]
+            tracked = watcher.cgroups["app"]
+            write_files(os.path.join(root, "app"), {"cgroup.events": "populated 0\nfrozen 0\n"})
+            # Wait for the final sample to be folded into the summary
+            deadline = time.monotonic() + 1
+            while tracked.summary is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert not monitor.monitoring
+            assert tracked.summary is not None
+            shutil.rmtree(os.path.join(root, "app"))
+            finished = watcher.finished.get(timeout=1)
+
+            # Removed while sampling, without cgroup.events saying it emptied first
+            with open(os.path.join(root, "existing", "cpu.stat"), "w") as f:
+                f.write("usage_usec 5000\n")
+            time.sleep(0.1)
+            shutil.rmtree(os.path.join(root, "existing"))
+            removed = watcher.finished.get(timeout=1)
+
+            remaining = watcher.stop()
+
+        assert finished.name == "app"
+        assert finished.removed_time >= finished.created_time
+        assert finished.summary.count >= 1
+        assert finished.summary.memory_limit_bytes == 8192
+        assert finished.summary.report()["max_memory_usage_percent"] == 50.0
+        assert removed.name == "existing"
+        assert removed.summary.count >= 1
+        assert removed.summary.cpu_min >= 0
+        assert remaining == []
+
+    def test_limits_survive_removal(self):
+        with tempfile.TemporaryDirectory() as base:
+            path = os.path.join(base, "app")
+            make_cgroup(path)
+            write_files(path, {"cpu.max": "50000 100000\n"})
+            tracked = _Tracked(CGroupMonitor("app", base, version=2))
+            tracked.read_limits()
+            shutil.rmtree(path)
+            tracked.read_limits()
+
+        assert tracked.num_cores == 0.5
+        assert tracked.memory_limit == 8192
+
+    def test_monitor_stops_when_removed(self):
+        with tempfile.TemporaryDirectory() as base:
+            make_cgroup(os.path.join(base, "app"), usage_usec=1000)
+            monitor = CGroupMonitor("app", base, version=2)
+            monitor.start_monitor(0.01)
+            time.sleep(0.05)
+            shutil.rmtree(os.path.join(base, "app"))
+            monitor.monitor_thread.join(timeout=1)
+
+            assert not monitor.monitor_thread.is_alive()
+            monitor.stop_sampling()
+            assert min(monitor.cpu_usage_percentages) >= 0
+
+    def test_monitor_stops_when_idle_cgroup_removed(self):
+        with tempfile.TemporaryDirectory() as base:
+            # The CPU counter never moves, so it cannot go back when the files disappear
+            make_cgroup(os.path.join(base, "app"), usage_usec=0)
+            monitor = CGroupMonitor("app", base, version=2)
+            monitor.start_monitor(0.01)
+            time.sleep(0.05)
+            assert monitor.monitor_thread.is_alive()
+            shutil.rmtree(os.path.join(base, "app"))
+            monitor.monitor_thread.join(timeout=1)
+
+            assert not monitor.monitor_thread.is_alive()
+            monitor.stop_sampling()
+
+    def test_monitor_survives_failed_read(self):
+        with tempfile.TemporaryDirectory() as base:
+            make_cgroup(os.path.join(base, "app"), usage_usec=1000)
+            monitor = CGroupMonitor("app", base, version=2)
+            failures = []
+            get_memory_usage = monitor.get_memory_usage
+
+            def flaky_memory_usage():
+                if not failures:
+                    failures.append(True)
+                    raise OSError("transient")
+                return get_memory_usage()
+
+            monitor.get_memory_usage = flaky_memory_usage
+            monitor.start_monitor(0.01)
+            time.sleep(0.1)
+            alive = monitor.monitor_thread.is_alive()
+            monitor.stop_sampling()
+
+        assert failures
+        assert alive
+        assert len(monitor.memory_usage) > 1